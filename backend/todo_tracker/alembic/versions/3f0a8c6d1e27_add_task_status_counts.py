@@ -0,0 +1,40 @@
+"""add task status counts
+
+Revision ID: 3f0a8c6d1e27
+Revises: b7d41c9e2f58
+Create Date: 2026-10-18 17:05:12.640518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f0a8c6d1e27'
+down_revision: Union[str, None] = 'b7d41c9e2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('task_status_counts',
+    sa.Column('creator_id', sa.Integer(), nullable=False),
+    sa.Column('status', postgresql.ENUM('PLANNED', 'IN_PROGRESS', 'COMPLETED', name='taskstatus', create_type=False), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('creator_id', 'status')
+    )
+    # Counters of existing tasks, creator_id 0 counts tasks of everyone
+    op.execute(
+        "INSERT INTO task_status_counts (creator_id, status, count) "
+        "SELECT creator_id, status, count(*) FROM tasks "
+        "WHERE creator_id IS NOT NULL GROUP BY creator_id, status "
+        "UNION ALL "
+        "SELECT 0, status, count(*) FROM tasks GROUP BY status"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_status_counts')
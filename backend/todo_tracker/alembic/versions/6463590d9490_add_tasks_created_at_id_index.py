@@ -0,0 +1,27 @@
+"""add tasks created_at id index
+
+Revision ID: 6463590d9490
+Revises: e838d1a960bf
+Create Date: 2026-10-18 10:12:04.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6463590d9490'
+down_revision: Union[str, None] = 'e838d1a960bf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tasks_created_at_id', 'tasks',
+                    ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_created_at_id', table_name='tasks')
@@ -0,0 +1,32 @@
+"""add tasks creator_id status created_at index
+
+Revision ID: a92e5f3b7c14
+Revises: 3f0a8c6d1e27
+Create Date: 2026-10-18 18:21:47.905316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a92e5f3b7c14'
+down_revision: Union[str, None] = '3f0a8c6d1e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Built concurrently so writes to tasks are not blocked meanwhile
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tasks_creator_id_status_created_at', 'tasks',
+                        ['creator_id', 'status', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_tasks_creator_id_status_created_at',
+                      table_name='tasks', postgresql_concurrently=True)
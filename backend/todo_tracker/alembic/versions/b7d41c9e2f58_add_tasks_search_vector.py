@@ -0,0 +1,42 @@
+"""add tasks search vector
+
+Revision ID: b7d41c9e2f58
+Revises: 6463590d9490
+Create Date: 2026-10-18 15:40:27.381902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41c9e2f58'
+down_revision: Union[str, None] = '6463590d9490'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_EXPRESSION = (
+    "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+)
+
+
+def upgrade() -> None:
+    # Rewrites the table to fill the stored column for existing rows
+    op.add_column('tasks', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+        nullable=True))
+    op.create_index('ix_tasks_search_vector', 'tasks', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_search_vector', table_name='tasks',
+                  postgresql_using='gin')
+    op.drop_column('tasks', 'search_vector')
@@ -0,0 +1,61 @@
+'''
+Compares per-item task creation with the bulk INSERT ... RETURNING path.
+
+Run from the backend directory:
+    python -m todo_tracker.benchmarks.bulk_create
+'''
+import asyncio
+
+from todo_tracker.benchmarks.common import (Timer, benchmark_database,
+                                            print_table)
+from todo_tracker.db.crud import task_crud, user_crud
+from todo_tracker.schemas import task_schemas, user_schemas
+
+BATCH_SIZES = (10, 100, 1000)
+
+
+async def main():
+    async with benchmark_database() as session_factory:
+        async with session_factory() as session:
+            user = await user_crud.create_user(
+                user=user_schemas.UserCreate(username='benchmark',
+                                             password='benchmark-password'),
+                session=session)
+
+        results = []
+        for batch_size in BATCH_SIZES:
+            tasks_data = [
+                task_schemas.TaskCreate(title=f'task {number}',
+                                        description='benchmark')
+                for number in range(batch_size)
+            ]
+
+            # Same work as one POST /tasks request per task
+            with Timer() as per_item:
+                for task_data in tasks_data:
+                    async with session_factory() as session:
+                        await task_crud.create_task(
+                            task_data=task_data, session=session,
+                            creator_id=user.id)
+                        await session.commit()
+
+            # Same work as one POST /tasks/bulk request
+            with Timer() as bulk:
+                async with session_factory() as session:
+                    await task_crud.create_tasks(
+                        tasks_data=tasks_data, session=session,
+                        creator_id=user.id)
+                    await session.commit()
+
+            results.append((
+                batch_size,
+                f'{per_item.elapsed * 1000:.1f}',
+                f'{bulk.elapsed * 1000:.1f}',
+                f'{per_item.elapsed / bulk.elapsed:.1f}x',
+            ))
+
+    print_table(('items', 'per-item ms', 'bulk ms', 'speedup'), results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (AsyncEngine, async_sessionmaker,
+                                    create_async_engine)
+
+from todo_tracker.db.base import Base
+from todo_tracker.dependencies.env_dependencies import get_testing_settings
+
+database_data = get_testing_settings()
+
+# Benchmarks create and drop tables, so they only run against the test DB
+SQLALCHEMY_BENCHMARK_DATABASE_URL = (
+    f"postgresql+asyncpg://{database_data.TEST_DB_USERNAME}:"
+    f"{database_data.TEST_DB_PASSWORD}"
+    f"@{database_data.TEST_DB_HOST}:{database_data.TEST_DB_PORT}/"
+    f"{database_data.TEST_DB_NAME}"
+)
+
+
+@asynccontextmanager
+async def benchmark_database() -> AsyncIterator[async_sessionmaker]:
+    '''
+    Yield session factory bound to freshly created test database tables.
+    Tables are dropped when the benchmark is over.
+    '''
+    engine = create_async_engine(SQLALCHEMY_BENCHMARK_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    try:
+        yield async_sessionmaker(bind=engine, expire_on_commit=False)
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+
+class Timer:
+    '''Context manager measuring wall time of the enclosed block.'''
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.started
+
+
+class QueryCounter:
+    '''Context manager counting SQL statements executed by the engine.'''
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def print_table(header: tuple, rows: list) -> None:
+    '''Print benchmark results as a plain aligned table.'''
+    widths = [max(len(str(value)) for value in column)
+              for column in zip(header, *rows)]
+    for row in (header, *rows):
+        print('  '.join(str(value).rjust(width)
+                        for value, width in zip(row, widths)))
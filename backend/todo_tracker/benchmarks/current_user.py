@@ -0,0 +1,74 @@
+'''
+Compares authenticated task writes with a stateless access token
+against a legacy token that makes get_current_user load the user.
+
+Requires Redis, run from the backend directory:
+    python -m todo_tracker.benchmarks.current_user
+'''
+import asyncio
+
+import httpx
+
+from todo_tracker.benchmarks.common import (QueryCounter, Timer,
+                                            benchmark_database, print_table)
+from todo_tracker.db.crud import user_crud
+from todo_tracker.dependencies.db_dependencies import get_session
+from todo_tracker.main import app
+from todo_tracker.redis.redis_config import create_redis_client
+from todo_tracker.schemas import user_schemas
+from todo_tracker.utils.jwt import create_access_token, user_claims
+
+REQUESTS = 500
+WARMUP_REQUESTS = 50
+
+
+async def main():
+    async with benchmark_database() as session_factory:
+        async def get_benchmark_session():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_session] = get_benchmark_session
+        app.state.redis = create_redis_client()
+
+        async with session_factory() as session:
+            user = await user_crud.create_user(
+                user=user_schemas.UserCreate(username='benchmark',
+                                             password='benchmark-password'),
+                session=session)
+        tokens = {
+            'stateless': await create_access_token(user_claims(user)),
+            'db lookup': await create_access_token({'sub': user.username}),
+        }
+
+        results = []
+        async with httpx.AsyncClient(
+                base_url='http://benchmark',
+                transport=httpx.ASGITransport(app=app)) as client:
+            for mode, token in tokens.items():
+                headers = {'Authorization': f'Bearer {token}'}
+                task_data = {'title': 'benchmark', 'description': mode}
+                for _ in range(WARMUP_REQUESTS):
+                    await client.post('/tasks', headers=headers,
+                                      json=task_data)
+                with QueryCounter(session_factory.kw['bind']) as queries:
+                    with Timer() as timer:
+                        for _ in range(REQUESTS):
+                            response = await client.post(
+                                '/tasks', headers=headers, json=task_data)
+                            response.raise_for_status()
+                results.append((
+                    mode,
+                    f'{queries.count / REQUESTS:.1f}',
+                    f'{timer.elapsed / REQUESTS * 1000:.2f}',
+                    f'{REQUESTS / timer.elapsed:.0f}',
+                ))
+
+        await app.state.redis.aclose()
+        app.dependency_overrides.clear()
+
+    print_table(('mode', 'queries/req', 'ms/req', 'req/s'), results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
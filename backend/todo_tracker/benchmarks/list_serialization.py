@@ -0,0 +1,104 @@
+'''
+Compares serialization of task lists from ORM objects through
+Pydantic with plain Core rows dumped by orjson.
+
+Run from the backend directory:
+    python -m todo_tracker.benchmarks.list_serialization
+'''
+import asyncio
+import json
+import tracemalloc
+
+from sqlalchemy import select
+
+from todo_tracker.benchmarks.common import (Timer, benchmark_database,
+                                            print_table)
+from todo_tracker.db.crud import task_crud, user_crud
+from todo_tracker.db.models.task import Task
+from todo_tracker.schemas import task_schemas, user_schemas
+from todo_tracker.utils.serialization import task_page_json
+
+PAGE_SIZES = (100, 1000, 10000)
+REPEATS = 5
+CREATE_BATCH_SIZE = 1000
+
+
+async def orm_page(session, limit: int) -> bytes:
+    # What GET /tasks did before: ORM objects validated by response_model
+    # and dumped by JSONResponse
+    tasks = list(await session.scalars(
+        select(Task).order_by(Task.created_at, Task.id).limit(limit)))
+    page = task_schemas.TaskPage.model_validate(
+        {'items': tasks, 'next_cursor': None}, from_attributes=True)
+    return json.dumps(page.model_dump(mode='json'), ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+
+async def core_page(session, limit: int) -> bytes:
+    rows, next_cursor = await task_crud.get_tasks(session=session,
+                                                  limit=limit)
+    return task_page_json(rows, next_cursor)
+
+
+async def measure(session_factory, build_page, limit: int):
+    '''Return best wall time and peak traced memory of building a page.'''
+    best = None
+    for _ in range(REPEATS):
+        # Fresh session, so the identity map starts empty like a request
+        async with session_factory() as session:
+            with Timer() as timer:
+                await build_page(session, limit)
+        best = timer.elapsed if best is None else min(best, timer.elapsed)
+
+    async with session_factory() as session:
+        tracemalloc.start()
+        await build_page(session, limit)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak
+
+
+async def main():
+    async with benchmark_database() as session_factory:
+        async with session_factory() as session:
+            user = await user_crud.create_user(
+                user=user_schemas.UserCreate(username='benchmark',
+                                             password='benchmark-password'),
+                session=session)
+            for offset in range(0, max(PAGE_SIZES), CREATE_BATCH_SIZE):
+                await task_crud.create_tasks(
+                    tasks_data=[
+                        task_schemas.TaskCreate(
+                            title=f'task {number}',
+                            description='benchmark description')
+                        for number in range(offset,
+                                            offset + CREATE_BATCH_SIZE)
+                    ],
+                    session=session, creator_id=user.id)
+            await session.commit()
+
+        async with session_factory() as session:
+            assert (json.loads(await orm_page(session, 10))['items']
+                    == json.loads(await core_page(session, 10))['items'])
+
+        results = []
+        for limit in PAGE_SIZES:
+            orm_time, orm_peak = await measure(session_factory, orm_page,
+                                               limit)
+            core_time, core_peak = await measure(session_factory, core_page,
+                                                 limit)
+            results.append((
+                limit,
+                f'{limit / orm_time:,.0f}',
+                f'{limit / core_time:,.0f}',
+                f'{orm_time / core_time:.1f}x',
+                f'{orm_peak / 2 ** 20:.1f}',
+                f'{core_peak / 2 ** 20:.1f}',
+            ))
+
+    print_table(('rows', 'orm rows/s', 'core rows/s', 'speedup',
+                 'orm peak MiB', 'core peak MiB'), results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+'''
+Load benchmark of the task endpoints, reporting RPS and latency
+percentiles of every mix to a JSON file.
+
+In-process, against the test database and the configured Redis:
+    python -m todo_tracker.benchmarks.load run --target asgi
+
+Through the gateway of a running stack, with rate limiting disabled
+(RATE_LIMIT_ENABLED=false), otherwise limited requests count as errors:
+    python -m todo_tracker.benchmarks.load run --target gateway \
+        --url http://localhost:8080
+
+Compare two reports, e.g. of two commits:
+    python -m todo_tracker.benchmarks.load compare old.json new.json
+
+Run from the backend directory.
+'''
+import argparse
+import asyncio
+import json
+from typing import Optional
+
+from todo_tracker.benchmarks.common import print_table
+from todo_tracker.benchmarks.load.runner import run
+from todo_tracker.benchmarks.load.scenarios import MIXES
+
+
+def print_report(report: dict) -> None:
+    rows = [
+        (mix, summary['requests'], summary['errors'], summary['rps'],
+         *summary['latency_ms'].values())
+        for mix, summary in report['mixes'].items()
+    ]
+    print_table(('mix', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms',
+                 'p99 ms', 'max ms'), rows)
+
+
+def compare(old: dict, new: dict) -> None:
+    def change(before: Optional[float], after: Optional[float]) -> str:
+        if not before or after is None:
+            return '-'
+        return f'{(after - before) / before:+.1%}'
+
+    rows = []
+    for mix, after in new['mixes'].items():
+        before = old['mixes'].get(mix)
+        if before is None:
+            continue
+        rows.append((
+            mix, before['rps'], after['rps'],
+            change(before['rps'], after['rps']),
+            *(change(before['latency_ms'][name], after['latency_ms'][name])
+              for name in ('p50', 'p95', 'p99')),
+        ))
+    print(f"{old['commit']} -> {new['commit']}")
+    print_table(('mix', 'old rps', 'new rps', 'rps', 'p50', 'p95', 'p99'),
+                rows)
+
+
+def count(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f'{value} is negative')
+    return number
+
+
+def positive(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not positive')
+    return number
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Run the benchmark')
+    run_parser.add_argument('--target', choices=('asgi', 'gateway'),
+                            default='asgi')
+    run_parser.add_argument('--url', default='http://localhost:8080',
+                            help='Gateway URL for the gateway target')
+    run_parser.add_argument('--mixes', default=','.join(MIXES),
+                            help='Comma separated mixes to run, '
+                                 f'of {", ".join(MIXES)}')
+    run_parser.add_argument('--requests', type=count, default=2000,
+                            help='Measured requests per mix')
+    run_parser.add_argument('--warmup', type=count, default=200,
+                            help='Unmeasured requests before every mix')
+    run_parser.add_argument('--concurrency', type=positive, default=20,
+                            help='Number of users sending requests')
+    run_parser.add_argument('--tasks-per-user', type=int, default=100)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--output', default='load-benchmark.json')
+
+    compare_parser = commands.add_parser('compare',
+                                         help='Compare two reports')
+    compare_parser.add_argument('old')
+    compare_parser.add_argument('new')
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        with open(args.old) as old, open(args.new) as new:
+            compare(json.load(old), json.load(new))
+        return
+
+    mixes = [mix.strip() for mix in args.mixes.split(',') if mix.strip()]
+    unknown = set(mixes) - set(MIXES)
+    if unknown:
+        parser.error(f'unknown mixes: {", ".join(sorted(unknown))}')
+    report = asyncio.run(run(
+        target=args.target, url=args.url, mixes=mixes,
+        requests=args.requests, concurrency=args.concurrency,
+        tasks_per_user=args.tasks_per_user, warmup=args.warmup,
+        seed=args.seed))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, ensure_ascii=False)
+    print_report(report)
+    print(f'Report written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
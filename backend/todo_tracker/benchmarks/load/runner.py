@@ -0,0 +1,198 @@
+import asyncio
+import random
+import subprocess
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from todo_tracker.benchmarks.common import benchmark_database
+from todo_tracker.benchmarks.load.scenarios import MIXES, Recorder, VirtualUser
+from todo_tracker.dependencies.db_dependencies import (
+    get_replica_session_factory, get_session, get_session_factory)
+from todo_tracker.main import app
+from todo_tracker.redis.task_cache import TaskCache
+
+REQUEST_TIMEOUT_SECONDS = 30
+PERCENTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    index = min(len(values) - 1, round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+def summarize(latencies: List[float], statuses: Dict[str, int],
+              elapsed: float) -> dict:
+    '''
+    Describe a series of requests, latencies in milliseconds.
+    Latencies of an empty series are None.
+    '''
+    errors = sum(count for status, count in statuses.items()
+                 if not status.startswith(('2', '3')))
+    latency_ms = {
+        name: (round(percentile(latencies, fraction) * 1000, 3)
+               if latencies else None)
+        for name, fraction in PERCENTILES
+    }
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': latency_ms,
+    }
+
+
+def spread(total: int, parts: int) -> List[int]:
+    '''Split `total` into `parts` counts differing by at most one.'''
+    share, remainder = divmod(total, parts)
+    return [share + (index < remainder) for index in range(parts)]
+
+
+@asynccontextmanager
+async def asgi_client() -> AsyncIterator[httpx.AsyncClient]:
+    '''
+    Client calling the app in-process, against freshly created tables
+    of the test database and the Redis configured for the app.
+    '''
+    async with benchmark_database() as session_factory:
+        async def get_benchmark_session():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_session] = get_benchmark_session
+        app.dependency_overrides[get_session_factory] = (
+            lambda: session_factory)
+        # A configured replica does not hold the seeded tables
+        app.dependency_overrides[get_replica_session_factory] = (
+            lambda: None)
+        try:
+            # Transport does not run lifespan, Redis and caches start here
+            async with app.router.lifespan_context(app):
+                # Task IDs restart with the tables, cached tasks of
+                # earlier runs would be served for the new ones
+                async for key in app.state.redis.scan_iter(
+                        TaskCache._key('*')):
+                    await app.state.redis.delete(key)
+                async with httpx.AsyncClient(
+                        base_url='http://benchmark',
+                        transport=httpx.ASGITransport(app=app),
+                        timeout=REQUEST_TIMEOUT_SECONDS) as client:
+                    yield client
+        finally:
+            app.dependency_overrides.clear()
+
+
+@asynccontextmanager
+async def gateway_client(
+        url: str, concurrency: int) -> AsyncIterator[httpx.AsyncClient]:
+    '''Client calling a running stack through the gateway at `url`.'''
+    limits = httpx.Limits(max_connections=concurrency,
+                          max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits,
+                                 timeout=REQUEST_TIMEOUT_SECONDS) as client:
+        yield client
+
+
+async def create_users(client: httpx.AsyncClient, count: int,
+                       tasks_per_user: int, seed: int) -> List[VirtualUser]:
+    '''Register, log in and seed tasks for every virtual user.'''
+    users = [
+        VirtualUser(client, f'bench-{seed}-{index}',
+                    random.Random(seed * 100_000 + index))
+        for index in range(count)
+    ]
+    for user in users:
+        await user.register()
+        await user.login()
+        if not user.headers:
+            raise RuntimeError(f'Failed to log in as {user.username}')
+    await asyncio.gather(*(user.seed(tasks_per_user) for user in users))
+    return users
+
+
+async def run_mix(users: List[VirtualUser], mix: str, requests: int,
+                  warmup: int) -> dict:
+    '''
+    Run `requests` operations of the mix spread over the users,
+    each user sending its next request when the previous one is done.
+    '''
+    operations, weights = zip(*MIXES[mix].items())
+
+    async def drive(user: VirtualUser, count: int) -> None:
+        for operation in user.rng.choices(operations, weights, k=count):
+            try:
+                await user.run(operation)
+            except httpx.HTTPError:
+                pass  # Recorded as an error of the operation
+
+    for user in users:
+        user.recorder = None
+    await asyncio.gather(*(drive(user, count) for user, count
+                           in zip(users, spread(warmup, len(users)))))
+
+    recorder = Recorder()
+    for user in users:
+        user.recorder = recorder
+    started = time.perf_counter()
+    await asyncio.gather(*(drive(user, count) for user, count
+                           in zip(users, spread(requests, len(users)))))
+    elapsed = time.perf_counter() - started
+    for user in users:
+        user.recorder = None
+
+    all_statuses: Dict[str, int] = {}
+    for statuses in recorder.statuses.values():
+        for status, count in statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    summary = summarize(
+        [latency for latencies in recorder.latencies.values()
+         for latency in latencies],
+        all_statuses, elapsed)
+    summary['operations'] = {
+        operation: summarize(latencies, recorder.statuses[operation],
+                             elapsed)
+        for operation, latencies in sorted(recorder.latencies.items())
+    }
+    return summary
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(target: str, url: str, mixes: List[str], requests: int,
+              concurrency: int, tasks_per_user: int, warmup: int,
+              seed: int) -> dict:
+    '''Seed the stack, run every mix and return the report.'''
+    if target == 'asgi':
+        client_context = asgi_client()
+    else:
+        client_context = gateway_client(url, concurrency)
+    report = {
+        'commit': current_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'target': target,
+        'url': url if target == 'gateway' else None,
+        'concurrency': concurrency,
+        'requests': requests,
+        'tasks_per_user': tasks_per_user,
+        'seed': seed,
+        'mixes': {},
+    }
+    async with client_context as client:
+        users = await create_users(client, concurrency, tasks_per_user,
+                                   seed)
+        for mix in mixes:
+            report['mixes'][mix] = await run_mix(users, mix, requests,
+                                                 warmup)
+    return report
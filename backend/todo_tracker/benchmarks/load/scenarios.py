@@ -0,0 +1,146 @@
+import random
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+
+PASSWORD = 'benchmark-password'
+# Tasks created by one POST /tasks/bulk while seeding
+SEED_BATCH_SIZE = 1000
+STATUSES = ('запланирована', 'в процессе', 'завершена')
+
+# Operation -> weight, operations are picked at random by every user
+MIXES: Dict[str, Dict[str, int]] = {
+    'login': {'login': 1},
+    'create': {'create': 1},
+    'list': {'list': 1},
+    'get': {'get': 1},
+    'update': {'update': 1},
+    'delete': {'delete': 1},
+    'mixed': {'list': 30, 'get': 35, 'create': 10, 'update': 15,
+              'delete': 5, 'login': 5},
+}
+
+
+class Recorder:
+    '''Collects latencies and outcomes of timed requests.'''
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+
+    def record(self, operation: str, latency: float, status: str) -> None:
+        self.latencies[operation].append(latency)
+        self.statuses[operation][status] += 1
+
+
+class VirtualUser:
+    '''
+    One registered user issuing requests of a mix one after another.
+    Keeps IDs of its own tasks to read, update and delete them.
+    '''
+
+    def __init__(self, client: httpx.AsyncClient, username: str,
+                 rng: random.Random):
+        self.client = client
+        self.username = username
+        self.rng = rng
+        self.headers: Dict[str, str] = {}
+        self.task_ids: List[int] = []
+        self.recorder = None
+
+    async def request(self, operation: str, method: str, url: str,
+                      **kwargs) -> httpx.Response:
+        '''Send a request, timing it if a recorder is attached.'''
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as error:
+            if self.recorder is not None:
+                self.recorder.record(operation,
+                                     time.perf_counter() - started,
+                                     type(error).__name__)
+            raise
+        if self.recorder is not None:
+            self.recorder.record(operation, time.perf_counter() - started,
+                                 str(response.status_code))
+        return response
+
+    async def register(self) -> None:
+        response = await self.request(
+            'register', 'POST', '/auth/register',
+            data={'username': self.username, 'password': PASSWORD})
+        # Users of earlier runs against the same stack are reused
+        if response.status_code not in (201, 400):
+            response.raise_for_status()
+
+    async def seed(self, tasks: int) -> None:
+        '''Create tasks of the user and read each once to warm caches.'''
+        for offset in range(0, tasks, SEED_BATCH_SIZE):
+            response = await self.request(
+                'seed', 'POST', '/tasks/bulk', headers=self.headers,
+                json=[self._task_data(number) for number in range(
+                    offset, min(tasks, offset + SEED_BATCH_SIZE))])
+            response.raise_for_status()
+            self.task_ids.extend(task['id'] for task in response.json())
+        for task_id in self.task_ids:
+            response = await self.request('seed', 'GET',
+                                          f'/tasks/{task_id}')
+            response.raise_for_status()
+
+    async def run(self, operation: str) -> None:
+        await getattr(self, operation)()
+
+    async def login(self) -> None:
+        response = await self.request(
+            'login', 'POST', '/auth/login',
+            data={'username': self.username, 'password': PASSWORD})
+        if response.status_code == 200:
+            token = response.json()['access_token']
+            self.headers = {'Authorization': f'Bearer {token}'}
+
+    async def create(self) -> None:
+        response = await self.request(
+            'create', 'POST', '/tasks', headers=self.headers,
+            json=self._task_data(len(self.task_ids)))
+        if response.status_code == 201:
+            self.task_ids.append(response.json()['id'])
+
+    async def list(self) -> None:
+        await self.request('list', 'GET', '/tasks/mine',
+                           headers=self.headers, params={'limit': 50})
+
+    async def get(self) -> None:
+        await self._ensure_task()
+        await self.request('get', 'GET',
+                           f'/tasks/{self.rng.choice(self.task_ids)}')
+
+    async def update(self) -> None:
+        await self._ensure_task()
+        await self.request(
+            'update', 'PUT', f'/tasks/{self.rng.choice(self.task_ids)}',
+            headers=self.headers,
+            json={'status': self.rng.choice(STATUSES)})
+
+    async def delete(self) -> None:
+        await self._ensure_task()
+        task_id = self.task_ids.pop(self.rng.randrange(len(self.task_ids)))
+        await self.request('delete', 'DELETE', f'/tasks/{task_id}',
+                           headers=self.headers)
+
+    async def _ensure_task(self) -> None:
+        # Untimed, keeps delete-heavy mixes from running out of tasks
+        if not self.task_ids:
+            recorder, self.recorder = self.recorder, None
+            try:
+                await self.create()
+            finally:
+                self.recorder = recorder
+
+    def _task_data(self, number: int) -> dict:
+        return {
+            'title': f'{self.username} task {number}',
+            'description': 'benchmark task ' * self.rng.randint(1, 20),
+            'status': self.rng.choice(STATUSES),
+        }
@@ -0,0 +1,123 @@
+'''
+Measures the cost of collecting metrics: the request middleware,
+query timing hooks and timed Redis commands, each against the same
+work without instrumentation.
+
+Uses the test database and the Redis configured for the app.
+Run from the backend directory:
+    python -m todo_tracker.benchmarks.metrics_overhead
+'''
+import asyncio
+import time
+
+from fastapi import FastAPI
+from redis.asyncio import Redis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from todo_tracker.benchmarks.common import (SQLALCHEMY_BENCHMARK_DATABASE_URL,
+                                            Timer, print_table)
+from todo_tracker.redis.redis_config import redis_settings
+from todo_tracker.utils.metrics import (InstrumentedRedis, MetricsMiddleware,
+                                        instrument_engine)
+
+REQUESTS = 20_000
+QUERIES = 5_000
+COMMANDS = 5_000
+REPEATS = 7
+
+
+def build_app(instrumented: bool):
+    app = FastAPI()
+
+    @app.get('/tasks/{task_id}')
+    async def get_task(task_id: int):
+        return {'id': task_id}
+
+    return MetricsMiddleware(app) if instrumented else app
+
+
+async def run_requests(instrumented: bool, count: int) -> None:
+    '''Send requests straight to the ASGI app, without any client.'''
+    app = build_app(instrumented)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        pass
+
+    for number in range(count):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'},
+            'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': f'/tasks/{number}', 'raw_path': b'', 'root_path': '',
+            'query_string': b'', 'headers': [], 'server': ('bench', 80),
+        }
+        await app(scope, receive, send)
+
+
+async def run_queries(instrumented: bool, count: int) -> None:
+    engine = create_async_engine(SQLALCHEMY_BENCHMARK_DATABASE_URL)
+    if instrumented:
+        instrument_engine(engine, 'benchmark')
+    async with engine.connect() as conn:
+        for _ in range(count):
+            await conn.execute(text('SELECT 1'))
+    await engine.dispose()
+
+
+async def run_commands(instrumented: bool, count: int) -> None:
+    redis_class = InstrumentedRedis if instrumented else Redis
+    redis = redis_class(host=redis_settings.REDIS_HOST,
+                        port=redis_settings.REDIS_PORT)
+    for _ in range(count):
+        await redis.ping()
+    await redis.aclose()
+
+
+async def best_times(run, count: int) -> dict:
+    '''
+    Best wall and CPU time of one operation, plain and instrumented,
+    over `REPEATS` runs of each. Metrics cost CPU of this process only,
+    which unlike wall time does not include the database and Redis or
+    noise of other processes. Runs alternate, so load of the machine
+    affects both alike.
+    '''
+    best = {}
+    for _ in range(REPEATS):
+        for instrumented in (False, True):
+            cpu_started = time.process_time()
+            with Timer() as timer:
+                await run(instrumented, count)
+            cpu = time.process_time() - cpu_started
+            for clock, elapsed in (('wall', timer.elapsed), ('cpu', cpu)):
+                best[clock, instrumented] = min(
+                    best.get((clock, instrumented), elapsed), elapsed)
+    return {key: elapsed / count for key, elapsed in best.items()}
+
+
+async def main():
+    cases = (
+        ('request', run_requests, REQUESTS),
+        ('query', run_queries, QUERIES),
+        ('redis command', run_commands, COMMANDS),
+    )
+    results = []
+    for name, run, count in cases:
+        times = await best_times(run, count)
+        overhead = times['cpu', True] - times['cpu', False]
+        results.append((
+            name,
+            f"{times['wall', False] * 1e6:.1f}",
+            f"{times['cpu', False] * 1e6:.1f}",
+            f"{times['cpu', True] * 1e6:.1f}",
+            f'{overhead * 1e6:+.1f}',
+            f"{overhead / times['wall', False]:+.1%}",
+        ))
+    print_table(('operation', 'wall us', 'cpu us', 'instrumented cpu us',
+                 'overhead us', 'of wall'), results)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,9 +1,13 @@
 # Base database setup
+import uuid
+
 from sqlalchemy.ext.asyncio import (AsyncAttrs, async_sessionmaker,
                                     create_async_engine)
 from sqlalchemy.orm import DeclarativeBase
 
 from todo_tracker.config import MainDBSettings
+from todo_tracker.db.pool import InstrumentedAsyncPool
+from todo_tracker.utils.metrics import instrument_engine, metrics_settings
 
 database_setings = MainDBSettings()
 
@@ -14,15 +18,72 @@ SQLALCHEMY_DATABASE_URL = (
     f"{database_setings.DB_NAME}"
 )
 
+
+def engine_options(settings: MainDBSettings) -> dict:
+    '''
+    Builds keyword arguments of the application engine from settings.
+
+    Args:
+        settings (MainDBSettings): Database connection settings.
+
+    Returns:
+        dict: Arguments for `create_async_engine`.
+
+    Behind PgBouncer in transaction pooling mode consecutive statements
+    may run on different server connections, so both the asyncpg and
+    the SQLAlchemy prepared statement caches are disabled and statements
+    get unique names.
+    '''
+    if settings.DB_PGBOUNCER:
+        connect_args = {
+            'statement_cache_size': 0,
+            'prepared_statement_cache_size': 0,
+            'prepared_statement_name_func': (
+                lambda: f'__asyncpg_{uuid.uuid4()}__'),
+        }
+    else:
+        connect_args = {
+            'statement_cache_size': settings.DB_STATEMENT_CACHE_SIZE,
+            'prepared_statement_cache_size': (
+                settings.DB_STATEMENT_CACHE_SIZE),
+        }
+    return {
+        'echo': settings.DB_ECHO,
+        'poolclass': InstrumentedAsyncPool,
+        'pool_size': settings.DB_POOL_SIZE,
+        'max_overflow': settings.DB_MAX_OVERFLOW,
+        'pool_timeout': settings.DB_POOL_TIMEOUT,
+        'pool_recycle': settings.DB_POOL_RECYCLE,
+        'pool_pre_ping': settings.DB_POOL_PRE_PING,
+        'connect_args': connect_args,
+    }
+
+
 async_engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL, echo=True
+    SQLALCHEMY_DATABASE_URL, **engine_options(database_setings)
 )
 
+if metrics_settings.METRICS_ENABLED:
+    instrument_engine(async_engine, 'primary')
+
 async_session_factory = async_sessionmaker(
     bind=async_engine,
     expire_on_commit=False
 )
 
+# Read-only routes use the replica when one is configured
+replica_engine = create_async_engine(
+    database_setings.DB_REPLICA_URL, **engine_options(database_setings)
+) if database_setings.DB_REPLICA_URL else None
+
+if replica_engine is not None and metrics_settings.METRICS_ENABLED:
+    instrument_engine(replica_engine, 'replica')
+
+replica_session_factory = async_sessionmaker(
+    bind=replica_engine,
+    expire_on_commit=False
+) if replica_engine is not None else None
+
 
 class Base(DeclarativeBase, AsyncAttrs):
     pass
@@ -1,12 +1,29 @@
+import functools
 from datetime import datetime
-from typing import List, Optional
+from typing import (AsyncIterator, Dict, List, NamedTuple, Optional, Sequence,
+                    Tuple)
 
 from fastapi import HTTPException
-from sqlalchemy import select, update
+from sqlalchemy import (ARRAY, CTE, Integer, Row, Select, any_, bindparam,
+                        delete, func, insert, literal, literal_column, select,
+                        text, tuple_, union_all, update)
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
-from todo_tracker.db.models.task import Task, TaskStatus
+from todo_tracker.db.models.task import SEARCH_CONFIGS, Task, TaskStatus
+from todo_tracker.db.models.task_status_count import (ALL_CREATORS,
+                                                      TaskStatusCount)
 from todo_tracker.schemas import task_schemas
+from todo_tracker.utils.pagination import (decode_cursor, decode_rank_cursor,
+                                           encode_cursor, encode_rank_cursor)
+
+# Writes go through Core tables to be used as CTEs of one statement
+tasks_table = Task.__table__
+
+# List reads select plain rows shaped as TaskRead, no ORM objects
+TASK_READ_COLUMNS = tuple(
+    tasks_table.c[field] for field in task_schemas.TASK_READ_FIELDS)
 
 
 async def create_task(
@@ -16,6 +33,9 @@ async def create_task(
     """
     Adds a new task record to the database.
 
+    The row is written and read back, and the status counters are
+    incremented, by a single `INSERT ... RETURNING` statement.
+
     Args:
         task_data (task_schemas.TaskCreate): Data for creating a new task.
         session (AsyncSession): Database session.
@@ -24,71 +44,267 @@ async def create_task(
     Returns:
         Task: The mapped task object.
     """
+    tasks = await create_tasks(tasks_data=[task_data], session=session,
+                               creator_id=creator_id)
+    return tasks[0]
+
+
+async def create_tasks(
+        tasks_data: List[task_schemas.TaskCreate],
+        session: AsyncSession,
+        creator_id: int) -> List[Task]:
+    """
+    Adds several task records to the database at once.
+
+    All rows are written by a single multi-row
+    `INSERT ... RETURNING` statement instead of a flush per task.
+
+    Args:
+        tasks_data (List[task_schemas.TaskCreate]): Data for new tasks.
+        session (AsyncSession): Database session.
+        creator_id (int): ID of the user creating the tasks.
+
+    Returns:
+        List[Task]: The mapped task objects in the order they were given.
+    """
     server_time = datetime.now(tz=None)
-    task_db = Task(title=task_data.title,
-                   description=task_data.description,
-                   status=task_data.status,
-                   created_at=server_time,
-                   creator_id=creator_id)
-    session.add(task_db)
-    await session.flush()
-    await session.refresh(task_db)
-    return task_db
+    values = [
+        {'title': task_data.title,
+         'description': task_data.description,
+         'status': task_data.status,
+         'created_at': server_time,
+         'creator_id': creator_id}
+        for task_data in tasks_data
+    ]
+    inserted = (
+        insert(tasks_table).values(values)
+        .returning(*tasks_table.c)
+        .cte('inserted')
+    )
+    changes = select(inserted.c.creator_id, inserted.c.status,
+                     literal(1).label('delta'))
+    # Serial ids are drawn in the order of the VALUES list
+    stmt = (
+        select(aliased(Task, inserted))
+        .add_cte(_count_changes(changes))
+        .order_by(inserted.c.id)
+    )
+    result = await session.scalars(stmt)
+    return list(result)
 
 
 async def update_task(
         task_data: task_schemas.TaskUpdate,
         session: AsyncSession,
-        task_id: int
-) -> Optional[Task]:
+        task_id: int,
+        expected_versions: Optional[List[int]] = None
+) -> Task:
     """
     Updates an existing task in the database.
 
+    The row is changed and read back, the version is bumped and
+    the status counters are moved, by a single `UPDATE ... RETURNING`
+    statement. The expected version is checked by the same statement,
+    so a concurrent update cannot slip in between.
+
     Args:
         task_data (task_schemas.TaskUpdate): Data for updating the task.
         session (AsyncSession): Database session.
         task_id (int): ID of the task to update.
+        expected_versions (Optional[List[int]]): Versions the task must
+            have to be updated, any version if None.
 
     Returns:
-        Optional[Task]: The updated task, or None if not found.
-    """
-    stmt = (
-        update(Task)
-        .where(Task.id == task_id)
-        .values(**task_data.model_dump(exclude_unset=True))
-        .execution_options(synchronize_session="fetch")
-    )
-    await session.execute(stmt)
-    await session.commit()
+        Task: The updated task.
 
-    stmt = select(Task).where(Task.id == task_id)
-    result = await session.execute(stmt)
-    task = result.scalars().first()
+    Raises:
+        HTTPException: If the task was not found,
+        or a 412 Precondition Failed error if it has another version.
+    """
+    values = task_data.model_dump(exclude_unset=True)
+    if not values:
+        task = await get_task(session=session, task_id=task_id)
+        if (expected_versions is not None
+                and task.version not in expected_versions):
+            raise _version_mismatch()
+        return task
+    where = Task.id == task_id
+    if expected_versions is not None:
+        where &= Task.version.in_(expected_versions)
+    updated = _update_counted(where, values)
+    task = await session.scalar(select(aliased(Task, updated.cte)).add_cte(
+        updated.counted))
+    if task is None:
+        if expected_versions is not None:
+            # Tell a missing task from a stale version
+            await get_task(session=session, task_id=task_id)
+            raise _version_mismatch()
+        raise HTTPException(status_code=404, detail="Task not found")
     return task
 
 
 async def delete_task(
         task_id: int,
-        session: AsyncSession) -> None | HTTPException:
+        session: AsyncSession) -> None:
     """
     Deletes a task from the database.
 
+    Existence is checked, and the status counters are decremented,
+    by the `DELETE ... RETURNING` statement itself.
+
     Args:
         task_id (int): ID of the task to delete.
         session (AsyncSession): Database session.
 
-    Returns:
-        None: If the deletion was successful.
+    Raises:
         HTTPException: If the task was not found.
     """
-    stmt = select(Task).where(Task.id == task_id)
-    result = await session.execute(stmt)
-    task = result.scalars().first()
-    if not task:
+    deleted_ids = await _delete_counted(session, Task.id == task_id)
+    if not deleted_ids:
         raise HTTPException(status_code=404, detail="Task not found")
-    await session.delete(task)
-    await session.commit()
-    return None
+
+
+async def update_tasks(
+        task_data: task_schemas.TaskUpdate,
+        session: AsyncSession,
+        task_ids: List[int]
+) -> List[int]:
+    """
+    Applies the same partial update to several tasks at once.
+
+    Runs a single `UPDATE ... WHERE id = ANY(:ids) RETURNING id` statement.
+
+    Args:
+        task_data (task_schemas.TaskUpdate): Data for updating the tasks.
+        session (AsyncSession): Database session.
+        task_ids (List[int]): IDs of the tasks to update.
+
+    Returns:
+        List[int]: IDs of the tasks that were actually updated.
+
+    Raises:
+        HTTPException: If there is nothing to update,
+        raises a 422 Unprocessable Entity error.
+    """
+    values = task_data.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=422, detail="Nothing to update")
+    updated = _update_counted(Task.id == any_(_ids_param(task_ids)), values)
+    result = await session.scalars(
+        select(updated.cte.c.id).add_cte(updated.counted))
+    return list(result)
+
+
+async def delete_tasks(
+        task_ids: List[int],
+        session: AsyncSession) -> List[int]:
+    """
+    Deletes several tasks at once.
+
+    Runs a single `DELETE ... WHERE id = ANY(:ids) RETURNING id` statement.
+
+    Args:
+        task_ids (List[int]): IDs of the tasks to delete.
+        session (AsyncSession): Database session.
+
+    Returns:
+        List[int]: IDs of the tasks that were actually deleted.
+    """
+    return await _delete_counted(session,
+                                 Task.id == any_(_ids_param(task_ids)))
+
+
+def _version_mismatch() -> HTTPException:
+    return HTTPException(status_code=412,
+                         detail="Task was changed by another request")
+
+
+def _ids_param(task_ids: List[int]):
+    # One array parameter instead of an expanding IN list
+    return bindparam('task_ids', value=list(task_ids),
+                     type_=ARRAY(Integer))
+
+
+class _CountedWrite(NamedTuple):
+    cte: CTE
+    counted: CTE
+
+
+def _update_counted(where, values: dict) -> _CountedWrite:
+    # Previous statuses are read under row locks, so concurrent updates
+    # of the same task cannot both decrement the same old status
+    previous = (
+        select(tasks_table.c.id, tasks_table.c.status)
+        .where(where)
+        .with_for_update()
+        .cte('previous')
+    )
+    updated = (
+        update(tasks_table)
+        .where(tasks_table.c.id == previous.c.id)
+        .values(**values, version=tasks_table.c.version + 1)
+        .returning(*tasks_table.c,
+                   previous.c.status.label('previous_status'))
+        .cte('updated')
+    )
+    moved = updated.c.status != updated.c.previous_status
+    changes = union_all(
+        select(updated.c.creator_id,
+               updated.c.previous_status.label('status'),
+               literal(-1).label('delta')).where(moved),
+        select(updated.c.creator_id, updated.c.status,
+               literal(1).label('delta')).where(moved),
+    )
+    return _CountedWrite(updated, _count_changes(changes))
+
+
+async def _delete_counted(session: AsyncSession, where) -> List[int]:
+    deleted = (
+        delete(tasks_table)
+        .where(where)
+        .returning(tasks_table.c.id, tasks_table.c.status,
+                   tasks_table.c.creator_id)
+        .cte('deleted')
+    )
+    changes = select(deleted.c.creator_id, deleted.c.status,
+                     literal(-1).label('delta'))
+    result = await session.scalars(
+        select(deleted.c.id).add_cte(_count_changes(changes)))
+    return list(result)
+
+
+def _count_changes(changes: Select) -> CTE:
+    """
+    Builds the upsert applying status count changes of a write.
+
+    Args:
+        changes (Select): Rows of `(creator_id, status, delta)` produced
+            by the write, one per changed task.
+
+    Returns:
+        CTE: Data-modifying CTE to attach to the write statement, so the
+        counters change in the same statement and transaction.
+    """
+    changes = changes.cte('changes')
+    creator_id, status, delta = changes.c
+    deltas = union_all(
+        select(creator_id, status, delta).where(creator_id.is_not(None)),
+        select(literal(ALL_CREATORS).label('creator_id'), status, delta),
+    ).subquery('deltas')
+    # One row per key: ON CONFLICT cannot update a row twice.
+    # Counter rows are locked in key order, so concurrent writes
+    # touching the same counters cannot deadlock
+    summed = (
+        select(deltas.c.creator_id, deltas.c.status, func.sum(deltas.c.delta))
+        .group_by(deltas.c.creator_id, deltas.c.status)
+        .order_by(deltas.c.creator_id, deltas.c.status)
+    )
+    stmt = pg_insert(TaskStatusCount).from_select(
+        ['creator_id', 'status', 'count'], summed)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['creator_id', 'status'],
+        set_={'count': TaskStatusCount.count + stmt.excluded.count})
+    return stmt.cte('counted')
 
 
 async def get_task(
@@ -115,21 +331,206 @@ async def get_task(
 
 async def get_tasks(
         session: AsyncSession,
-        status: Optional[TaskStatus] = None
-) -> List[Task]:
+        status: Optional[TaskStatus] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        creator_id: Optional[int] = None,
+        newest_first: bool = False
+) -> Tuple[List[Row], Optional[str]]:
     """
-    Retrieves tasks from the database, optionally filtered by status.
+    Retrieves a page of tasks from the database,
+    optionally filtered by status and creator.
+
+    Tasks are ordered by `(created_at, id)` and paginated by keyset,
+    so the cost of a page does not depend on how deep the client pages.
+    Tasks of one creator with a given status are read from the
+    `ix_tasks_creator_id_status_created_at` index in order.
+    Tasks are returned as plain rows of `TASK_READ_COLUMNS`, skipping
+    ORM identity map and attribute bookkeeping.
 
     Args:
         session (AsyncSession): Database session.
         status (Optional[TaskStatus]): Optional status to filter tasks.
+        limit (int): Maximum number of tasks in the page.
+        cursor (Optional[str]): Cursor returned with the previous page.
+        creator_id (Optional[int]): Optional creator to filter tasks.
+        newest_first (bool): Order from the most recent task.
 
     Returns:
-        List[Task]: A list of tasks, optionally filtered by status.
+        Tuple[List[Row], Optional[str]]: A list of task rows and a cursor
+        for the next page, or None if this page is the last one.
     """
-    stmt = select(Task)
+    stmt = select(*TASK_READ_COLUMNS)
+    if creator_id is not None:
+        stmt = stmt.where(Task.creator_id == creator_id)
     if status:
         stmt = stmt.where(Task.status == status.value)
-    result = await session.execute(stmt)
-    tasks = result.scalars()
-    return tasks
+    position = tuple_(Task.created_at, Task.id)
+    if cursor:
+        created_at, task_id = decode_cursor(cursor)
+        last_seen = tuple_(created_at, task_id)
+        stmt = stmt.where(
+            position < last_seen if newest_first else position > last_seen)
+    if newest_first:
+        stmt = stmt.order_by(Task.created_at.desc(), Task.id.desc())
+    else:
+        stmt = stmt.order_by(Task.created_at, Task.id)
+    result = await session.execute(stmt.limit(limit + 1))
+    tasks = result.all()
+
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        next_cursor = encode_cursor(tasks[-1].created_at, tasks[-1].id)
+    return tasks, next_cursor
+
+
+async def search_tasks(
+        session: AsyncSession,
+        query: str,
+        status: Optional[TaskStatus] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Finds tasks whose title or description match a search query.
+
+    The query is parsed with `websearch_to_tsquery` syntax in every
+    configuration of `SEARCH_CONFIGS`, so both Russian and English words
+    are stemmed. Matches come from the GIN index on `search_vector`
+    and are ordered by rank, best first, then by ID.
+
+    Args:
+        session (AsyncSession): Database session.
+        query (str): Search query entered by the user.
+        status (Optional[TaskStatus]): Optional status to filter tasks.
+        limit (int): Maximum number of tasks in the page.
+        cursor (Optional[str]): Cursor returned with the previous page.
+
+    Returns:
+        Tuple[List[Row], Optional[str]]: A list of task rows, each ending
+        with its rank, and a cursor for the next page, or None if this
+        page is the last one.
+    """
+    # Parsed queries are joined with || which means OR for tsquery
+    ts_query = functools.reduce(lambda left, right: left.op('||')(right), (
+        func.websearch_to_tsquery(
+            literal_column(f"'{config}'::regconfig"), query)
+        for config in SEARCH_CONFIGS
+    ))
+    rank = func.ts_rank(Task.search_vector, ts_query)
+    stmt = select(*TASK_READ_COLUMNS, rank.label('rank')).where(
+        Task.search_vector.bool_op('@@')(ts_query))
+    if status:
+        stmt = stmt.where(Task.status == status.value)
+    if cursor:
+        last_rank, task_id = decode_rank_cursor(cursor)
+        stmt = stmt.where(tuple_(rank, Task.id) < tuple_(last_rank, task_id))
+    stmt = stmt.order_by(rank.desc(), Task.id.desc()).limit(limit + 1)
+    rows = (await session.execute(stmt)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_rank_cursor(rows[-1].rank, rows[-1].id)
+    return rows, next_cursor
+
+
+async def get_task_stats(
+        session: AsyncSession,
+        creator_id: Optional[int] = None) -> Dict[TaskStatus, int]:
+    """
+    Reads the number of tasks in each status from the counters.
+
+    Costs a primary key lookup of at most one row per status,
+    whatever the number of tasks.
+
+    Args:
+        session (AsyncSession): Database session.
+        creator_id (Optional[int]): Count only tasks of this creator.
+
+    Returns:
+        Dict[TaskStatus, int]: Number of tasks per status.
+    """
+    stmt = select(TaskStatusCount.status, TaskStatusCount.count).where(
+        TaskStatusCount.creator_id == (
+            ALL_CREATORS if creator_id is None else creator_id))
+    counts = {status: 0 for status in TaskStatus}
+    counts.update((await session.execute(stmt)).tuples().all())
+    return counts
+
+
+async def reconcile_task_counts(session: AsyncSession) -> int:
+    """
+    Recomputes every status counter from the tasks table.
+
+    The counters table is locked first, so writes wait for the recount
+    instead of changing counters the recount is about to replace.
+    The caller commits.
+
+    Args:
+        session (AsyncSession): Database session.
+
+    Returns:
+        int: Number of counters whose value was wrong.
+    """
+    await session.execute(
+        text('LOCK TABLE task_status_counts IN EXCLUSIVE MODE'))
+    columns = (TaskStatusCount.creator_id, TaskStatusCount.status,
+               TaskStatusCount.count)
+    stored = {(creator_id, status): count for creator_id, status, count
+              in await session.execute(select(*columns))}
+
+    per_creator = select(tasks_table.c.creator_id, tasks_table.c.status,
+                         func.count().label('count')).where(
+        tasks_table.c.creator_id.is_not(None)).group_by(
+        tasks_table.c.creator_id, tasks_table.c.status)
+    for_all = select(literal(ALL_CREATORS).label('creator_id'),
+                     tasks_table.c.status, func.count().label('count')
+                     ).group_by(tasks_table.c.status)
+    await session.execute(delete(TaskStatusCount))
+    recounted = await session.execute(
+        pg_insert(TaskStatusCount)
+        .from_select(['creator_id', 'status', 'count'],
+                     union_all(per_creator, for_all))
+        .returning(*columns))
+    actual = {(creator_id, status): count
+              for creator_id, status, count in recounted}
+
+    return sum(
+        stored.get(key, 0) != actual.get(key, 0)
+        for key in stored.keys() | actual.keys()
+    )
+
+
+async def stream_tasks(
+        session: AsyncSession,
+        status: Optional[TaskStatus] = None,
+        chunk_size: int = 1000
+) -> AsyncIterator[Sequence[Row]]:
+    """
+    Streams tasks from the database in fixed-size chunks,
+    optionally filtered by status.
+
+    Rows are read through a server-side cursor, so only one chunk
+    is held in memory at a time whatever the size of the table.
+
+    Args:
+        session (AsyncSession): Database session.
+        status (Optional[TaskStatus]): Optional status to filter tasks.
+        chunk_size (int): Number of rows fetched from the cursor at once.
+
+    Yields:
+        Sequence[Row]: Chunks of plain task rows.
+    """
+    stmt = select(Task.id, Task.title, Task.description, Task.status,
+                  Task.created_at, Task.creator_id)
+    if status:
+        stmt = stmt.where(Task.status == status.value)
+    stmt = (
+        stmt.order_by(Task.created_at, Task.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = await session.stream(stmt)
+    async for rows in result.partitions():
+        yield rows
@@ -1,9 +1,10 @@
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from todo_tracker.db.models.user import User
 from todo_tracker.schemas import user_schemas
-from todo_tracker.utils.password import get_password_hash
+from todo_tracker.utils.password import get_password_hash_async
 
 
 async def create_user(
@@ -17,8 +18,12 @@ async def create_user(
 
     Returns:
         User: The created user with hashed password stored in the database.
+
+    Raises:
+        HTTPException: If the password hashing pool is saturated,
+        raises a 503 Service Unavailable error.
     """
-    hashed_pw = get_password_hash(user.password)
+    hashed_pw = await get_password_hash_async(user.password)
 
     db_user = User(username=user.username, password_hash=hashed_pw)
 
@@ -46,3 +51,37 @@ async def get_user_by_username(
     result = await session.execute(stmt)
     user = result.scalars().first()
     return user
+
+
+async def deactivate_user(user_id: int, session: AsyncSession) -> None:
+    """
+    Marks a user as inactive, the user can no longer log in.
+
+    Args:
+        user_id (int): ID of the user to deactivate.
+        session (AsyncSession): Database session.
+    """
+    async with session.begin():
+        await session.execute(
+            update(User).where(User.id == user_id).values(is_active=False))
+
+
+async def update_password(
+        user_id: int, password: str, session: AsyncSession) -> None:
+    """
+    Replaces the password of a user.
+
+    Args:
+        user_id (int): ID of the user.
+        password (str): The new plaintext password.
+        session (AsyncSession): Database session.
+
+    Raises:
+        HTTPException: If the password hashing pool is saturated,
+        raises a 503 Service Unavailable error.
+    """
+    hashed_pw = await get_password_hash_async(password)
+    async with session.begin():
+        await session.execute(
+            update(User).where(User.id == user_id)
+            .values(password_hash=hashed_pw))
@@ -1,8 +1,10 @@
 import enum
 from typing import Optional
 
-from sqlalchemy import DateTime, Enum, ForeignKey, Integer, String
+from sqlalchemy import (Computed, DateTime, Enum, ForeignKey, Index, Integer,
+                        String)
 from sqlalchemy import func as sql_function_generator
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column
 
 from todo_tracker.db.base import Base
@@ -14,8 +16,32 @@ class TaskStatus(str, enum.Enum):
     COMPLETED = "завершена"
 
 
+# Text search configurations applied to both task texts: Russian stems
+# Cyrillic words, English stems Latin ones
+SEARCH_CONFIGS = ('russian', 'english')
+
+# Title matches weigh more than description matches when ranking
+SEARCH_VECTOR_EXPRESSION = ' || '.join(
+    f"setweight(to_tsvector('{config}', coalesce({column}, '')), "
+    f"'{weight}')"
+    for config in SEARCH_CONFIGS
+    for column, weight in (('title', 'A'), ('description', 'B'))
+)
+
+
 class Task(Base):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Serves keyset pagination ordered by (created_at, id)
+        Index('ix_tasks_created_at_id', 'created_at', 'id'),
+        Index('ix_tasks_search_vector', 'search_vector',
+              postgresql_using='gin'),
+        # Serves tasks of one creator in one status, newest first,
+        # with a backward range scan and no sort
+        Index('ix_tasks_creator_id_status_created_at',
+              'creator_id', 'status', 'created_at', 'id'),
+    )
+
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[Optional[str]] = mapped_column(String, index=True)
     description: Mapped[Optional[str]] = mapped_column(String, nullable=True)
@@ -24,6 +50,10 @@ class Task(Base):
         nullable=False,
         default=TaskStatus.PLANNED)
 
+    # Bumped by every update, identifies the state of the task in ETags
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, server_default='1')
+
     # Additional fields
     created_at: Mapped[DateTime] = mapped_column(
         DateTime(timezone=True),
@@ -33,3 +63,8 @@ class Task(Base):
             "users.id",
             ondelete="SET NULL"),
         nullable=True)
+
+    # Maintained by the database, never loaded with the task
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True),
+        deferred=True)
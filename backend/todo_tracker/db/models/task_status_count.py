@@ -0,0 +1,23 @@
+from sqlalchemy import BigInteger, Enum, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from todo_tracker.db.base import Base
+from todo_tracker.db.models.task import TaskStatus
+
+# Creator id of the rows counting tasks of every creator
+ALL_CREATORS = 0
+
+
+class TaskStatusCount(Base):
+    '''
+    Number of tasks in each status per creator, kept up to date by
+    every write of task_crud in the statement that changes the tasks.
+    '''
+    __tablename__ = 'task_status_counts'
+
+    # No foreign key: ALL_CREATORS is not a user
+    creator_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    status: Mapped[TaskStatus] = mapped_column(Enum(TaskStatus),
+                                               primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False,
+                                       default=0)
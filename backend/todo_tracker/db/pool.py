@@ -0,0 +1,54 @@
+import time
+
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    '''
+    Queue pool that measures how long checkouts wait for a connection,
+    including time spent opening new connections and pinging them.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except TimeoutError:
+            self.checkout_timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - started
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+
+def get_db_pool_stats(engine: AsyncEngine) -> dict:
+    '''Describe usage of the connection pool behind the engine.'''
+    pool = engine.pool
+    stats = {
+        'pool_size': pool.size(),
+        'max_overflow': pool._max_overflow,
+        'checked_in_connections': pool.checkedin(),
+        'in_use_connections': pool.checkedout(),
+        'overflow_connections': max(0, pool.overflow()),
+    }
+    if isinstance(pool, InstrumentedAsyncPool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'checkout_timeouts': pool.checkout_timeouts,
+            'checkout_wait_avg_ms': round(
+                pool.checkout_wait_total / pool.checkouts * 1000, 3
+            ) if pool.checkouts else None,
+            'checkout_wait_max_ms': round(pool.checkout_wait_max * 1000, 3),
+        })
+    return stats
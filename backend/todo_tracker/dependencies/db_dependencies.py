@@ -1,4 +1,48 @@
-from todo_tracker.db.base import async_session_factory
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncContextManager, Callable, Optional
+
+from fastapi import Depends, Request
+from fastapi.security.utils import get_authorization_scheme_param
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from todo_tracker.db.base import (async_session_factory, database_setings,
+                                  replica_session_factory)
+from todo_tracker.redis.recent_writes import has_recent_write
+from todo_tracker.redis.redis_config import get_redis_client
+from todo_tracker.utils.jwt import token_settings, verify_token
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaHealth:
+    '''
+    Sends reads to the primary for a while after the replica
+    failed to provide a connection.
+    '''
+
+    def __init__(self, retry_seconds: float):
+        self.retry_seconds = retry_seconds
+        self.retry_at = 0.0
+        self.failures = 0
+
+    def is_available(self) -> bool:
+        return time.monotonic() >= self.retry_at
+
+    def mark_failed(self) -> None:
+        self.failures += 1
+        self.retry_at = time.monotonic() + self.retry_seconds
+
+    def stats(self) -> dict:
+        return {'available': self.is_available(), 'failures': self.failures}
+
+
+replica_health = ReplicaHealth(database_setings.DB_REPLICA_RETRY_SECONDS)
 
 
 async def get_session():
@@ -15,3 +59,130 @@ async def get_session():
     """
     async with async_session_factory() as session:
         yield session
+
+
+def get_session_factory():
+    """
+    Provides the session factory itself instead of a ready session.
+
+    Used by endpoints that stream their response: the session has to live
+    as long as the response body is being produced, so it is opened inside
+    the streaming generator rather than by the request dependency.
+
+    Returns:
+        async_sessionmaker: Factory producing database sessions.
+    """
+    return async_session_factory
+
+
+def get_replica_session_factory() -> Optional[async_sessionmaker]:
+    """
+    Provides the session factory of the read replica.
+
+    Returns:
+        async_sessionmaker | None: Factory producing replica sessions,
+        or None when no replica is configured.
+    """
+    return replica_session_factory
+
+
+async def get_read_session(
+        request: Request,
+        session: AsyncSession = Depends(get_session),
+        replica_factory: Optional[async_sessionmaker] = Depends(
+            get_replica_session_factory),
+        redis_client: Redis = Depends(get_redis_client)):
+    """
+    Provides a database session for read-only endpoints.
+
+    Reads go to the replica when one is configured, except for users
+    who wrote recently, so they read their own writes, and except
+    while the replica is failing to provide connections.
+
+    Args:
+        request (Request): The incoming request carrying the access token.
+        session (AsyncSession): Session of the primary database.
+        replica_factory (async_sessionmaker | None): Replica session factory.
+        redis_client (Redis): Redis client holding recent writes.
+
+    Yields:
+        AsyncSession: A session of the replica or of the primary.
+    """
+    if (replica_factory is None or not replica_health.is_available()
+            or await _has_recent_write(request, redis_client)):
+        yield session
+        return
+
+    replica_session = await _connect_replica(replica_factory)
+    if replica_session is None:
+        yield session
+        return
+    async with replica_session:
+        yield replica_session
+
+
+async def get_read_session_factory(
+        request: Request,
+        session_factory: async_sessionmaker = Depends(get_session_factory),
+        replica_factory: Optional[async_sessionmaker] = Depends(
+            get_replica_session_factory),
+        redis_client: Redis = Depends(get_redis_client)
+) -> Callable[[], AsyncContextManager[AsyncSession]]:
+    """
+    Provides a session factory for read-only endpoints that stream
+    their response, routed like `get_read_session`.
+
+    Args:
+        request (Request): The incoming request carrying the access token.
+        session_factory (async_sessionmaker): Primary session factory.
+        replica_factory (async_sessionmaker | None): Replica session factory.
+        redis_client (Redis): Redis client holding recent writes.
+
+    Returns:
+        Callable: Opens a session of the replica, or of the primary
+        when the replica fails to provide a connection.
+    """
+    if (replica_factory is None or not replica_health.is_available()
+            or await _has_recent_write(request, redis_client)):
+        return session_factory
+
+    @asynccontextmanager
+    async def read_session():
+        replica_session = await _connect_replica(replica_factory)
+        if replica_session is None:
+            async with session_factory() as session:
+                yield session
+            return
+        async with replica_session:
+            yield replica_session
+
+    return read_session
+
+
+async def _connect_replica(
+        replica_factory: async_sessionmaker) -> Optional[AsyncSession]:
+    replica_session = replica_factory()
+    try:
+        # Connect eagerly to fall back before any query is issued
+        await replica_session.connection()
+    except (OSError, SQLAlchemyError, asyncio.TimeoutError) as error:
+        await replica_session.close()
+        replica_health.mark_failed()
+        logger.warning('Read replica is unavailable: %s', error)
+        return None
+    return replica_session
+
+
+async def _has_recent_write(request: Request, redis_client: Redis) -> bool:
+    scheme, token = get_authorization_scheme_param(
+        request.headers.get('Authorization'))
+    if scheme.lower() != 'bearer' or not token:
+        return False
+    payload = await verify_token(token, token_settings.JWT_SECRET_KEY)
+    if payload is None:
+        return False
+    try:
+        return await has_recent_write(redis_client, payload['sub'])
+    except RedisError:
+        # Primary is always consistent, prefer it when in doubt
+        return True
@@ -1,28 +1,47 @@
+import logging
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from todo_tracker.db.crud.user_crud import get_user_by_username
-from todo_tracker.db.models.user import User
 from todo_tracker.dependencies.db_dependencies import get_session
+from todo_tracker.redis.recent_writes import mark_recent_write
+from todo_tracker.redis.redis_config import get_redis_client
+from todo_tracker.redis.revocation import is_token_revoked
 from todo_tracker.schemas.jwt_token_schemas import TokenData
+from todo_tracker.schemas.user_schemas import AuthenticatedUser
 from todo_tracker.utils.jwt import token_settings, verify_token
 
+logger = logging.getLogger(__name__)
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='/auth/login')
 
 
 async def get_current_user(
           token: str = Depends(oauth2_scheme),
-          db: AsyncSession = Depends(get_session)) -> User:
+          db: AsyncSession = Depends(get_session),
+          redis_client: Redis = Depends(get_redis_client)
+) -> AuthenticatedUser:
     """
     Retrieves the current authenticated user based on a JWT token.
 
+    When `JWT_STATELESS_PRINCIPAL` is enabled and the token carries
+    `uid` and `active` claims, the user is built from the token without
+    a database query; a Redis deny list covers revoked users.
+    Older tokens fall back to loading the user from the database, and
+    so do all tokens while Redis is unavailable: deactivated users are
+    still rejected then, tokens issued before a password change are not.
+
     Args:
         token (str): JWT token provided by the user for authentication.
         db (AsyncSession): Database session used to retrieve user information.
+        redis_client (Redis): Redis client used to check revoked users.
 
     Returns:
-        User: The authenticated user associated with the token.
+        AuthenticatedUser: The authenticated user associated with the token.
 
     Raises:
         HTTPException: If token validation fails or user is not found,
@@ -42,8 +61,52 @@ async def get_current_user(
     username: str = payload.get('sub')
     if username is None:
         raise credentials_exception
+
+    if token_settings.JWT_STATELESS_PRINCIPAL and 'uid' in payload:
+        if not payload.get('active'):
+            raise credentials_exception
+        try:
+            revoked = await is_token_revoked(redis_client, payload['uid'],
+                                             payload.get('iat'))
+        except RedisError:
+            # The deny list is unknown, check the user in the database
+            logger.warning('Failed to check revoked tokens of %s',
+                           username, exc_info=True)
+        else:
+            if revoked:
+                raise credentials_exception
+            return AuthenticatedUser(id=payload['uid'], username=username,
+                                     is_active=True)
+
     token_data = TokenData(username=username)
     user = await get_user_by_username(session=db, username=token_data.username)
-    if user is None:
+    if user is None or not user.is_active:
         raise credentials_exception
-    return user
+    return AuthenticatedUser.model_validate(user)
+
+
+async def get_current_writer(
+          user: AuthenticatedUser = Depends(get_current_user),
+          redis_client: Redis = Depends(get_redis_client)
+):
+    """
+    Retrieves the current user of an endpoint that changes data.
+
+    Once the endpoint succeeds the user is marked as a recent writer,
+    so `get_read_session` sends their reads to the primary database
+    for `DB_READ_YOUR_WRITES_SECONDS`. The write is committed by then,
+    so a Redis failure is only logged and the response still succeeds.
+
+    Args:
+        user (AuthenticatedUser): The authenticated user.
+        redis_client (Redis): Redis client holding recent writes.
+
+    Yields:
+        AuthenticatedUser: The authenticated user.
+    """
+    yield user
+    try:
+        await mark_recent_write(redis_client, user.username)
+    except RedisError:
+        logger.warning('Failed to mark recent write of %s',
+                       user.username, exc_info=True)
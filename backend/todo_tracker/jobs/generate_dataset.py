@@ -0,0 +1,275 @@
+'''
+Bulk-loads synthetic users and tasks for scaling experiments.
+
+Rows are written with COPY in chunks, each chunk in its own transaction
+together with its task status counters. Every chunk is generated from
+the seed and its number only, so the same arguments always produce
+the same dataset, and an interrupted run resumes from the first chunk
+that is not loaded yet when started again with the same arguments.
+
+Run from the backend directory, e.g. 10 000 users and 1M tasks:
+    python -m todo_tracker.jobs.generate_dataset --users 10000 \
+        --tasks 1000000 --seed 1
+
+Synthetic users are named "<prefix>-<number>" and log in with --password.
+'''
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence, Tuple
+
+import asyncpg
+
+from todo_tracker.db.base import SQLALCHEMY_DATABASE_URL
+from todo_tracker.db.models.task import TaskStatus
+from todo_tracker.db.models.task_status_count import ALL_CREATORS
+from todo_tracker.utils.password import get_password_hash
+
+CHUNK_SIZE = 50_000
+TASK_COLUMNS = ('title', 'description', 'status', 'created_at',
+                'creator_id')
+# Exponent of the Zipf law of tasks per creator: few users own most tasks
+CREATOR_SKEW = 1.1
+# Share of tasks without a description
+EMPTY_DESCRIPTION_SHARE = 0.2
+WORDS = (
+    'купить', 'молоко', 'отчёт', 'встреча', 'позвонить', 'клиент',
+    'проект', 'задача', 'исправить', 'ошибка', 'документация', 'релиз',
+    'review', 'deploy', 'meeting', 'invoice', 'backup', 'server',
+    'database', 'migration', 'release', 'design', 'bug', 'feature',
+)
+
+# Statuses sort in declaration order in PostgreSQL enums
+STATUS_ORDER = {status.name: order
+                for order, status in enumerate(TaskStatus)}
+
+COUNTERS_UPSERT = '''
+INSERT INTO task_status_counts (creator_id, status, count)
+VALUES ($1, $2, $3)
+ON CONFLICT (creator_id, status)
+DO UPDATE SET count = task_status_counts.count + excluded.count
+'''
+
+
+def task_status(rng: random.Random, age: float) -> str:
+    '''Older tasks are more likely completed, newer ones planned.'''
+    draw = rng.random()
+    if draw < 0.15 + 0.7 * age:
+        return TaskStatus.COMPLETED.name
+    if draw < 0.3 + 0.6 * age:
+        return TaskStatus.IN_PROGRESS.name
+    return TaskStatus.PLANNED.name
+
+
+def words(rng: random.Random, low: int, high: int) -> str:
+    return ' '.join(rng.choices(WORDS, k=rng.randint(low, high)))
+
+
+def generate_chunk(chunk: int, creator_ids: Sequence[int],
+                   cum_weights: Sequence[float], tasks: int, seed: int,
+                   since: datetime, until: datetime,
+                   chunk_size: int = CHUNK_SIZE) -> List[Tuple]:
+    """
+    Generates task records of one chunk.
+
+    Tasks are created more often as time goes on and are ordered by
+    creation time, so the table is physically ordered by `created_at`
+    like a real one.
+
+    Args:
+        chunk (int): Number of the chunk.
+        creator_ids (Sequence[int]): IDs of synthetic users.
+        cum_weights (Sequence[float]): Cumulative weights of creators.
+        tasks (int): Total number of tasks in the dataset.
+        seed (int): Seed of the dataset.
+        since (datetime): Creation time of the first task.
+        until (datetime): Creation time of the last task.
+        chunk_size (int): Number of tasks in a chunk.
+
+    Returns:
+        List[Tuple]: Records with values of `TASK_COLUMNS`.
+    """
+    rng = random.Random(seed * 1_000_003 + chunk)
+    span = (until - since).total_seconds()
+    first = chunk * chunk_size
+    records = []
+    creators = rng.choices(creator_ids, cum_weights=cum_weights,
+                           k=min(chunk_size, tasks - first))
+    for number, creator_id in enumerate(creators, start=first):
+        # Square root of the position spreads tasks with linearly
+        # growing density, the newest days have the most tasks
+        position = math.sqrt(number / max(1, tasks - 1))
+        description = ('' if rng.random() < EMPTY_DESCRIPTION_SHARE
+                       else words(rng, 3, 30))
+        records.append((
+            words(rng, 2, 6).capitalize(),
+            description,
+            task_status(rng, 1 - position),
+            since + timedelta(seconds=span * position),
+            creator_id,
+        ))
+    return records
+
+
+def creator_weights(count: int, seed: int) -> List[float]:
+    '''Cumulative Zipf weights of creators in a seeded random order.'''
+    weights = [1 / rank ** CREATOR_SKEW for rank in range(1, count + 1)]
+    random.Random(seed).shuffle(weights)
+    return list(itertools.accumulate(weights))
+
+
+async def load_users(connection: asyncpg.Connection, users: int,
+                     prefix: str, password: str) -> List[int]:
+    '''Create missing synthetic users and return IDs of all of them.'''
+    usernames = [f'{prefix}-{number}' for number in range(users)]
+    async with connection.transaction():
+        existing = {
+            row['username'] for row in await connection.fetch(
+                'SELECT username FROM users WHERE username = ANY($1)',
+                usernames)
+        }
+        missing = [name for name in usernames if name not in existing]
+        if missing:
+            # One hash for everybody, bcrypt is far too slow per user
+            password_hash = get_password_hash(password)
+            await connection.copy_records_to_table(
+                'users', columns=('username', 'password_hash', 'is_active'),
+                records=((name, password_hash, True) for name in missing))
+        ids = dict(await connection.fetch(
+            'SELECT username, id FROM users WHERE username = ANY($1)',
+            usernames))
+    return [ids[name] for name in usernames]
+
+
+async def load_chunk(connection: asyncpg.Connection,
+                     records: List[Tuple]) -> None:
+    '''Copy tasks and add them to the status counters atomically.'''
+    counts = Counter()
+    for _, _, status, _, creator_id in records:
+        counts[creator_id, status] += 1
+        counts[ALL_CREATORS, status] += 1
+    async with connection.transaction():
+        await connection.copy_records_to_table(
+            'tasks', columns=TASK_COLUMNS, records=records)
+        # Key order, like task_crud, so concurrent writes cannot deadlock
+        await connection.executemany(COUNTERS_UPSERT, [
+            (creator_id, status, counts[creator_id, status])
+            for creator_id, status in sorted(
+                counts, key=lambda key: (key[0], STATUS_ORDER[key[1]]))
+        ])
+
+
+async def loaded_tasks(connection: asyncpg.Connection,
+                       creator_ids: List[int]) -> int:
+    '''Count tasks of synthetic users from the status counters.'''
+    return await connection.fetchval(
+        'SELECT coalesce(sum(count), 0)::bigint FROM task_status_counts '
+        'WHERE creator_id = ANY($1)', creator_ids)
+
+
+async def generate(connection: asyncpg.Connection, users: int, tasks: int,
+                   seed: int, since: datetime, until: datetime, prefix: str,
+                   password: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Loads the dataset into the database, skipping loaded chunks.
+
+    Args:
+        connection (asyncpg.Connection): Connection to the database.
+        users (int): Number of synthetic users.
+        tasks (int): Number of tasks in the dataset.
+        seed (int): Seed of the dataset.
+        since (datetime): Creation time of the first task.
+        until (datetime): Creation time of the last task.
+        prefix (str): Prefix of synthetic usernames.
+        password (str): Password of synthetic users.
+        chunk_size (int): Number of tasks loaded per transaction.
+
+    Returns:
+        int: Number of tasks loaded by this run.
+
+    Raises:
+        RuntimeError: If synthetic users have tasks that do not fit
+        the dataset, e.g. created through the API.
+    """
+    creator_ids = await load_users(connection, users, prefix, password)
+    loaded = await loaded_tasks(connection, creator_ids)
+    if loaded > tasks or (loaded % chunk_size and loaded != tasks):
+        raise RuntimeError(
+            f'Synthetic users already have {loaded} tasks, which is not a '
+            f'whole number of chunks of {chunk_size} up to {tasks}. Were '
+            f'other arguments used before?')
+    cum_weights = creator_weights(users, seed)
+    chunks = range(math.ceil(loaded / chunk_size),
+                   math.ceil(tasks / chunk_size))
+    if loaded:
+        print(f'Resuming after {loaded} loaded tasks')
+
+    def generate_records(chunk: int):
+        return generate_chunk(chunk, creator_ids, cum_weights, tasks, seed,
+                              since, until, chunk_size)
+
+    started = time.perf_counter()
+    written = 0
+    next_records = None
+    for chunk in chunks:
+        records = await (next_records or asyncio.to_thread(generate_records,
+                                                           chunk))
+        # Next chunk is generated while the database loads this one
+        next_records = None
+        if chunk + 1 < chunks.stop:
+            next_records = asyncio.ensure_future(
+                asyncio.to_thread(generate_records, chunk + 1))
+        await load_chunk(connection, records)
+        written += len(records)
+        print(f'Chunk {chunk + 1}/{chunks.stop}: {loaded + written} tasks, '
+              f'{written / (time.perf_counter() - started):.0f} tasks/s')
+    if written:
+        await connection.execute('ANALYZE users, tasks')
+    return written
+
+
+async def generate_into(dsn: str, **dataset) -> int:
+    '''Load the dataset through a connection of its own.'''
+    connection = await asyncpg.connect(dsn)
+    try:
+        return await generate(connection, **dataset)
+    finally:
+        await connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--tasks', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=365,
+                        help='Days over which tasks were created')
+    parser.add_argument('--until', type=datetime.fromisoformat,
+                        default=datetime(2025, 1, 1, tzinfo=timezone.utc),
+                        help='Creation time of the newest task, ISO 8601')
+    parser.add_argument('--prefix', default='synthetic')
+    parser.add_argument('--password', default='synthetic-password')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    until = args.until
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    written = asyncio.run(generate_into(
+        dsn=SQLALCHEMY_DATABASE_URL.replace('+asyncpg', ''),
+        users=args.users, tasks=args.tasks, seed=args.seed,
+        since=until - timedelta(days=args.days), until=until,
+        prefix=args.prefix, password=args.password,
+        chunk_size=args.chunk_size))
+    print(f'Dataset loaded, {written} tasks written')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+'''
+Recomputes task status counters from the tasks table to fix drift,
+e.g. after tasks were changed bypassing task_crud or creators deleted.
+
+Run from the backend directory, e.g. periodically from cron:
+    python -m todo_tracker.jobs.reconcile_task_counts
+'''
+import asyncio
+
+from todo_tracker.db.base import async_engine, async_session_factory
+from todo_tracker.db.crud import task_crud
+
+
+async def main():
+    async with async_session_factory() as session:
+        corrected = await task_crud.reconcile_task_counts(session=session)
+        await session.commit()
+    await async_engine.dispose()
+    print(f'Task counters reconciled, {corrected} corrected')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
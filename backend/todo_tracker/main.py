@@ -2,15 +2,19 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-from todo_tracker.redis.redis_config import get_redis_client
-from todo_tracker.routers import auth, task
+from todo_tracker.redis.redis_config import create_redis_client
+from todo_tracker.redis.task_cache import task_cache
+from todo_tracker.routers import auth, metrics, service, task
+from todo_tracker.utils.metrics import MetricsMiddleware, metrics_settings
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis_client = get_redis_client()
-    app.state.redis = get_redis_client()
+    redis_client = create_redis_client()
+    app.state.redis = redis_client
+    await task_cache.start(redis_client)
     yield
+    await task_cache.stop()
     await redis_client.aclose()
 
 app = FastAPI(
@@ -19,3 +23,8 @@ app = FastAPI(
 
 app.include_router(auth.router)
 app.include_router(task.router)
+app.include_router(service.router)
+
+if metrics_settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
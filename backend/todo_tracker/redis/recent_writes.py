@@ -0,0 +1,37 @@
+from redis.asyncio import Redis
+
+from todo_tracker.db.base import database_setings
+
+
+def _recent_write_key(username: str) -> str:
+    return f'recent-write:{username}'
+
+
+async def mark_recent_write(redis_client: Redis, username: str) -> None:
+    """
+    Remembers that the user has just changed data on the primary.
+
+    Reads of the user are served by the primary while the entry lives,
+    so they see their own writes despite replication lag.
+
+    Args:
+        redis_client (Redis): Redis client.
+        username (str): Name of the user who made the write.
+    """
+    await redis_client.set(
+        _recent_write_key(username), 1,
+        ex=database_setings.DB_READ_YOUR_WRITES_SECONDS)
+
+
+async def has_recent_write(redis_client: Redis, username: str) -> bool:
+    """
+    Checks whether the user wrote within the read-your-writes window.
+
+    Args:
+        redis_client (Redis): Redis client.
+        username (str): Name of the user.
+
+    Returns:
+        bool: True if reads of the user must go to the primary.
+    """
+    return bool(await redis_client.exists(_recent_write_key(username)))
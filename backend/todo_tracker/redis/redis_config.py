@@ -1,19 +1,50 @@
 from dotenv import load_dotenv
-from redis.asyncio import Redis
+from fastapi import Request
+from redis.asyncio import BlockingConnectionPool, Redis
 
 from todo_tracker.config import RedisSettings
+from todo_tracker.utils.metrics import InstrumentedRedis, metrics_settings
 
 load_dotenv()
 
 redis_settings = RedisSettings()
 
 
-# Initialize Redis client
-def get_redis_client() -> Redis:
-    '''Get Redis client.'''
-    redis_client = Redis(
+def create_redis_client() -> Redis:
+    '''
+    Create Redis client backed by a sized connection pool.
+    Called once per application in lifespan, requests share the client.
+    '''
+    connection_pool = BlockingConnectionPool(
         host=redis_settings.REDIS_HOST,
         port=redis_settings.REDIS_PORT,
-        decode_responses=True
+        decode_responses=True,
+        max_connections=redis_settings.REDIS_MAX_CONNECTIONS,
+        timeout=redis_settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=redis_settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=redis_settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=redis_settings.REDIS_HEALTH_CHECK_INTERVAL,
     )
-    return redis_client
+    client_class = (InstrumentedRedis if metrics_settings.METRICS_ENABLED
+                    else Redis)
+    # from_pool hands pool ownership to the client, aclose() disconnects it
+    return client_class.from_pool(connection_pool)
+
+
+def get_redis_client(request: Request) -> Redis:
+    '''Get application wide Redis client created in lifespan.'''
+    return request.app.state.redis
+
+
+def get_redis_pool_stats(redis_client: Redis) -> dict:
+    '''Describe usage of the connection pool behind Redis client.'''
+    connection_pool = redis_client.connection_pool
+    # redis-py exposes no public counters, read pool bookkeeping directly
+    available = len(connection_pool._available_connections)
+    in_use = len(connection_pool._in_use_connections)
+    return {
+        'max_connections': connection_pool.max_connections,
+        'created_connections': available + in_use,
+        'available_connections': available,
+        'in_use_connections': in_use,
+    }
@@ -0,0 +1,51 @@
+import time
+
+from redis.asyncio import Redis
+
+from todo_tracker.utils.jwt import token_settings
+
+
+def _revoked_user_key(user_id: int) -> str:
+    return f'revoked-user:{user_id}'
+
+
+async def revoke_user_tokens(
+        redis_client: Redis, user_id: int, username: str) -> None:
+    """
+    Invalidates every token issued to the user so far.
+
+    Must be called whenever a user is deactivated or changes password:
+    stateless access tokens carry `is_active` and stay valid until they
+    expire otherwise. The entry lives as long as the longest possible
+    access token, the stored refresh token is deleted, so it cannot
+    mint new access tokens after that.
+
+    Args:
+        redis_client (Redis): Redis client.
+        user_id (int): ID of the user whose tokens are revoked.
+        username (str): Username the refresh token is stored under.
+    """
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.set(_revoked_user_key(user_id), time.time(),
+                 ex=token_settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        pipe.delete(username)
+        await pipe.execute()
+
+
+async def is_token_revoked(
+        redis_client: Redis, user_id: int, issued_at: float | None) -> bool:
+    """
+    Checks whether a token was issued before its user was revoked.
+
+    Args:
+        redis_client (Redis): Redis client.
+        user_id (int): ID of the user the token belongs to.
+        issued_at (float | None): The `iat` claim of the token.
+
+    Returns:
+        bool: True if the token must be rejected.
+    """
+    revoked_at = await redis_client.get(_revoked_user_key(user_id))
+    if revoked_at is None:
+        return False
+    return issued_at is None or issued_at <= float(revoked_at)
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from todo_tracker.config import TaskCacheSettings
+from todo_tracker.utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'task-cache:invalidate'
+RECONNECT_DELAY_SECONDS = 1
+# Kept below the socket timeout, so an idle subscription does not time out
+LISTEN_POLL_SECONDS = 1
+# Stored in place of invalidated tasks for a while
+TOMBSTONE = 'invalidated'
+
+
+class TaskCache:
+    '''
+    Two-tier read-through cache for single task reads.
+
+    The first tier is a bounded in-process LRU with TTL, the second one
+    is Redis shared by all workers. Writers call `invalidate`, which drops
+    both tiers and notifies other workers through Redis pub/sub.
+    Concurrent misses for the same task are collapsed into one load.
+
+    Invalidated tasks are replaced in Redis by a short-lived tombstone
+    and loads only add missing keys, so a worker that read the database
+    before a write of another worker cannot put the old task back.
+    '''
+
+    def __init__(self, settings: TaskCacheSettings):
+        self.enabled = settings.TASK_CACHE_ENABLED
+        self.redis_ttl = settings.TASK_CACHE_REDIS_TTL_SECONDS
+        self.tombstone_ttl = settings.TASK_CACHE_TOMBSTONE_TTL_SECONDS
+        self._local = TTLCache(maxsize=settings.TASK_CACHE_LOCAL_MAXSIZE,
+                               ttl=settings.TASK_CACHE_LOCAL_TTL_SECONDS)
+        self._redis: Optional[Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._inflight: Dict[int, asyncio.Task] = {}
+        # Bumped on every invalidation, lets loads detect concurrent writes
+        self._generation = 0
+        self.counters = {
+            'local_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+            'coalesced': 0,
+            'invalidations': 0,
+        }
+
+    async def start(self, redis_client: Redis) -> None:
+        '''Enable the Redis tier and start listening for invalidations.'''
+        self._redis = redis_client
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._redis = None
+
+    def clear_local(self) -> None:
+        self._local.clear()
+
+    def stats(self) -> dict:
+        return {**self.counters, 'local_size': len(self._local)}
+
+    async def get_or_load(
+            self,
+            task_id: int,
+            loader: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Returns serialized task from the cache or loads it on a miss.
+
+        Args:
+            task_id (int): ID of the task to retrieve.
+            loader (Callable[[], Awaitable[dict]]): Coroutine function
+                loading the serialized task from the database. It may
+                run on behalf of other callers after this one is
+                cancelled, so it must not use resources of the request,
+                like its database session.
+
+        Returns:
+            dict: Serialized task.
+        """
+        if not self.enabled:
+            return await loader()
+
+        value = self._local.get(task_id)
+        if value is not None:
+            self.counters['local_hits'] += 1
+            return value
+
+        load = self._inflight.get(task_id)
+        if load is not None:
+            self.counters['coalesced'] += 1
+        else:
+            load = asyncio.ensure_future(self._load(task_id, loader))
+            self._inflight[task_id] = load
+            load.add_done_callback(
+                lambda _: self._inflight.pop(task_id, None))
+        # Shield so a cancelled caller does not cancel the shared load
+        return await asyncio.shield(load)
+
+    async def invalidate(self, task_ids: Iterable[int]) -> None:
+        '''Drop tasks from both tiers in every worker process.'''
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        self.counters['invalidations'] += len(task_ids)
+        self._drop_local(task_ids)
+        if self._redis is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for task_id in task_ids:
+                    pipe.set(self._key(task_id), TOMBSTONE,
+                             ex=self.tombstone_ttl)
+                pipe.publish(INVALIDATION_CHANNEL, json.dumps(task_ids))
+                await pipe.execute()
+        except RedisError:
+            logger.warning('Failed to invalidate tasks %s in Redis',
+                           task_ids, exc_info=True)
+
+    async def _load(
+            self,
+            task_id: int,
+            loader: Callable[[], Awaitable[dict]]) -> dict:
+        generation = self._generation
+        value = await self._redis_get(task_id)
+        if value is not None:
+            self.counters['redis_hits'] += 1
+        else:
+            self.counters['misses'] += 1
+            value = await loader()
+            if generation == self._generation:
+                await self._redis_set(task_id, value)
+        # A write that happened during the load makes the value suspect
+        if generation == self._generation:
+            self._local.set(task_id, value)
+        return value
+
+    async def _redis_get(self, task_id: int) -> Optional[dict]:
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(self._key(task_id))
+        except RedisError:
+            logger.warning('Task cache read from Redis failed',
+                           exc_info=True)
+            return None
+        if raw is None or raw == TOMBSTONE:
+            return None
+        return json.loads(raw)
+
+    async def _redis_set(self, task_id: int, value: dict) -> None:
+        if self._redis is None:
+            return
+        try:
+            # Neither a tombstone nor a value of a concurrent load
+            # is overwritten
+            await self._redis.set(self._key(task_id), json.dumps(value),
+                                  ex=self.redis_ttl, nx=True)
+        except RedisError:
+            logger.warning('Task cache write to Redis failed',
+                           exc_info=True)
+
+    def _drop_local(self, task_ids: Iterable[int]) -> None:
+        self._generation += 1
+        for task_id in task_ids:
+            self._local.delete(task_id)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Invalidations published while disconnected are lost
+                self._local.clear()
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=LISTEN_POLL_SECONDS)
+                    if message is not None:
+                        self._on_invalidation(message['data'])
+            except RedisError:
+                logger.warning('Task cache invalidation listener failed, '
+                               'reconnecting', exc_info=True)
+                await asyncio.sleep(RECONNECT_DELAY_SECONDS)
+            finally:
+                await pubsub.aclose()
+
+    def _on_invalidation(self, data: str) -> None:
+        try:
+            task_ids = [int(task_id) for task_id in json.loads(data)]
+        except (TypeError, ValueError):
+            # One bad message must not stop the listener
+            logger.warning('Malformed task cache invalidation: %r', data)
+            return
+        self._drop_local(task_ids)
+
+    @staticmethod
+    def _key(task_id: int) -> str:
+        # Versioned with the shape of the cached task
+        return f'task:v2:{task_id}'
+
+
+task_cache = TaskCache(TaskCacheSettings())
@@ -3,17 +3,18 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from redis import Redis
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from todo_tracker.db.crud import user_crud
 from todo_tracker.dependencies.db_dependencies import get_session
 from todo_tracker.redis.redis_config import get_redis_client
+from todo_tracker.redis.revocation import is_token_revoked
 from todo_tracker.schemas.jwt_token_schemas import JWTTokens, RefreshToken
 from todo_tracker.schemas.user_schemas import UserRead
 from todo_tracker.utils.auth import authenticate_user
 from todo_tracker.utils.jwt import (create_access_token, create_refresh_token,
-                                    token_settings, verify_token)
+                                    token_settings, user_claims, verify_token)
 
 router = APIRouter(
     prefix='/auth',
@@ -45,8 +46,8 @@ async def create_token(
         password=user_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    access_token = await create_access_token(data={"sub": user.username, })
-    refresh_token = await create_refresh_token(data={"sub": user.username, })
+    access_token = await create_access_token(data=user_claims(user))
+    refresh_token = await create_refresh_token(data=user_claims(user))
 
     await redis_client.setex(
         user.username,
@@ -61,8 +62,11 @@ async def create_token(
              response_model=JWTTokens)
 async def refresh_token(
         token: RefreshToken,
+        session: AsyncSession = Depends(get_session),
         redis_client: Redis = Depends(get_redis_client)):
     '''Returns new access token if valid refresh token was provided.
+    Claims of the new token are read from the database, so tokens of
+    revoked or deactivated users are not refreshed.
     Returns:
         JWTTokens: access token, refresh token and token type.
 
@@ -80,8 +84,17 @@ async def refresh_token(
     if saved_token != token.refresh_token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
                             detail="Invalid or expired refresh token")
-    new_access_token = await create_access_token({"sub": payload["sub"]})
+    if 'uid' in payload and await is_token_revoked(
+            redis_client, payload['uid'], payload.get('iat')):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid or expired refresh token")
+    user = await user_crud.get_user_by_username(
+        username=payload["sub"], session=session)
+    if user is None or not user.is_active:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid or expired refresh token")
+    new_access_token = await create_access_token(user_claims(user))
 
     return {"access_token": new_access_token,
-            "refresh_token": refresh_token.refresh_token,
+            "refresh_token": token.refresh_token,
             "token_type": "bearer"}
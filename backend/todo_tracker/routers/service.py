@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, status
+from redis.asyncio import Redis
+
+from todo_tracker.db.base import async_engine, replica_engine
+from todo_tracker.db.pool import get_db_pool_stats
+from todo_tracker.dependencies.db_dependencies import replica_health
+from todo_tracker.redis.redis_config import (get_redis_client,
+                                             get_redis_pool_stats)
+
+router = APIRouter(
+    prefix='/service',
+    tags=['Service', ]
+)
+
+
+@router.get('/redis/pool', status_code=status.HTTP_200_OK)
+async def get_redis_pool(
+        redis_client: Redis = Depends(get_redis_client)):
+    '''Returns usage statistics of the shared Redis connection pool.'''
+    return get_redis_pool_stats(redis_client)
+
+
+@router.get('/db/pool', status_code=status.HTTP_200_OK)
+async def get_db_pool():
+    '''Returns usage statistics of the database connection pool.'''
+    return get_db_pool_stats(async_engine)
+
+
+@router.get('/db/replica', status_code=status.HTTP_200_OK)
+async def get_db_replica():
+    '''Returns health and pool usage of the read replica if configured.'''
+    if replica_engine is None:
+        return {'configured': False}
+    return {'configured': True, **replica_health.stats(),
+            'pool': get_db_pool_stats(replica_engine)}
+
+
+@router.get('/health', status_code=status.HTTP_200_OK)
+async def health():
+    '''Liveness probe used by the gateway to balance between backends.'''
+    return {'status': 'ok'}
@@ -1,14 +1,21 @@
-from typing import List, Optional
+from typing import AsyncContextManager, Callable, List, Optional, Sequence
 
-from fastapi import APIRouter, Depends, status
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Depends, Header, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from todo_tracker.db.crud import task_crud
 from todo_tracker.db.models.task import Task, TaskStatus
-from todo_tracker.db.models.user import User
-from todo_tracker.dependencies.db_dependencies import get_session
-from todo_tracker.dependencies.jwt_dependencies import get_current_user
+from todo_tracker.dependencies.db_dependencies import (
+    get_read_session, get_read_session_factory, get_session,
+    get_session_factory)
+from todo_tracker.dependencies.jwt_dependencies import (get_current_user,
+                                                        get_current_writer)
+from todo_tracker.redis.task_cache import task_cache
 from todo_tracker.schemas import task_schemas
+from todo_tracker.schemas.user_schemas import AuthenticatedUser
+from todo_tracker.utils import etag, export, serialization
 
 router = APIRouter(
     prefix='/tasks',
@@ -16,6 +23,9 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Number of rows read from the database cursor per streamed chunk
+EXPORT_CHUNK_SIZE = 1000
+
 
 # POST REQUESTS
 @router.post('', status_code=status.HTTP_201_CREATED,
@@ -23,7 +33,7 @@ router = APIRouter(
 async def create_task(
     task_data: task_schemas.TaskCreate,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user)
+    user: AuthenticatedUser = Depends(get_current_writer)
 ):
     task_db: Task = await task_crud.create_task(
         task_data=task_data, session=session,
@@ -33,46 +43,207 @@ async def create_task(
     return task_db
 
 
+@router.post('/bulk', status_code=status.HTTP_201_CREATED,
+             response_model=List[task_schemas.TaskRead])
+async def create_tasks(
+    tasks_data: task_schemas.TaskBulkCreate,
+    session: AsyncSession = Depends(get_session),
+    user: AuthenticatedUser = Depends(get_current_writer)
+):
+    tasks_db: List[Task] = await task_crud.create_tasks(
+        tasks_data=tasks_data, session=session,
+        creator_id=user.id
+    )
+    await session.commit()
+    return tasks_db
+
+
+@router.post('/bulk/delete', status_code=status.HTTP_200_OK,
+             response_model=task_schemas.TaskBulkResult)
+async def delete_tasks(
+    bulk_data: task_schemas.TaskBulkDelete,
+    session: AsyncSession = Depends(get_session),
+    user: AuthenticatedUser = Depends(get_current_writer)
+):
+    affected_ids = await task_crud.delete_tasks(
+        task_ids=bulk_data.ids, session=session
+    )
+    await session.commit()
+    await task_cache.invalidate(affected_ids)
+    return _bulk_result(bulk_data.ids, affected_ids)
+
+
 # GET REQUESTS
 @router.get('', status_code=status.HTTP_200_OK,
-            response_model=List[task_schemas.TaskRead])
+            response_model=task_schemas.TaskPage)
 async def get_tasks(
-    session: AsyncSession = Depends(get_session),
-    status: Optional[TaskStatus] = None
+    session: AsyncSession = Depends(get_read_session),
+    status: Optional[TaskStatus] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None)
+):
+    tasks, next_cursor = await task_crud.get_tasks(
+        session=session,
+        status=status,
+        limit=limit,
+        cursor=cursor
+    )
+    return _task_page(tasks, next_cursor, if_none_match)
+
+
+@router.get('/mine', status_code=status.HTTP_200_OK,
+            response_model=task_schemas.TaskPage)
+async def get_my_tasks(
+    session: AsyncSession = Depends(get_read_session),
+    user: AuthenticatedUser = Depends(get_current_user),
+    status: Optional[TaskStatus] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None)
 ):
-    tasks: List[Task] = await task_crud.get_tasks(
+    tasks, next_cursor = await task_crud.get_tasks(
         session=session,
-        status=status
+        status=status,
+        limit=limit,
+        cursor=cursor,
+        creator_id=user.id,
+        newest_first=True
     )
-    return tasks
+    return _task_page(tasks, next_cursor, if_none_match)
+
+
+@router.get('/search', status_code=status.HTTP_200_OK,
+            response_model=task_schemas.TaskPage)
+async def search_tasks(
+    q: str = Query(min_length=1, max_length=256),
+    session: AsyncSession = Depends(get_read_session),
+    status: Optional[TaskStatus] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None)
+):
+    tasks, next_cursor = await task_crud.search_tasks(
+        session=session,
+        query=q,
+        status=status,
+        limit=limit,
+        cursor=cursor
+    )
+    return _task_page(tasks, next_cursor, if_none_match)
+
+
+@router.get('/stats', status_code=status.HTTP_200_OK,
+            response_model=task_schemas.TaskStats)
+async def get_task_stats(
+    creator_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session)
+):
+    counts = await task_crud.get_task_stats(session=session,
+                                            creator_id=creator_id)
+    return {'creator_id': creator_id, 'counts': counts,
+            'total': sum(counts.values())}
+
+
+@router.get('/export', status_code=status.HTTP_200_OK,
+            response_class=StreamingResponse)
+async def export_tasks(
+    format: task_schemas.ExportFormat = task_schemas.ExportFormat.NDJSON,
+    status: Optional[TaskStatus] = None,
+    session_factory: Callable[[], AsyncContextManager[AsyncSession]] = (
+        Depends(get_read_session_factory))
+):
+    async def generate_chunks():
+        async with session_factory() as session:
+            if format == task_schemas.ExportFormat.CSV:
+                yield export.csv_header()
+            async for rows in task_crud.stream_tasks(
+                    session=session, status=status,
+                    chunk_size=EXPORT_CHUNK_SIZE):
+                if format == task_schemas.ExportFormat.CSV:
+                    yield export.rows_to_csv(rows)
+                else:
+                    yield export.rows_to_ndjson(rows)
+
+    if format == task_schemas.ExportFormat.CSV:
+        media_type = 'text/csv'
+    else:
+        media_type = 'application/x-ndjson'
+    return StreamingResponse(
+        generate_chunks(), media_type=media_type,
+        headers={'Content-Disposition':
+                 f'attachment; filename="tasks.{format.value}"'}
+    )
+
+
+@router.get('/cache/stats', status_code=status.HTTP_200_OK)
+async def get_task_cache_stats():
+    return task_cache.stats()
 
 
 @router.get("/{task_id}", status_code=status.HTTP_200_OK,
             response_model=task_schemas.TaskRead)
 async def get_task(
         task_id: int,
-        session: AsyncSession = Depends(get_session)):
-    task_db: Task = await task_crud.get_task(
-        session=session, task_id=task_id
-    )
-    return task_db
+        response: Response,
+        session_factory: async_sessionmaker = Depends(get_session_factory),
+        if_none_match: Optional[str] = Header(default=None)):
+    # Loaded from the primary, the cache is shared by all users and
+    # would keep a lagging replica read long after the write.
+    # The load is shared with concurrent readers and outlives a reader
+    # that disconnects, so it opens a session of its own
+    async def load_task() -> dict:
+        async with session_factory() as session:
+            task_db: Task = await task_crud.get_task(
+                session=session, task_id=task_id
+            )
+            return task_schemas.TaskRead.model_validate(
+                task_db, from_attributes=True).model_dump(mode='json')
+
+    task = await task_cache.get_or_load(task_id, load_task)
+    tag = etag.task_etag(task['id'], task['version'])
+    if not etag.none_match(if_none_match, tag):
+        return _not_modified(tag)
+    response.headers['ETag'] = tag
+    return task
 
 
 # PUT REQUESTS
+@router.put('/bulk', status_code=status.HTTP_200_OK,
+            response_model=task_schemas.TaskBulkResult)
+async def update_tasks(
+    bulk_data: task_schemas.TaskBulkUpdate,
+    session: AsyncSession = Depends(get_session),
+    user: AuthenticatedUser = Depends(get_current_writer)
+):
+    affected_ids = await task_crud.update_tasks(
+        task_data=bulk_data.changes, session=session,
+        task_ids=bulk_data.ids
+    )
+    await session.commit()
+    await task_cache.invalidate(affected_ids)
+    return _bulk_result(bulk_data.ids, affected_ids)
+
+
 @router.put("/{task_id}",
             status_code=status.HTTP_200_OK,
             response_model=task_schemas.TaskRead,)
 async def update_task(
     task_data: task_schemas.TaskUpdate,
     task_id: int,
+    response: Response,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user)
+    user: AuthenticatedUser = Depends(get_current_writer),
+    if_match: Optional[str] = Header(default=None)
 ):
     task_db: Task = await task_crud.update_task(
         task_data=task_data, session=session,
-        task_id=task_id
+        task_id=task_id,
+        expected_versions=etag.matching_versions(if_match, task_id)
     )
     await session.commit()
+    await task_cache.invalidate([task_id])
+    response.headers['ETag'] = etag.task_etag(task_db.id, task_db.version)
     return task_db
 
 
@@ -81,6 +252,34 @@ async def update_task(
 async def delete_task(
     task_id: int,
     session: AsyncSession = Depends(get_session),
-    user: User = Depends(get_current_user)
+    user: AuthenticatedUser = Depends(get_current_writer)
 ):
     await task_crud.delete_task(session=session, task_id=task_id)
+    await session.commit()
+    await task_cache.invalidate([task_id])
+
+
+def _bulk_result(requested_ids: List[int], affected_ids: List[int]) -> dict:
+    affected = set(affected_ids)
+    return {
+        'affected_ids': sorted(affected),
+        'missing_ids': sorted(set(requested_ids) - affected),
+    }
+
+
+def _task_page(tasks: Sequence[Row], next_cursor: Optional[str],
+               if_none_match: Optional[str]) -> Response:
+    tag = etag.page_etag(((task.id, task.version) for task in tasks),
+                         next_cursor)
+    if not etag.none_match(if_none_match, tag):
+        return _not_modified(tag)
+    # Rows are dumped directly, response_model only documents the body
+    return Response(
+        content=serialization.task_page_json(tasks, next_cursor),
+        media_type='application/json', headers={'ETag': tag})
+
+
+def _not_modified(tag: str) -> Response:
+    # Returned as is, so the body is never validated nor serialized
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED,
+                    headers={'ETag': tag})
@@ -1,7 +1,8 @@
+import enum
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from todo_tracker.db.models.task import TaskStatus
 
@@ -15,14 +16,60 @@ class TaskCreate(TaskBase):
     status: Optional[TaskStatus] = TaskStatus.PLANNED
 
 
+# Upper bound keeps a single INSERT within asyncpg's bind parameter limit
+TaskBulkCreate = Annotated[List[TaskCreate],
+                           Field(min_length=1, max_length=1000)]
+
+
 class TaskUpdate(TaskBase):
     title: Optional[str] = None
     description: Optional[str] = None
     status: Optional[TaskStatus] = TaskStatus.PLANNED
 
 
+# Task ids are stored in a 32-bit integer column
+TaskId = Annotated[int, Field(ge=1, le=2 ** 31 - 1)]
+# Upper bound on the number of ids accepted by bulk update and delete
+TaskIds = Annotated[List[TaskId], Field(min_length=1, max_length=1000)]
+
+
+class TaskBulkUpdate(BaseModel):
+    ids: TaskIds
+    changes: TaskUpdate
+
+
+class TaskBulkDelete(BaseModel):
+    ids: TaskIds
+
+
+class TaskBulkResult(BaseModel):
+    affected_ids: List[int]
+    missing_ids: List[int]
+
+
 class TaskRead(TaskBase):
     id: int
     created_at: datetime
     creator_id: int
     status: TaskStatus
+    version: int
+
+
+# Keys of a serialized task, in the order TaskRead dumps them
+TASK_READ_FIELDS = tuple(TaskRead.model_fields)
+
+
+class TaskPage(BaseModel):
+    items: List[TaskRead]
+    next_cursor: Optional[str] = None
+
+
+class TaskStats(BaseModel):
+    creator_id: Optional[int] = None
+    counts: Dict[TaskStatus, int]
+    total: int
+
+
+class ExportFormat(str, enum.Enum):
+    NDJSON = 'ndjson'
+    CSV = 'csv'
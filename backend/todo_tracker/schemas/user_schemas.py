@@ -47,3 +47,7 @@ class UserCreate(UserBase):
 class UserRead(UserBase):
     id: int
     is_active: bool
+
+
+class AuthenticatedUser(UserRead):
+    '''Principal of the request, built from token claims or the DB.'''
@@ -1,67 +1,292 @@
+import asyncio
+import hashlib
+import os
 import uuid
+from typing import Optional
 
+import fakeredis
 import httpx
+import pytest
 import pytest_asyncio
-from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+from sqlalchemy import Connection, event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncSession,
                                     async_sessionmaker, create_async_engine)
 from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.util import await_only
 
 from todo_tracker.db.base import Base
 from todo_tracker.db.crud import user_crud
-from todo_tracker.dependencies.db_dependencies import get_session
+from todo_tracker.dependencies.db_dependencies import (get_session,
+                                                       get_session_factory)
 from todo_tracker.dependencies.env_dependencies import get_testing_settings
 from todo_tracker.main import app
+from todo_tracker.redis.task_cache import task_cache
 from todo_tracker.schemas import user_schemas
-from todo_tracker.utils.jwt import create_access_token
+from todo_tracker.utils.jwt import create_access_token, user_claims
+from todo_tracker.utils.metrics import instrument_engine, metrics_settings
 
 database_data = get_testing_settings()
 
-# Data for connection to test_database
-SQLALCHEMY_TEST_DATABASE_URL = (
-    f"postgresql+asyncpg://{database_data.TEST_DB_USERNAME}:"
-    f"{database_data.TEST_DB_PASSWORD}"
-    f"@{database_data.TEST_DB_HOST}/{database_data.TEST_DB_NAME}"
+# Set by pytest-xdist in its worker processes, e.g. "gw0"
+XDIST_WORKER = os.environ.get('PYTEST_XDIST_WORKER')
+# Workers clone their databases from this one instead of creating tables
+TEST_DB_TEMPLATE_NAME = f'{database_data.TEST_DB_NAME}_template'
+TEMPLATE_LOCK_KEY = 4_178_209
+
+
+def database_url(name: str) -> str:
+    return (
+        f"postgresql+asyncpg://{database_data.TEST_DB_USERNAME}:"
+        f"{database_data.TEST_DB_PASSWORD}"
+        f"@{database_data.TEST_DB_HOST}/{name}"
     )
-# Instance of Async Engine connected to described database
+
+
+def worker_database(name: Optional[str]) -> Optional[str]:
+    '''Name of the database this xdist worker uses in place of `name`.'''
+    if name is None or XDIST_WORKER is None:
+        return name
+    return f'{name}_{XDIST_WORKER}'
+
+
+TEST_DB_NAME = worker_database(database_data.TEST_DB_NAME)
+TEST_DB_REPLICA_NAME = worker_database(database_data.TEST_DB_REPLICA_NAME)
+
+# Data for connection to test_database
+SQLALCHEMY_TEST_DATABASE_URL = database_url(TEST_DB_NAME)
+# Instance of Async Engine connected to described database.
+# Every test runs its own event loop, so connections are not pooled
 async_engine = create_async_engine(
     SQLALCHEMY_TEST_DATABASE_URL, echo=False,
     poolclass=NullPool
 )
+if metrics_settings.METRICS_ENABLED:
+    instrument_engine(async_engine, 'primary')
 
+
+# Commits of the code under test only release savepoints, the
+# transaction of the test around them is rolled back
 async_test_session_factory = async_sessionmaker(
     bind=async_engine,
-    expire_on_commit=False
+    expire_on_commit=False,
+    join_transaction_mode='create_savepoint'
 )
 
 
+class SavepointTurns:
+    '''
+    Sessions running concurrently share the connection of the test,
+    and their savepoints would release each other. One task at a time
+    holds savepoints, others wait before their first one.
+    '''
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.owner = None
+        self.depth = 0
+
+    def listen(self, connection: Connection) -> None:
+        event.listen(connection, 'savepoint', self.begin)
+        event.listen(connection, 'release_savepoint', self.end)
+        event.listen(connection, 'rollback_savepoint', self.end)
+
+    def begin(self, conn, name):
+        # Events run in the greenlet of the async call, before SAVEPOINT
+        task = asyncio.current_task()
+        if self.owner is not task:
+            await_only(self.lock.acquire())
+            self.owner = task
+        self.depth += 1
+
+    def end(self, conn, name, context):
+        self.depth -= 1
+        if not self.depth:
+            self.owner = None
+            self.lock.release()
+
+
 async def get_test_session() -> AsyncSession:
     async with async_test_session_factory() as session:
         yield session
         await session.close()
 
 app.dependency_overrides[get_session] = get_test_session
+app.dependency_overrides[get_session_factory] = (
+    lambda: async_test_session_factory
+)
+
+
+def schema_fingerprint() -> str:
+    '''Digest of the DDL of the models, changes with the schema.'''
+    dialect = postgresql.dialect()
+    ddl = []
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        ddl.extend(repr(column.type) for column in table.columns)
+        ddl.extend(str(CreateIndex(index).compile(dialect=dialect))
+                   for index in sorted(table.indexes,
+                                       key=lambda index: index.name))
+    return 'schema ' + hashlib.sha256('\n'.join(ddl).encode()).hexdigest()
+
+
+async def create_template(conn: AsyncConnection) -> None:
+    '''Build the template database unless it has the current schema.'''
+    fingerprint = schema_fingerprint()
+    comment = await conn.scalar(
+        text("SELECT shobj_description(oid, 'pg_database') "
+             "FROM pg_database WHERE datname = :name"),
+        {'name': TEST_DB_TEMPLATE_NAME})
+    if comment == fingerprint:
+        return
+    # Same encoding and locale as the configured test database
+    encoding, collate, ctype = (await conn.execute(text(
+        'SELECT pg_encoding_to_char(encoding), datcollate, datctype '
+        'FROM pg_database WHERE datname = current_database()'))).one()
+    await conn.exec_driver_sql(
+        f'DROP DATABASE IF EXISTS "{TEST_DB_TEMPLATE_NAME}"')
+    await conn.exec_driver_sql(
+        f'CREATE DATABASE "{TEST_DB_TEMPLATE_NAME}" TEMPLATE template0 '
+        f"ENCODING '{encoding}' LC_COLLATE '{collate}' LC_CTYPE '{ctype}'")
+    template_engine = create_async_engine(
+        database_url(TEST_DB_TEMPLATE_NAME), poolclass=NullPool)
+    async with template_engine.begin() as template_conn:
+        await template_conn.run_sync(Base.metadata.create_all)
+    await template_engine.dispose()
+    # Marked last, so a template built halfway is built again
+    await conn.exec_driver_sql(
+        f'COMMENT ON DATABASE "{TEST_DB_TEMPLATE_NAME}" IS '
+        f"'{fingerprint}'")
 
 
-# Initialize test database tables
-async def init_models(async_engine: AsyncEngine):
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def create_test_databases() -> None:
+    '''
+    Create tables once per test session. Without xdist they are created
+    in the configured test database, xdist workers get databases of
+    their own cloned from a template.
+    '''
+    if XDIST_WORKER is None:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        await async_engine.dispose()
+        return
 
+    # CREATE DATABASE cannot run inside a transaction
+    admin_engine = create_async_engine(
+        database_url(database_data.TEST_DB_NAME), poolclass=NullPool,
+        isolation_level='AUTOCOMMIT')
+    async with admin_engine.connect() as conn:
+        # Workers start together, the first one builds the template and
+        # the others wait for it. Cloning needs the template unused too.
+        await conn.execute(text('SELECT pg_advisory_lock(:key)'),
+                           {'key': TEMPLATE_LOCK_KEY})
+        try:
+            await create_template(conn)
+            for name in filter(None, (TEST_DB_NAME, TEST_DB_REPLICA_NAME)):
+                await conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+                await conn.exec_driver_sql(
+                    f'CREATE DATABASE "{name}" '
+                    f'TEMPLATE "{TEST_DB_TEMPLATE_NAME}"')
+        finally:
+            await conn.execute(text('SELECT pg_advisory_unlock(:key)'),
+                               {'key': TEMPLATE_LOCK_KEY})
+    await admin_engine.dispose()
 
-# Drop tables after tests are completed
-async def drop_models(async_engine: AsyncEngine):
-    async with async_engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
+
+async def drop_test_databases() -> None:
+    if XDIST_WORKER is None:
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await async_engine.dispose()
+        return
+
+    admin_engine = create_async_engine(
+        database_url(database_data.TEST_DB_NAME), poolclass=NullPool,
+        isolation_level='AUTOCOMMIT')
+    async with admin_engine.connect() as conn:
+        for name in filter(None, (TEST_DB_NAME, TEST_DB_REPLICA_NAME)):
+            await conn.exec_driver_sql(f'DROP DATABASE IF EXISTS "{name}"')
+    await admin_engine.dispose()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def setup_test_database():
+    # Runs before the event loop of the first test is started
+    asyncio.run(create_test_databases())
+    yield
+    asyncio.run(drop_test_databases())
 
 
 @pytest_asyncio.fixture(scope="function", autouse=True)
-async def setup_test_database():
-    print("Creating tables...")  # For debugging
-    await init_models(async_engine)
+async def db_connection():
+    '''
+    Connection of the test, in a transaction rolled back after the test
+    together with everything the test and the app wrote through it.
+    '''
+    async with async_engine.connect() as connection:
+        transaction = await connection.begin()
+        SavepointTurns().listen(connection.sync_connection)
+        async_test_session_factory.configure(bind=connection)
+        try:
+            yield connection
+        finally:
+            async_test_session_factory.configure(bind=async_engine)
+            await transaction.rollback()
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def clear_task_cache():
+    # Cached tasks were rolled back with the previous test
+    task_cache.clear_local()
     yield
-    print("Dropping tables...")  # For debugging
-    await drop_models(async_engine)
-    print("Tables dropped")
+
+
+@pytest_asyncio.fixture(scope="function", autouse=True)
+async def fake_redis_client():
+    # ASGITransport does not run lifespan, provide the shared client here
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    app.state.redis = redis_client
+    yield redis_client
+    await redis_client.aclose()
+
+
+# Statements managing savepoints in place of the app's own transactions
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT',
+                        'ROLLBACK TO SAVEPOINT')
+
+
+@pytest.fixture
+def executed_statements():
+    '''Collect SQL statements sent to the test database.'''
+    statements = []
+
+    def collect(conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith(SAVEPOINT_STATEMENTS):
+            statements.append(statement)
+
+    event.listen(async_engine.sync_engine, 'before_cursor_execute', collect)
+    yield statements
+    event.remove(async_engine.sync_engine, 'before_cursor_execute', collect)
+
+
+@pytest.fixture
+def committed_transactions():
+    '''
+    Count transactions committed on the test database. Sessions of tests
+    commit by releasing their savepoints.
+    '''
+    commits = []
+
+    def collect(conn, *args):
+        commits.append(conn)
+
+    event.listen(async_engine.sync_engine, 'commit', collect)
+    event.listen(async_engine.sync_engine, 'release_savepoint', collect)
+    yield commits
+    event.remove(async_engine.sync_engine, 'commit', collect)
+    event.remove(async_engine.sync_engine, 'release_savepoint', collect)
 
 
 @pytest_asyncio.fixture
@@ -111,7 +336,7 @@ async def create_new_user(test_password: str):
 async def get_authorization_header():
     async def make_header(**kwargs):
         access_token = await create_access_token(
-            data={"sub": kwargs['user'].username}
+            data=user_claims(kwargs['user'])
         )
         headers = {"Authorization": f"Bearer {access_token}", }
         return headers
@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import func, select
+
+from todo_tracker.db.crud import task_crud
+from todo_tracker.db.models.task import Task
+from todo_tracker.jobs import generate_dataset
+from todo_tracker.jobs.generate_dataset import (creator_weights, generate,
+                                                generate_chunk, load_chunk)
+from todo_tracker.tests.conftest import get_test_session
+
+pytestmark = pytest.mark.asyncio(loop_scope="function")
+
+UNTIL = datetime(2025, 1, 1, tzinfo=timezone.utc)
+DATASET = {
+    'users': 5,
+    'tasks': 25,
+    'seed': 7,
+    'since': UNTIL - timedelta(days=30),
+    'until': UNTIL,
+    'prefix': 'synthetic',
+    'password': 'synthetic-password',
+    'chunk_size': 10,
+}
+# Loaded tasks and counters with creators by name, IDs differ between loads
+DATASET_ROWS = (
+    "SELECT 'task', username, title, description, status::text, "
+    "created_at::text FROM tasks JOIN users ON users.id = creator_id "
+    "UNION ALL "
+    "SELECT 'count', username, status::text, count::text, NULL, NULL "
+    "FROM task_status_counts JOIN users ON users.id = creator_id "
+    "ORDER BY 1, 2, 6, 3, 4"
+)
+
+
+@pytest_asyncio.fixture
+async def connection(db_connection):
+    '''asyncpg connection of the test, loading in its transaction.'''
+    # Begins the transaction, transactions of the job become savepoints
+    await db_connection.exec_driver_sql('SELECT 1')
+    raw_connection = await db_connection.get_raw_connection()
+    return raw_connection.driver_connection
+
+
+async def test_chunks_are_reproducible():
+    cum_weights = creator_weights(5, seed=7)
+
+    def chunk():
+        return generate_chunk(1, [1, 2, 3, 4, 5], cum_weights, tasks=25,
+                              seed=7, since=DATASET['since'], until=UNTIL,
+                              chunk_size=10)
+
+    records = chunk()
+
+    assert records == chunk()
+    assert len(records) == 10
+    assert [record[3] for record in records] == sorted(
+        record[3] for record in records), 'Tasks must come in time order'
+
+
+async def loaded_dataset(connection) -> Tuple[list, str]:
+    '''Loaded tasks and their checksum, independent of generated IDs.'''
+    rows = await connection.fetch(DATASET_ROWS)
+    checksum = await connection.fetchval(
+        f'SELECT md5(string_agg(rows::text, \'|\')) FROM ({DATASET_ROWS}) '
+        'AS rows')
+    return [tuple(row) for row in rows], checksum
+
+
+async def test_dataset_is_loaded_with_counters(connection):
+    written = await generate(connection, **DATASET)
+    written_again = await generate(connection, **DATASET)
+
+    async for session in get_test_session():
+        tasks = await session.scalar(select(func.count()).select_from(Task))
+        corrected = await task_crud.reconcile_task_counts(session)
+
+    assert written == tasks == 25
+    assert written_again == 0, 'Loaded chunks must not be loaded again'
+    assert corrected == 0, 'Counters must be maintained while loading'
+
+
+async def test_interrupted_load_is_resumed(connection, monkeypatch):
+    # Load in one run, rolled back after reading what it wrote
+    transaction = connection.transaction()
+    await transaction.start()
+    await generate(connection, **DATASET)
+    expected = await loaded_dataset(connection)
+    await transaction.rollback()
+
+    calls = 0
+
+    async def interrupted_load_chunk(connection, records):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise ConnectionError('Connection lost')
+        await load_chunk(connection, records)
+
+    monkeypatch.setattr(generate_dataset, 'load_chunk',
+                        interrupted_load_chunk)
+    with pytest.raises(ConnectionError):
+        await generate(connection, **DATASET)
+    monkeypatch.setattr(generate_dataset, 'load_chunk', load_chunk)
+    assert await connection.fetchval('SELECT count(*) FROM tasks') == 10, (
+        'First chunk must stay loaded')
+
+    written = await generate(connection, **DATASET)
+
+    assert written == 15, 'Resumed load must skip the loaded chunk'
+    assert await loaded_dataset(connection) == expected
+    async for session in get_test_session():
+        assert await task_crud.reconcile_task_counts(session) == 0
+
+
+async def test_tasks_of_other_runs_stop_the_load(connection):
+    await generate(connection, **DATASET)
+
+    with pytest.raises(RuntimeError):
+        await generate(connection,
+                       **{**DATASET, 'tasks': 30, 'chunk_size': 20})
@@ -0,0 +1,196 @@
+import pytest
+from redis.exceptions import ConnectionError
+
+from todo_tracker.db.crud import user_crud
+from todo_tracker.redis.revocation import revoke_user_tokens
+from todo_tracker.utils.auth import change_password, deactivate_user
+from todo_tracker.utils.jwt import create_access_token
+
+from .conftest import get_test_session
+
+pytestmark = pytest.mark.asyncio(loop_scope="function")
+
+
+class TestCurrentUser:
+    '''Tests related to resolving the authenticated user from a token'''
+    async def test_token_claims_replace_user_lookup(
+            self, async_client, create_new_user, get_authorization_header,
+            executed_statements):
+        user = await create_new_user()
+        headers = await get_authorization_header(user=user)
+        executed_statements.clear()
+
+        response = await async_client.post(
+            '/tasks', headers=headers,
+            json={'title': 'walk the dog', 'description': 'very important'})
+
+        assert response.status_code == 201
+        assert response.json()['creator_id'] == user.id
+        assert not any('FROM users' in statement
+                       for statement in executed_statements), (
+            'Stateless token must not trigger a user lookup')
+
+    async def test_token_without_claims_falls_back_to_user_lookup(
+            self, async_client, create_new_user, executed_statements):
+        user = await create_new_user()
+        access_token = await create_access_token(data={'sub': user.username})
+        headers = {'Authorization': f'Bearer {access_token}'}
+        executed_statements.clear()
+
+        response = await async_client.post(
+            '/tasks', headers=headers,
+            json={'title': 'walk the dog', 'description': 'very important'})
+
+        assert response.status_code == 201
+        assert any('FROM users' in statement
+                   for statement in executed_statements)
+
+    async def test_inactive_user_token_is_rejected(
+            self, async_client, create_new_user):
+        user = await create_new_user()
+        access_token = await create_access_token(
+            data={'sub': user.username, 'uid': user.id, 'active': False})
+        headers = {'Authorization': f'Bearer {access_token}'}
+
+        response = await async_client.post(
+            '/tasks', headers=headers,
+            json={'title': 'walk the dog', 'description': 'very important'})
+
+        assert response.status_code == 401
+
+    async def test_revoked_user_token_is_rejected(
+            self, async_client, create_new_user, get_authorization_header,
+            fake_redis_client):
+        user = await create_new_user()
+        headers = await get_authorization_header(user=user)
+
+        await revoke_user_tokens(fake_redis_client, user.id, user.username)
+        response = await async_client.post(
+            '/tasks', headers=headers,
+            json={'title': 'walk the dog', 'description': 'very important'})
+
+        assert response.status_code == 401
+
+    async def test_user_is_looked_up_when_redis_fails(
+            self, async_client, create_new_user, get_authorization_header,
+            fake_redis_client, monkeypatch):
+        user = await create_new_user()
+        inactive_user = await create_new_user()
+        async for session in get_test_session():
+            await user_crud.deactivate_user(inactive_user.id, session)
+
+        async def unavailable(*args, **kwargs):
+            raise ConnectionError('Redis is unavailable')
+
+        monkeypatch.setattr(fake_redis_client, 'get', unavailable)
+        response = await async_client.get(
+            '/tasks/mine', headers=await get_authorization_header(user=user))
+        assert response.status_code == 200
+
+        access_token = await create_access_token(
+            data={'sub': inactive_user.username, 'uid': inactive_user.id,
+                  'active': True})
+        response = await async_client.get(
+            '/tasks/mine', headers={'Authorization': f'Bearer {access_token}'})
+        assert response.status_code == 401, (
+            'User deactivated in the database must be rejected')
+
+
+class TestRefreshToken:
+    '''Tests related to refreshing access tokens'''
+    async def login(self, async_client, user, password):
+        response = await async_client.post(
+            '/auth/login',
+            data={'username': user.username, 'password': password})
+        assert response.status_code == 200
+        return response.json()['refresh_token']
+
+    async def test_refresh_returns_access_token(
+            self, async_client, create_new_user, test_password):
+        user = await create_new_user()
+        refresh_token = await self.login(async_client, user, test_password)
+
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+
+        assert response.status_code == 200
+        headers = {
+            'Authorization': f"Bearer {response.json()['access_token']}"}
+        response = await async_client.get('/tasks/mine', headers=headers)
+        assert response.status_code == 200
+
+    async def test_revoked_user_cannot_refresh(
+            self, async_client, create_new_user, test_password,
+            fake_redis_client):
+        user = await create_new_user()
+        refresh_token = await self.login(async_client, user, test_password)
+
+        await revoke_user_tokens(fake_redis_client, user.id, user.username)
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+
+        assert response.status_code == 401
+
+    async def test_revoked_token_is_rejected_even_if_stored(
+            self, async_client, create_new_user, test_password,
+            fake_redis_client):
+        user = await create_new_user()
+        refresh_token = await self.login(async_client, user, test_password)
+
+        await revoke_user_tokens(fake_redis_client, user.id, user.username)
+        # Written back by a login racing with the revocation
+        await fake_redis_client.set(user.username, refresh_token)
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+
+        assert response.status_code == 401
+
+    async def test_deactivated_user_cannot_refresh(
+            self, async_client, create_new_user, test_password,
+            fake_redis_client):
+        user = await create_new_user()
+        refresh_token = await self.login(async_client, user, test_password)
+
+        async for session in get_test_session():
+            await deactivate_user(session, fake_redis_client, user)
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+
+        assert response.status_code == 401
+
+    async def test_password_change_revokes_tokens(
+            self, async_client, create_new_user, test_password,
+            get_authorization_header, fake_redis_client):
+        user = await create_new_user()
+        refresh_token = await self.login(async_client, user, test_password)
+        headers = await get_authorization_header(user=user)
+
+        async for session in get_test_session():
+            await change_password(session, fake_redis_client, user,
+                                  'new-strong-password')
+
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+        assert response.status_code == 401
+        response = await async_client.get('/tasks/mine', headers=headers)
+        assert response.status_code == 401
+
+    async def test_login_right_after_password_change_is_accepted(
+            self, async_client, create_new_user, test_password,
+            fake_redis_client):
+        user = await create_new_user()
+        async for session in get_test_session():
+            await change_password(session, fake_redis_client, user,
+                                  'new-strong-password')
+
+        # Issued within the second of the revocation
+        refresh_token = await self.login(async_client, user,
+                                         'new-strong-password')
+        response = await async_client.post(
+            '/auth/refresh', json={'refresh_token': refresh_token})
+
+        assert response.status_code == 200
+        headers = {
+            'Authorization': f"Bearer {response.json()['access_token']}"}
+        response = await async_client.get('/tasks/mine', headers=headers)
+        assert response.status_code == 200
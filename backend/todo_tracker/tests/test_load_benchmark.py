@@ -0,0 +1,15 @@
+from todo_tracker.benchmarks.load.runner import spread, summarize
+
+
+def test_requests_are_spread_over_all_users():
+    assert spread(3, 5) == [1, 1, 1, 0, 0]
+    assert spread(12, 5) == [3, 3, 2, 2, 2]
+    assert spread(0, 2) == [0, 0]
+
+
+def test_empty_series_is_summarized():
+    summary = summarize([], {}, elapsed=0.0)
+
+    assert summary['requests'] == 0
+    assert summary['rps'] == 0.0
+    assert set(summary['latency_ms'].values()) == {None}
@@ -0,0 +1,115 @@
+import fakeredis
+import pytest
+import redis
+from prometheus_client import REGISTRY
+
+from todo_tracker.utils.metrics import UNMATCHED_ROUTE, InstrumentedRedis
+
+pytestmark = pytest.mark.asyncio(loop_scope="function")
+
+
+class InstrumentedFakeRedis(InstrumentedRedis, fakeredis.FakeAsyncRedis):
+    pass
+
+
+def sample(name: str, **labels) -> float:
+    '''Current value of the sample, samples not collected yet are 0.'''
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+async def test_requests_are_counted_by_route_template(async_client):
+    labels = {'method': 'GET', 'route': '/tasks/{task_id}', 'status': '404'}
+    before = sample('http_request_duration_seconds_count', **labels)
+
+    for task_id in (1, 2):
+        response = await async_client.get(f'/tasks/{task_id}')
+        assert response.status_code == 404
+
+    assert sample('http_request_duration_seconds_count',
+                  **labels) == before + 2, 'Paths must share their route'
+
+
+async def test_unknown_paths_share_one_series(async_client):
+    labels = {'method': 'GET', 'route': UNMATCHED_ROUTE, 'status': '404'}
+    before = sample('http_request_duration_seconds_count', **labels)
+
+    await async_client.get('/no/such/path')
+    await async_client.get('/no/other/path')
+
+    assert sample('http_request_duration_seconds_count',
+                  **labels) == before + 2
+
+
+async def test_queries_are_timed_and_counted_per_request(
+        async_client, executed_statements):
+    queries_before = sample('http_request_db_queries_sum', method='GET',
+                            route='/tasks/{task_id}')
+    selects_before = sample('db_query_duration_seconds_count',
+                            database='primary', operation='SELECT')
+
+    await async_client.get('/tasks/1')
+
+    selects = sum(statement.startswith('SELECT')
+                  for statement in executed_statements)
+    assert selects >= 1
+    assert sample('db_query_duration_seconds_count', database='primary',
+                  operation='SELECT') == selects_before + selects
+    # Savepoints of the test transaction are counted as queries too
+    assert sample('http_request_db_queries_sum', method='GET',
+                  route='/tasks/{task_id}') >= queries_before + selects
+
+
+async def test_writes_returning_rows_are_labeled_by_operation(
+        async_client, create_new_user, get_authorization_header):
+    headers = await get_authorization_header(user=await create_new_user())
+
+    def operations():
+        return {operation: sample('db_query_duration_seconds_count',
+                                  database='primary', operation=operation)
+                for operation in ('INSERT', 'UPDATE', 'DELETE')}
+
+    before = operations()
+    response = await async_client.post(
+        '/tasks', headers=headers,
+        json={'title': 'walk the dog', 'description': ''})
+    task_id = response.json()['id']
+    response = await async_client.put(f'/tasks/{task_id}', headers=headers,
+                                      json={'title': 'walk the cat'})
+    assert response.status_code == 200
+    response = await async_client.delete(f'/tasks/{task_id}',
+                                         headers=headers)
+    assert response.status_code == 204
+
+    after = operations()
+    assert {operation: after[operation] - before[operation]
+            for operation in after} == {'INSERT': 1, 'UPDATE': 1,
+                                        'DELETE': 1}
+
+
+async def test_metrics_are_exposed_in_text_format(async_client):
+    await async_client.get('/service/health')
+
+    response = await async_client.get('/metrics')
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    assert ('http_request_duration_seconds_count{method="GET",'
+            'route="/service/health",status="200"}') in response.text
+
+
+async def test_redis_commands_are_timed():
+    redis_client = InstrumentedFakeRedis(decode_responses=True)
+    gets_before = sample('redis_command_duration_seconds_count',
+                         command='GET')
+    errors_before = sample('redis_command_errors_total', command='INCRBY')
+
+    await redis_client.set('metrics-key', 'value')
+    assert await redis_client.get('metrics-key') == 'value'
+    with pytest.raises(redis.ResponseError):
+        await redis_client.incr('metrics-key')
+    await redis_client.aclose()
+
+    assert sample('redis_command_duration_seconds_count',
+                  command='GET') == gets_before + 1
+    assert sample('redis_command_errors_total',
+                  command='INCRBY') == errors_before + 1
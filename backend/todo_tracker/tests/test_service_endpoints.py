@@ -0,0 +1,83 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.requests import Request
+
+from todo_tracker.db.base import database_setings, engine_options
+from todo_tracker.db.pool import InstrumentedAsyncPool, get_db_pool_stats
+from todo_tracker.main import app
+from todo_tracker.redis.redis_config import (create_redis_client,
+                                             get_redis_client, redis_settings)
+from todo_tracker.tests.conftest import SQLALCHEMY_TEST_DATABASE_URL
+
+pytestmark = pytest.mark.asyncio(loop_scope="function")
+
+
+@pytest_asyncio.fixture
+async def redis_client():
+    # Real pooled client instead of the fake one, no connection is opened
+    redis_client = create_redis_client()
+    app.state.redis = redis_client
+    yield redis_client
+    await redis_client.aclose()
+
+
+async def test_redis_pool_stats_are_exposed(async_client, redis_client):
+    response = await async_client.get('/service/redis/pool')
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats['max_connections'] == redis_settings.REDIS_MAX_CONNECTIONS
+    assert stats['in_use_connections'] == 0
+
+
+async def test_requests_share_one_redis_client(redis_client):
+    request = Request({'type': 'http', 'app': app})
+
+    assert get_redis_client(request) is get_redis_client(request) is (
+        redis_client), 'Dependency must return the client created once'
+
+
+async def test_health_check(async_client):
+    response = await async_client.get('/service/health')
+
+    assert response.status_code == 200
+    assert response.json() == {'status': 'ok'}
+
+
+async def test_db_pool_stats_are_exposed(async_client):
+    response = await async_client.get('/service/db/pool')
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats['pool_size'] == database_setings.DB_POOL_SIZE
+    assert stats['in_use_connections'] == 0
+
+
+async def test_db_pool_measures_checkout_wait():
+    engine = create_async_engine(SQLALCHEMY_TEST_DATABASE_URL,
+                                 poolclass=InstrumentedAsyncPool,
+                                 pool_size=1, max_overflow=0)
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+            assert get_db_pool_stats(engine)['in_use_connections'] == 1
+        stats = get_db_pool_stats(engine)
+    finally:
+        await engine.dispose()
+
+    assert stats['checkouts'] == 1
+    assert stats['in_use_connections'] == 0
+    assert stats['checkout_wait_max_ms'] > 0
+
+
+async def test_pgbouncer_mode_disables_statement_cache():
+    settings = database_setings.model_copy(update={'DB_PGBOUNCER': True})
+
+    connect_args = engine_options(settings)['connect_args']
+
+    assert connect_args['statement_cache_size'] == 0
+    assert connect_args['prepared_statement_cache_size'] == 0
+    assert connect_args['prepared_statement_name_func']() != (
+        connect_args['prepared_statement_name_func']())
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+
+import pytest
+import pytest_asyncio
+from fakeredis import TcpFakeServer
+from redis.asyncio import Redis
+from sqlalchemy import text
+
+from todo_tracker.config import TaskCacheSettings
+from todo_tracker.db.crud import task_crud
+from todo_tracker.redis import task_cache
+from todo_tracker.redis.task_cache import TaskCache
+
+pytestmark = pytest.mark.asyncio(loop_scope="function")
+
+
+@pytest.fixture
+def cache():
+    return TaskCache(TaskCacheSettings())
+
+
+@pytest_asyncio.fixture
+async def redis_with_socket_timeout():
+    '''
+    Client of a fake Redis served over TCP, unlike the in-memory one
+    it times out reads that wait longer than the socket timeout.
+    '''
+    server = TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    redis_client = Redis(host=host, port=port, socket_timeout=0.3,
+                         decode_responses=True)
+    yield redis_client
+    await redis_client.aclose()
+    server.shutdown()
+    server.server_close()
+
+
+async def test_concurrent_misses_are_loaded_once(cache):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {'id': 1}
+
+    results = await asyncio.gather(
+        *(cache.get_or_load(1, loader) for _ in range(10)))
+
+    assert calls == 1, 'Concurrent misses must be collapsed into one load'
+    assert all(result == {'id': 1} for result in results)
+    assert cache.stats()['coalesced'] == 9
+
+
+async def test_cached_task_is_served_until_invalidated(cache):
+    versions = iter([{'id': 1, 'status': 'в процессе'},
+                     {'id': 1, 'status': 'завершена'}])
+
+    async def loader():
+        return next(versions)
+
+    await cache.get_or_load(1, loader)
+    cached = await cache.get_or_load(1, loader)
+    assert cached['status'] == 'в процессе'
+    assert cache.stats()['local_hits'] == 1
+
+    await cache.invalidate([1])
+    fresh = await cache.get_or_load(1, loader)
+    assert fresh['status'] == 'завершена', (
+        'Invalidated task must be loaded again')
+
+
+async def test_load_racing_with_write_is_not_cached(cache):
+    async def loader():
+        await cache.invalidate([1])
+        return {'id': 1}
+
+    await cache.get_or_load(1, loader)
+
+    assert cache.stats()['local_size'] == 0, (
+        'Value read before a concurrent write must not be cached')
+
+
+async def test_load_racing_with_write_of_other_worker_is_not_cached(
+        fake_redis_client):
+    worker = TaskCache(TaskCacheSettings())
+    writer = TaskCache(TaskCacheSettings())
+    # No listeners, the invalidation message has not reached the worker
+    worker._redis = writer._redis = fake_redis_client
+
+    async def stale_loader():
+        await writer.invalidate([1])
+        return {'id': 1, 'version': 1}
+
+    async def fresh_loader():
+        return {'id': 1, 'version': 2}
+
+    await worker.get_or_load(1, stale_loader)
+    task = await writer.get_or_load(1, fresh_loader)
+
+    assert task['version'] == 2, (
+        'Value read before a write of another worker must not be cached')
+
+
+async def test_idle_listener_keeps_local_tier(
+        cache, redis_with_socket_timeout, monkeypatch):
+    monkeypatch.setattr(task_cache, 'LISTEN_POLL_SECONDS', 0.1)
+    monkeypatch.setattr(task_cache, 'RECONNECT_DELAY_SECONDS', 0.05)
+
+    async def loader():
+        return {'id': 1}
+
+    await cache.start(redis_with_socket_timeout)
+    try:
+        await asyncio.sleep(0.1)
+        await cache.get_or_load(1, loader)
+        # Idle for longer than the socket timeout
+        await asyncio.sleep(1)
+        assert cache.stats()['local_size'] == 1, (
+            'Idle subscription must not reconnect and clear the local tier')
+
+        writer = TaskCache(TaskCacheSettings())
+        writer._redis = redis_with_socket_timeout
+        await writer.invalidate([1])
+        await asyncio.sleep(0.3)
+        assert cache.stats()['local_size'] == 0, (
+            'Invalidations must still be received after idling')
+    finally:
+        await cache.stop()
+
+
+async def test_malformed_invalidation_does_not_stop_listener(
+        cache, redis_with_socket_timeout, monkeypatch):
+    monkeypatch.setattr(task_cache, 'LISTEN_POLL_SECONDS', 0.1)
+
+    async def loader():
+        return {'id': 1}
+
+    await cache.start(redis_with_socket_timeout)
+    try:
+        await asyncio.sleep(0.1)
+        await cache.get_or_load(1, loader)
+        for data in ('not json', '{"id": 1}', '["one"]', '7'):
+            await redis_with_socket_timeout.publish(
+                task_cache.INVALIDATION_CHANNEL, data)
+        await asyncio.sleep(0.2)
+        assert cache.stats()['local_size'] == 1
+
+        await redis_with_socket_timeout.publish(
+            task_cache.INVALIDATION_CHANNEL, '[1]')
+        await asyncio.sleep(0.2)
+        assert cache.stats()['local_size'] == 0, (
+            'Listener must survive malformed messages')
+    finally:
+        await cache.stop()
+
+
+async def test_cancelled_reader_does_not_break_shared_load(
+        async_client, create_new_user, get_authorization_header,
+        monkeypatch):
+    headers = await get_authorization_header(user=await create_new_user())
+    response = await async_client.post(
+        '/tasks', headers=headers,
+        json={'title': 'walk the dog', 'description': ''})
+    task_id = response.json()['id']
+    started = asyncio.Event()
+    closed_during_load = []
+    get_task = task_crud.get_task
+
+    async def slow_get_task(session, task_id):
+        started.set()
+        await session.execute(text('SELECT pg_sleep(0.2)'))
+        closed_during_load.append(not session.in_transaction())
+        return await get_task(session=session, task_id=task_id)
+
+    monkeypatch.setattr(task_crud, 'get_task', slow_get_task)
+    first = asyncio.create_task(async_client.get(f'/tasks/{task_id}'))
+    await started.wait()
+    second = asyncio.create_task(async_client.get(f'/tasks/{task_id}'))
+    await asyncio.sleep(0.05)
+    # Disconnect of the reader whose request started the load
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    response = await second
+
+    assert response.status_code == 200
+    assert response.json()['title'] == 'walk the dog'
+    assert closed_during_load == [False], (
+        'Session of the cancelled reader must not be used by the load')
@@ -1,12 +1,19 @@
+import csv
+import io
+import json
 import uuid
+from datetime import datetime
 from typing import Tuple
 
 import pytest
 import pytest_asyncio
+from sqlalchemy import event
 
+from todo_tracker.db.crud import task_crud
 from todo_tracker.db.models.task import Task
 from todo_tracker.db.models.user import User
-from todo_tracker.tests.conftest import get_test_session
+from todo_tracker.tests.conftest import async_engine, get_test_session
+from todo_tracker.utils.pagination import encode_cursor, encode_rank_cursor
 
 pytestmark = pytest.mark.asyncio(loop_scope="function")
 
@@ -20,8 +27,9 @@ async def create_task(create_new_user) -> Tuple[User, Task]:
                 'description': str(uuid.uuid4()),
                 'creator_id': user.id
             }
-        if 'status' in kwargs:
-            task_data['status'] = kwargs['status']
+        for field in ('status', 'title', 'description'):
+            if field in kwargs:
+                task_data[field] = kwargs[field]
         task = Task(**task_data)
         async for session in get_test_session():
             session.add(task)
@@ -60,6 +68,36 @@ class TestTaskAPI:
 
         assert response.status_code == 201
 
+    async def test_user_can_create_tasks_in_bulk(
+            self, async_client, create_new_user, get_authorization_header):
+        user = await create_new_user()
+        url = '/tasks/bulk'
+        tasks_data = [
+            {'title': f'task {number}', 'description': 'bulk'}
+            for number in range(5)
+        ]
+        headers = await get_authorization_header(user=user)
+        response = await async_client.post(url=url,
+                                           headers=headers,
+                                           json=tasks_data)
+
+        assert response.status_code == 201
+        response_data = response.json()
+        assert [task['title'] for task in response_data] == [
+            task['title'] for task in tasks_data], (
+            'Created tasks must be returned in the request order')
+        assert all(task['creator_id'] == user.id for task in response_data)
+
+    async def test_user_cannot_create_empty_bulk(
+            self, async_client, create_new_user, get_authorization_header):
+        user = await create_new_user()
+        headers = await get_authorization_header(user=user)
+        response = await async_client.post(url='/tasks/bulk',
+                                           headers=headers,
+                                           json=[])
+
+        assert response.status_code == 422
+
     async def test_user_can_delete_task(self, async_client,
                                         get_authorization_header,
                                         create_task):
@@ -92,6 +130,69 @@ class TestTaskAPI:
         assert response.json()['status'] == 'завершена', (
             'Task status should be changed after put request.')
 
+    async def test_user_can_change_status_of_many_tasks(
+            self, async_client, get_authorization_header, create_task):
+        task_creator, first_task = await create_task()
+        _, second_task = await create_task()
+        missing_id = second_task.id + 1000
+        url = '/tasks/bulk'
+
+        bulk_data = {
+            'ids': [first_task.id, second_task.id, missing_id],
+            'changes': {'status': 'завершена'},
+        }
+        headers = await get_authorization_header(user=task_creator)
+
+        response = await async_client.put(url=url, json=bulk_data,
+                                          headers=headers)
+
+        assert response.status_code == 200
+        assert response.json() == {
+            'affected_ids': sorted([first_task.id, second_task.id]),
+            'missing_ids': [missing_id],
+        }
+        response = await async_client.get(f'/tasks/{first_task.id}')
+        assert response.json()['status'] == 'завершена', (
+            'Task status should be changed after bulk update.')
+
+    async def test_user_can_delete_many_tasks(
+            self, async_client, get_authorization_header, create_task):
+        task_creator, first_task = await create_task()
+        _, second_task = await create_task()
+        missing_id = second_task.id + 1000
+        url = '/tasks/bulk/delete'
+
+        headers = await get_authorization_header(user=task_creator)
+        response = await async_client.post(
+            url=url, headers=headers,
+            json={'ids': [first_task.id, missing_id]})
+
+        assert response.status_code == 200
+        assert response.json() == {
+            'affected_ids': [first_task.id],
+            'missing_ids': [missing_id],
+        }
+        response = await async_client.get(f'/tasks/{first_task.id}')
+        assert response.status_code == 404
+        response = await async_client.get(f'/tasks/{second_task.id}')
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize('method, url, changes', [
+        ('PUT', '/tasks/bulk', {'changes': {'status': 'завершена'}}),
+        ('POST', '/tasks/bulk/delete', {}),
+    ])
+    @pytest.mark.parametrize('task_id', [0, 2 ** 31])
+    async def test_user_cannot_change_tasks_with_out_of_range_ids(
+            self, async_client, create_new_user, get_authorization_header,
+            method, url, changes, task_id):
+        headers = await get_authorization_header(user=await create_new_user())
+
+        response = await async_client.request(
+            method, url, headers=headers,
+            json={'ids': [task_id], **changes})
+
+        assert response.status_code == 422
+
     async def test_user_cannot_change_status_with_invalid_valaue(
             self, async_client, get_authorization_header, create_task):
 
@@ -136,7 +237,7 @@ class TestTaskAPI:
         response = await async_client.get(url)
 
         assert response.status_code == 200
-        response_data = response.json()
+        response_data = response.json()['items']
         assert isinstance(response_data, list), (
             'Response must contains list of tasks')
         assert len(response_data) == 3, (
@@ -159,10 +260,433 @@ class TestTaskAPI:
         response = await async_client.get(url, params=query_params)
 
         assert response.status_code == 200
-        response_data = response.json()
+        response_data = response.json()['items']
         assert isinstance(response_data, list), (
             'Response must contains list of tasks')
         assert len(response_data) == 1, (
             'Response must contains list of tasks '
             'populated with 1 task instances'
         )
+
+    async def test_listed_task_is_serialized_as_single_task(
+            self, async_client, create_task):
+        _, task = await create_task(status='в процессе')
+
+        listed = await async_client.get('/tasks')
+        single = await async_client.get(f'/tasks/{task.id}')
+
+        assert listed.headers['Content-Type'] == 'application/json'
+        assert listed.json()['items'] == [single.json()], (
+            'Rows dumped by the list must look like TaskRead')
+
+    async def test_user_can_page_through_tasks_with_cursor(
+            self, async_client, create_task):
+        [await create_task() for task in range(5)]
+
+        url = '/tasks'
+        response = await async_client.get(url, params={'limit': 2})
+
+        assert response.status_code == 200
+        first_page = response.json()
+        assert len(first_page['items']) == 2
+        assert first_page['next_cursor'] is not None, (
+            'Response must contains cursor for the next page')
+
+        seen_ids = [task['id'] for task in first_page['items']]
+        cursor = first_page['next_cursor']
+        while cursor:
+            response = await async_client.get(
+                url, params={'limit': 2, 'cursor': cursor})
+            assert response.status_code == 200
+            page = response.json()
+            seen_ids.extend(task['id'] for task in page['items'])
+            cursor = page['next_cursor']
+
+        assert len(seen_ids) == 5, 'Every task must be returned once'
+        assert len(set(seen_ids)) == 5, 'Pages must not overlap'
+
+    @pytest.mark.parametrize('cursor', [
+        'garbage',
+        encode_cursor(datetime(2024, 1, 1), 99999999999),
+        encode_cursor(datetime(2024, 1, 1), 0),
+    ])
+    async def test_user_cannot_get_tasks_with_invalid_cursor(
+            self, async_client, cursor):
+        url = '/tasks'
+        response = await async_client.get(url, params={'cursor': cursor})
+
+        assert response.status_code == 400
+
+    async def test_user_can_export_tasks_as_ndjson(
+            self, async_client, create_task):
+        [await create_task() for task in range(3)]  # Planned tasks
+        await create_task(status='завершена')  # Completed task
+
+        url = '/tasks/export'
+        response = await async_client.get(url,
+                                          params={'status': 'завершена'})
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith(
+            'application/x-ndjson')
+        lines = response.text.splitlines()
+        assert len(lines) == 1, (
+            'Export must honor status filter')
+        assert json.loads(lines[0])['status'] == 'завершена'
+
+    async def test_user_can_export_tasks_as_csv(
+            self, async_client, create_task):
+        [await create_task() for task in range(3)]
+
+        url = '/tasks/export'
+        response = await async_client.get(url, params={'format': 'csv'})
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/csv')
+        rows = list(csv.DictReader(io.StringIO(response.text)))
+        assert len(rows) == 3, 'Export must contain every task'
+        assert rows[0]['status'] == 'запланирована'
+
+
+class TestMyTasks:
+    '''Tests related to listing tasks of the authenticated user'''
+    async def test_user_gets_own_tasks_newest_first(
+            self, async_client, create_task, get_authorization_header):
+        user, older = await create_task()
+        async for session in get_test_session():
+            newer = Task(title='newer', description='', creator_id=user.id)
+            session.add(newer)
+            await session.commit()
+        await create_task()  # Task of someone else
+        headers = await get_authorization_header(user=user)
+
+        response = await async_client.get('/tasks/mine', headers=headers,
+                                          params={'limit': 1})
+        first_page = response.json()
+        response = await async_client.get(
+            '/tasks/mine', headers=headers,
+            params={'limit': 1, 'cursor': first_page['next_cursor']})
+
+        assert [item['id'] for item in first_page['items']] == [newer.id]
+        assert [item['id'] for item in response.json()['items']] == [
+            older.id]
+        assert response.json()['next_cursor'] is None
+
+    async def test_my_tasks_require_authentication(self, async_client):
+        response = await async_client.get('/tasks/mine')
+
+        assert response.status_code == 401
+
+    async def test_my_tasks_by_status_are_read_from_index_in_order(
+            self, async_client, create_task, get_authorization_header,
+            db_connection):
+        user, _ = await create_task()
+        other_user, _ = await create_task()
+        headers = await get_authorization_header(user=user)
+        statements = []
+
+        def collect(conn, cursor, statement, parameters, context,
+                    executemany):
+            if statement.startswith('SELECT') and 'FROM tasks' in statement:
+                statements.append((statement, parameters))
+
+        event.listen(async_engine.sync_engine, 'before_cursor_execute',
+                     collect)
+        try:
+            await async_client.get('/tasks/mine', headers=headers,
+                                   params={'status': 'завершена'})
+        finally:
+            event.remove(async_engine.sync_engine, 'before_cursor_execute',
+                         collect)
+
+        [(statement, parameters)] = statements
+        # Tasks of other users, so the planner has something to skip
+        await db_connection.exec_driver_sql(
+            "INSERT INTO tasks (title, description, status, creator_id) "
+            "SELECT 'task', '', 'COMPLETED', $1 "
+            "FROM generate_series(1, 5000)",
+            (other_user.id,))
+        await db_connection.exec_driver_sql('ANALYZE tasks')
+        result = await db_connection.exec_driver_sql(f'EXPLAIN {statement}',
+                                                     parameters)
+        plan = '\n'.join(row[0] for row in result)
+
+        assert ('Index Scan Backward using '
+                'ix_tasks_creator_id_status_created_at') in plan, plan
+        assert 'Sort' not in plan, 'Index must provide the order'
+
+
+class TestConditionalRequests:
+    '''Tests related to ETags of tasks and conditional requests'''
+    async def test_unchanged_task_is_not_sent_again(
+            self, async_client, create_task, get_authorization_header):
+        user, task = await create_task()
+        url = f'/tasks/{task.id}'
+        response = await async_client.get(url)
+        tag = response.headers['ETag']
+
+        not_modified = await async_client.get(
+            url, headers={'If-None-Match': tag})
+        await async_client.put(url, json={'title': 'changed'},
+                               headers=await get_authorization_header(
+                                   user=user))
+        changed = await async_client.get(url, headers={'If-None-Match': tag})
+
+        assert response.json()['version'] == 1
+        assert not_modified.status_code == 304
+        assert not_modified.content == b''
+        assert not_modified.headers['ETag'] == tag
+        assert changed.status_code == 200
+        assert changed.json()['version'] == 2
+        assert changed.headers['ETag'] != tag
+
+    async def test_unchanged_page_is_not_sent_again(
+            self, async_client, create_task):
+        [await create_task() for task in range(2)]
+        response = await async_client.get('/tasks')
+        tag = response.headers['ETag']
+
+        not_modified = await async_client.get(
+            '/tasks', headers={'If-None-Match': tag})
+        await create_task()
+        changed = await async_client.get(
+            '/tasks', headers={'If-None-Match': tag})
+
+        assert not_modified.status_code == 304
+        assert not_modified.content == b''
+        assert changed.status_code == 200
+        assert len(changed.json()['items']) == 3
+
+    async def test_update_with_stale_if_match_is_rejected(
+            self, async_client, create_task, get_authorization_header):
+        user, task = await create_task()
+        headers = await get_authorization_header(user=user)
+        url = f'/tasks/{task.id}'
+        tag = (await async_client.get(url)).headers['ETag']
+
+        first = await async_client.put(
+            url, json={'title': 'first'},
+            headers={**headers, 'If-Match': tag})
+        second = await async_client.put(
+            url, json={'title': 'second'},
+            headers={**headers, 'If-Match': tag})
+        current = await async_client.get(url)
+
+        assert first.status_code == 200
+        assert first.headers['ETag'] == current.headers['ETag'] != tag
+        assert second.status_code == 412
+        assert current.json()['title'] == 'first'
+
+    @pytest.mark.parametrize('version', ['²', '99999999999', '-1', ''])
+    async def test_update_with_malformed_if_match_is_rejected(
+            self, async_client, create_task, get_authorization_header,
+            version):
+        user, task = await create_task()
+        headers = await get_authorization_header(user=user)
+        # Servers decode header values as latin-1
+        tag = f'"{task.id}-{version}"'.encode('latin-1')
+
+        response = await async_client.put(
+            f'/tasks/{task.id}', json={'title': 'changed'},
+            headers={**headers, 'If-Match': tag})
+
+        assert response.status_code == 412
+
+    async def test_update_of_missing_task_with_if_match_is_not_found(
+            self, async_client, create_new_user, get_authorization_header):
+        headers = await get_authorization_header(user=await create_new_user())
+
+        response = await async_client.put(
+            '/tasks/100500', json={'title': 'changed'},
+            headers={**headers, 'If-Match': '"100500-1"'})
+
+        assert response.status_code == 404
+
+    async def test_bulk_update_bumps_versions(
+            self, async_client, create_task, get_authorization_header):
+        user, task = await create_task()
+
+        await async_client.put(
+            '/tasks/bulk', headers=await get_authorization_header(user=user),
+            json={'ids': [task.id], 'changes': {'status': 'завершена'}})
+        response = await async_client.get(f'/tasks/{task.id}')
+
+        assert response.json()['version'] == 2
+
+
+class TestTaskSearch:
+    '''Tests related to full-text search of tasks'''
+    @pytest.mark.parametrize('title, query', [
+        ('Купить молоко', 'молока'),
+        ('Running integration tests', 'run test'),
+    ])
+    async def test_search_matches_word_forms(
+            self, async_client, create_task, title, query):
+        _, task = await create_task(title=title)
+        await create_task(title='Unrelated')
+
+        response = await async_client.get('/tasks/search',
+                                          params={'q': query})
+
+        assert response.status_code == 200
+        assert [item['id'] for item in response.json()['items']] == [
+            task.id]
+
+    async def test_title_match_ranks_above_description_match(
+            self, async_client, create_task):
+        _, in_description = await create_task(
+            title='Weekly chores', description='Clean the kitchen')
+        _, in_title = await create_task(title='Kitchen renovation')
+
+        response = await async_client.get('/tasks/search',
+                                          params={'q': 'kitchen'})
+
+        assert [item['id'] for item in response.json()['items']] == [
+            in_title.id, in_description.id]
+
+    async def test_user_can_page_through_search_results(
+            self, async_client, create_task):
+        for number in range(5):
+            await create_task(title=f'Отчёт номер {number}')
+
+        seen_ids, cursor = [], None
+        while True:
+            params = {'q': 'отчёт', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            response = await async_client.get('/tasks/search',
+                                              params=params)
+            assert response.status_code == 200
+            page = response.json()
+            seen_ids.extend(item['id'] for item in page['items'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        assert len(seen_ids) == 5, 'Every match must be returned'
+        assert len(set(seen_ids)) == 5, 'Pages must not overlap'
+
+    @pytest.mark.parametrize('cursor', [
+        'garbage', encode_rank_cursor(0.5, 99999999999)])
+    async def test_search_rejects_invalid_cursor(self, async_client, cursor):
+        response = await async_client.get(
+            '/tasks/search', params={'q': 'task', 'cursor': cursor})
+
+        assert response.status_code == 400
+
+
+class TestTaskStats:
+    '''Tests related to incrementally maintained status counters'''
+    async def test_stats_follow_every_write(
+            self, async_client, create_new_user, get_authorization_header):
+        author, other = await create_new_user(), await create_new_user()
+        headers = await get_authorization_header(user=author)
+        other_headers = await get_authorization_header(user=other)
+        task = {'title': 'task', 'description': ''}
+        response = await async_client.post(
+            '/tasks/bulk', headers=headers, json=[task, task, task])
+        first, second, third = [item['id'] for item in response.json()]
+        await async_client.post('/tasks', headers=other_headers, json=task)
+
+        await async_client.put(f'/tasks/{first}', headers=headers,
+                               json={'status': 'в процессе'})
+        await async_client.put(f'/tasks/{first}', headers=headers,
+                               json={'title': 'renamed'})
+        await async_client.put('/tasks/bulk', headers=headers, json={
+            'ids': [second, third], 'changes': {'status': 'завершена'}})
+        await async_client.delete(f'/tasks/{third}', headers=headers)
+
+        response = await async_client.get('/tasks/stats')
+        assert response.status_code == 200
+        assert response.json() == {
+            'creator_id': None,
+            'counts': {'запланирована': 1, 'в процессе': 1, 'завершена': 1},
+            'total': 3,
+        }
+        response = await async_client.get(
+            '/tasks/stats', params={'creator_id': author.id})
+        assert response.json()['counts'] == {
+            'запланирована': 0, 'в процессе': 1, 'завершена': 1}
+
+    async def test_counter_rows_are_locked_in_key_order(
+            self, async_client, create_new_user, get_authorization_header,
+            executed_statements):
+        # Concurrent writes locking shared counter rows in different
+        # orders deadlock, the upsert has to sort its rows
+        headers = await get_authorization_header(user=await create_new_user())
+        task = {'title': 'task', 'description': ''}
+        response = await async_client.post(
+            '/tasks/bulk', headers=headers, json=[task, task])
+        ids = [item['id'] for item in response.json()]
+        executed_statements.clear()
+
+        response = await async_client.put('/tasks/bulk', headers=headers,
+                                          json={'ids': ids, 'changes': {
+                                              'status': 'завершена'}})
+
+        assert response.status_code == 200
+        upsert, = [statement for statement in executed_statements
+                   if 'INSERT INTO task_status_counts' in statement]
+        assert 'ORDER BY deltas.creator_id, deltas.status' in upsert
+
+    async def test_reconcile_fixes_drifted_counters(
+            self, async_client, create_new_user, get_authorization_header):
+        headers = await get_authorization_header(user=await create_new_user())
+        await async_client.post(
+            '/tasks', headers=headers, json={'title': 'task',
+                                             'description': ''})
+        async for session in get_test_session():
+            # Tasks written around task_crud leave the counters behind
+            session.add(Task(title='raw insert', description=''))
+            await session.commit()
+
+            corrected = await task_crud.reconcile_task_counts(session)
+            await session.commit()
+
+        assert corrected == 1
+        response = await async_client.get('/tasks/stats')
+        assert response.json()['counts']['запланирована'] == 2
+
+
+class TestTaskWriteRoundTrips:
+    '''Each single task write costs one statement and one commit'''
+    @pytest.mark.parametrize('method, path, body, expected_status', [
+        ('post', '/tasks', {'title': 'new', 'description': ''}, 201),
+        ('put', '/tasks/{task_id}', {'status': 'завершена'}, 200),
+        ('delete', '/tasks/{task_id}', None, 204),
+    ])
+    async def test_write_is_single_statement_and_commit(
+            self, async_client, get_authorization_header, create_task,
+            executed_statements, committed_transactions,
+            method, path, body, expected_status):
+        task_creator, task = await create_task()
+        headers = await get_authorization_header(user=task_creator)
+        executed_statements.clear()
+        committed_transactions.clear()
+
+        response = await async_client.request(
+            method, path.format(task_id=task.id), headers=headers,
+            json=body)
+
+        assert response.status_code == expected_status
+        assert len(executed_statements) == 1, executed_statements
+        assert 'RETURNING' in executed_statements[0]
+        assert len(committed_transactions) == 1
+
+    @pytest.mark.parametrize('method, body', [
+        ('put', {'status': 'завершена'}),
+        ('delete', None),
+    ])
+    async def test_write_of_missing_task_is_not_found(
+            self, async_client, get_authorization_header, create_new_user,
+            executed_statements, committed_transactions, method, body):
+        headers = await get_authorization_header(user=await create_new_user())
+        executed_statements.clear()
+        committed_transactions.clear()
+
+        response = await async_client.request(
+            method, '/tasks/999999', headers=headers, json=body)
+
+        assert response.status_code == 404
+        assert len(executed_statements) == 1
+        assert committed_transactions == []
@@ -1,9 +1,13 @@
 import asyncio
+import threading
+import time
 
 import pytest
+from fastapi import HTTPException
 from sqlalchemy import func, select
 
 from todo_tracker.db.models.user import User
+from todo_tracker.utils.password import PasswordHasher, password_hasher
 
 from .conftest import async_test_session_factory
 
@@ -40,3 +44,57 @@ async def test_create_user_endpoint_async(async_client):
     # Assuming each request takes about 1 second,
     # concurrent should be <3 seconds
     assert total_time < 3, "Requests did not complete concurrently as expected"
+
+
+async def test_register_sheds_load_when_hashing_pool_is_saturated(
+        async_client, monkeypatch):
+    monkeypatch.setattr(password_hasher, 'limit', 0)
+
+    response = await async_client.post(
+        "/auth/register",
+        data={"username": "test_user1", "password": "strong_password"})
+
+    assert response.status_code == 503
+    assert 'retry-after' in response.headers
+
+
+async def test_password_hashing_does_not_block_event_loop():
+    hasher = PasswordHasher(max_workers=1, max_pending=0)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    await hasher.run(time.sleep, 0.2)
+    ticker_task.cancel()
+
+    assert ticks > 5, 'Event loop must keep running while hashing'
+
+
+async def test_cancelled_hashing_keeps_its_slot_until_done():
+    hasher = PasswordHasher(max_workers=1, max_pending=0)
+    started, release = threading.Event(), threading.Event()
+
+    def hash_slowly():
+        started.set()
+        release.wait(timeout=5)
+
+    hashing = asyncio.create_task(hasher.run(hash_slowly))
+    await asyncio.to_thread(started.wait, 5)
+    hashing.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await hashing
+
+    assert hasher.in_flight == 1, 'Thread is still hashing'
+    with pytest.raises(HTTPException) as error:
+        await hasher.run(time.sleep, 0)
+    assert error.value.status_code == 503
+
+    release.set()
+    await asyncio.sleep(0.1)
+    assert hasher.in_flight == 0
+    await hasher.run(time.sleep, 0)
@@ -1,7 +1,10 @@
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from todo_tracker.db.crud import user_crud
 from todo_tracker.db.crud.user_crud import get_user_by_username
-from todo_tracker.utils.password import verify_password
+from todo_tracker.redis.revocation import revoke_user_tokens
+from todo_tracker.utils.password import verify_password_async
 
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
@@ -17,10 +20,49 @@ async def authenticate_user(db: AsyncSession, username: str, password: str):
         User | bool: Returns the authenticated `User` object if successful,
                      or `False` if authentication fails.
 
+    Raises:
+        HTTPException: If the password hashing pool is saturated,
+        raises a 503 Service Unavailable error.
+
     """
     user = await get_user_by_username(session=db, username=username)
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return False
     return user
+
+
+async def deactivate_user(
+        db: AsyncSession, redis_client: Redis, user) -> None:
+    """
+    Deactivates a user and revokes the tokens issued to them.
+
+    Args:
+        db (AsyncSession): Database session.
+        redis_client (Redis): Redis client holding tokens.
+        user (User): The user to deactivate.
+    """
+    await user_crud.deactivate_user(user_id=user.id, session=db)
+    await revoke_user_tokens(redis_client, user.id, user.username)
+
+
+async def change_password(
+        db: AsyncSession, redis_client: Redis, user, password: str) -> None:
+    """
+    Changes the password of a user and revokes the tokens issued
+    with the old one.
+
+    Args:
+        db (AsyncSession): Database session.
+        redis_client (Redis): Redis client holding tokens.
+        user (User): The user changing password.
+        password (str): The new plaintext password.
+
+    Raises:
+        HTTPException: If the password hashing pool is saturated,
+        raises a 503 Service Unavailable error.
+    """
+    await user_crud.update_password(
+        user_id=user.id, password=password, session=db)
+    await revoke_user_tokens(redis_client, user.id, user.username)
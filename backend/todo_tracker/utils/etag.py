@@ -0,0 +1,102 @@
+import hashlib
+import re
+from typing import Iterable, List, Optional, Tuple
+
+# Versions are stored in a 32-bit integer column
+VERSION = re.compile(r'[0-9]{1,10}')
+MAX_VERSION = 2 ** 31 - 1
+
+
+def task_etag(task_id: int, version: int) -> str:
+    """
+    Builds the strong entity tag of a single task.
+
+    Args:
+        task_id (int): ID of the task.
+        version (int): Current version of the task.
+
+    Returns:
+        str: Quoted entity tag, changes with every update of the task.
+    """
+    return f'"{task_id}-{version}"'
+
+
+def page_etag(tasks: Iterable[Tuple[int, int]],
+              next_cursor: Optional[str]) -> str:
+    """
+    Builds the strong entity tag of a page of tasks.
+
+    The page is identified by ids and versions of its tasks, so any
+    create, update or delete touching the page changes the tag,
+    while the tasks themselves need not be serialized to compute it.
+
+    Args:
+        tasks (Iterable[Tuple[int, int]]): IDs and versions of the tasks
+            in the order they are returned.
+        next_cursor (Optional[str]): Cursor returned with the page.
+
+    Returns:
+        str: Quoted entity tag of the page.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for task_id, version in tasks:
+        digest.update(f'{task_id}-{version},'.encode())
+    digest.update((next_cursor or '').encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def parse_etags(header: str) -> List[str]:
+    '''Split a list of entity tags from If-Match or If-None-Match.'''
+    return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+
+def none_match(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Evaluates an If-None-Match precondition against the current tag.
+
+    Args:
+        if_none_match (Optional[str]): Value of the If-None-Match header.
+        etag (str): Current entity tag of the resource.
+
+    Returns:
+        bool: False if the client already has the current
+        representation, so 304 Not Modified can be answered.
+    """
+    if if_none_match is None:
+        return True
+    opaque = etag.removeprefix('W/')
+    for tag in parse_etags(if_none_match):
+        # Weak comparison, as required for If-None-Match
+        if tag == '*' or tag.removeprefix('W/') == opaque:
+            return False
+    return True
+
+
+def matching_versions(if_match: Optional[str],
+                      task_id: int) -> Optional[List[int]]:
+    """
+    Extracts task versions a client expects from an If-Match header.
+
+    Args:
+        if_match (Optional[str]): Value of the If-Match header.
+        task_id (int): ID of the task being changed.
+
+    Returns:
+        Optional[List[int]]: Versions the task may have for the request
+        to proceed, or None if any existing version is acceptable.
+        Weak tags, tags of other tasks and malformed tags never match.
+    """
+    if if_match is None:
+        return None
+    tags = parse_etags(if_match)
+    if '*' in tags:
+        return None
+    versions = []
+    prefix = f'"{task_id}-'
+    for tag in tags:
+        if tag.startswith(prefix) and tag.endswith('"'):
+            version = tag[len(prefix):-1]
+            # isdigit() accepts digits int() rejects, like "²"
+            if VERSION.fullmatch(version) and int(version) <= MAX_VERSION:
+                versions.append(int(version))
+    return versions
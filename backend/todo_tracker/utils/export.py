@@ -0,0 +1,57 @@
+import csv
+import io
+import json
+from typing import Sequence
+
+from sqlalchemy import Row
+
+EXPORT_FIELDS = ('id', 'title', 'description', 'status',
+                 'created_at', 'creator_id')
+
+
+def _row_to_dict(row: Row) -> dict:
+    task = row._asdict()
+    task['status'] = task['status'].value
+    task['created_at'] = task['created_at'].isoformat()
+    return task
+
+
+def rows_to_ndjson(rows: Sequence[Row]) -> str:
+    """
+    Serializes a chunk of task rows as newline-delimited JSON.
+
+    Args:
+        rows (Sequence[Row]): Task rows selected with `EXPORT_FIELDS`.
+
+    Returns:
+        str: One JSON document per line, each line ends with a newline.
+    """
+    return ''.join(
+        json.dumps(_row_to_dict(row), ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def csv_header() -> str:
+    '''Returns the CSV header line for exported tasks.'''
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def rows_to_csv(rows: Sequence[Row]) -> str:
+    """
+    Serializes a chunk of task rows as CSV lines without a header.
+
+    Args:
+        rows (Sequence[Row]): Task rows selected with `EXPORT_FIELDS`.
+
+    Returns:
+        str: CSV lines for the given rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        task = _row_to_dict(row)
+        writer.writerow(task[field] for field in EXPORT_FIELDS)
+    return buffer.getvalue()
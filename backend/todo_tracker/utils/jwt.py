@@ -18,13 +18,16 @@ async def create_access_token(data: dict) -> str:
     Returns:
         str: The encoded JWT access token.
 
-    The token includes an expiration time calculated based on the
-    `ACCESS_TOKEN_EXPIRE_MINUTES` setting in `JWTSettings`.
+    The token includes an issue time and an expiration time calculated
+    based on the `ACCESS_TOKEN_EXPIRE_MINUTES` setting in `JWTSettings`.
     """
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + timedelta(
         minutes=token_settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # Fractional, so tokens issued right after a revocation in the
+    # same second are told apart from the revoked ones
+    to_encode.update({"exp": expire, "iat": issued_at.timestamp()})
     encoded_jwt = jwt.encode(to_encode, token_settings.JWT_SECRET_KEY,
                              algorithm=token_settings.JWT_ALGORITHM)
     return encoded_jwt
@@ -40,19 +43,36 @@ async def create_refresh_token(data: dict) -> str:
     Returns:
         str: The encoded JWT refresh token.
 
-    The token includes an expiration time calculated based on the
-    `REFRESH_TOKEN_EXPIRE_DAYS` setting in `JWTSettings`.
+    The token includes an issue time and an expiration time calculated
+    based on the `REFRESH_TOKEN_EXPIRE_DAYS` setting in `JWTSettings`.
     """
     to_encode = data.copy()
-    expire = datetime.now(timezone.utc) + timedelta(
+    issued_at = datetime.now(timezone.utc)
+    expire = issued_at + timedelta(
         days=token_settings.REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire})
+    # Fractional, so tokens issued right after a revocation in the
+    # same second are told apart from the revoked ones
+    to_encode.update({"exp": expire, "iat": issued_at.timestamp()})
     encoded_jwt = jwt.encode(to_encode,
                              token_settings.JWT_REFRESH_SECRET_KEY,
                              algorithm=token_settings.JWT_ALGORITHM)
     return encoded_jwt
 
 
+def user_claims(user) -> dict:
+    """
+    Builds the claims identifying a user inside JWT tokens.
+
+    Args:
+        user (User): The authenticated user.
+
+    Returns:
+        dict: `sub` with the username, `uid` with the user ID
+        and `active` with the activity flag of the user.
+    """
+    return {"sub": user.username, "uid": user.id, "active": user.is_active}
+
+
 async def verify_token(token: str, secret_key: str) -> dict | None:
     """
     Verifies and decodes a JWT token.
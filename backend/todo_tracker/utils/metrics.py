@@ -0,0 +1,184 @@
+'''
+Prometheus metrics of HTTP requests, database queries and Redis
+commands, served in text format on /metrics.
+
+Requests are labelled by route template, not by path, so /tasks/1 and
+/tasks/2 share a series. Paths matching no route share one series too.
+'''
+import functools
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from prometheus_client import Counter, Histogram
+from redis.asyncio import Redis
+from sqlalchemy import Delete, Insert, Update, event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from todo_tracker.config import MetricsSettings
+
+metrics_settings = MetricsSettings()
+
+# Most queries and Redis commands take well under the 5ms lowest
+# default bucket
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                0.25, 0.5, 1.0, 2.5)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+UNMATCHED_ROUTE = '<unmatched>'
+# Other methods and statements are counted together, so clients
+# cannot create new series
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                          'OPTIONS'})
+QUERY_OPERATIONS = frozenset({'SELECT', 'INSERT', 'UPDATE', 'DELETE'})
+DML_OPERATIONS = ((Insert, 'INSERT'), (Update, 'UPDATE'), (Delete, 'DELETE'))
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time to handle a request until the end of its response body',
+    ['method', 'route', 'status'])
+HTTP_REQUEST_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries executed while handling a request',
+    ['method', 'route'], buckets=QUERY_COUNT_BUCKETS)
+DB_QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'Execution time of database queries',
+    ['database', 'operation'], buckets=FAST_BUCKETS)
+REDIS_COMMAND_DURATION = Histogram(
+    'redis_command_duration_seconds',
+    'Round trip time of Redis commands',
+    ['command'], buckets=FAST_BUCKETS)
+REDIS_COMMAND_ERRORS = Counter(
+    'redis_command_errors',
+    'Redis commands that failed',
+    ['command'])
+
+# labels() validates values and takes a lock on every call, children
+# of the metrics are looked up once. Label values are bounded above.
+request_duration = functools.lru_cache(maxsize=None)(
+    HTTP_REQUEST_DURATION.labels)
+request_queries_count = functools.lru_cache(maxsize=None)(
+    HTTP_REQUEST_QUERIES.labels)
+redis_command_duration = functools.lru_cache(maxsize=None)(
+    REDIS_COMMAND_DURATION.labels)
+
+# Queries of the request being handled, a list to be shared with
+# copies of the context
+request_queries: ContextVar[Optional[List[int]]] = ContextVar(
+    'request_queries', default=None)
+
+
+class MetricsMiddleware:
+    '''
+    ASGI middleware timing requests and counting their queries.
+    Plain ASGI rather than BaseHTTPMiddleware, which would buffer
+    streamed exports and add a task per request.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        # Unhandled errors are turned into 500 further out
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        queries = [0]
+        token = request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            request_queries.reset(token)
+            # The router stores the matched route in the scope
+            route = scope.get('route')
+            template = route.path if route is not None else UNMATCHED_ROUTE
+            method = scope['method']
+            if method not in HTTP_METHODS:
+                method = 'OTHER'
+            request_duration(method, template, str(status)).observe(elapsed)
+            request_queries_count(method, template).observe(queries[0])
+
+
+def query_operation(statement: str, context) -> str:
+    """
+    Tells the kind of a query for the `operation` label.
+
+    Writes like `WITH updated AS (UPDATE ... RETURNING ...) SELECT ...`
+    are labeled with their first data-changing CTE, other queries with
+    their leading keyword.
+
+    Args:
+        statement (str): SQL text of the query.
+        context (ExecutionContext | None): Execution context of the query.
+
+    Returns:
+        str: Leading keyword, e.g. "UPDATE", possibly not an operation.
+    """
+    compiled = getattr(context, 'compiled', None)
+    for cte in getattr(compiled, 'ctes', None) or ():
+        for dml, operation in DML_OPERATIONS:
+            if isinstance(cte.element, dml):
+                return operation
+    return statement[:6].upper()
+
+
+def instrument_engine(engine: AsyncEngine, database: str) -> None:
+    """
+    Times every query of the engine and counts it for the request
+    being handled.
+
+    Args:
+        engine (AsyncEngine): Engine to instrument.
+        database (str): Value of the `database` label, e.g. "replica".
+    """
+    histograms = {operation: DB_QUERY_DURATION.labels(database, operation)
+                  for operation in QUERY_OPERATIONS}
+    other = DB_QUERY_DURATION.labels(database, 'OTHER')
+
+    def before_cursor_execute(conn, cursor, statement, parameters,
+                              context, executemany):
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters,
+                             context, executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is None:
+            return
+        histograms.get(query_operation(statement, context), other).observe(
+            time.perf_counter() - started)
+        queries = request_queries.get()
+        if queries is not None:
+            queries[0] += 1
+
+    event.listen(engine.sync_engine, 'before_cursor_execute',
+                 before_cursor_execute)
+    event.listen(engine.sync_engine, 'after_cursor_execute',
+                 after_cursor_execute)
+
+
+class InstrumentedRedis(Redis):
+    '''Redis client timing every command it sends.'''
+
+    async def execute_command(self, *args, **options):
+        command = args[0]
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_COMMAND_ERRORS.labels(command).inc()
+            raise
+        finally:
+            redis_command_duration(command).observe(
+                time.perf_counter() - started)
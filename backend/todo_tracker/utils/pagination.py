@@ -0,0 +1,94 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException, status
+
+# Task ids are stored in a 32-bit integer column
+MAX_TASK_ID = 2 ** 31 - 1
+
+
+def encode_cursor(created_at: datetime, task_id: int) -> str:
+    """
+    Encodes a keyset position into an opaque cursor string.
+
+    Args:
+        created_at (datetime): Creation time of the last returned task.
+        task_id (int): ID of the last returned task.
+
+    Returns:
+        str: URL-safe cursor that points right after the given task.
+    """
+    raw = f'{created_at.isoformat()}|{task_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    Args:
+        cursor (str): Opaque cursor received from the client.
+
+    Returns:
+        Tuple[datetime, int]: Creation time and ID of the last seen task.
+
+    Raises:
+        HTTPException: If the cursor is malformed,
+        raises a 400 Bad Request error.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, task_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), _task_id(task_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail='Invalid cursor')
+
+
+def encode_rank_cursor(rank: float, task_id: int) -> str:
+    """
+    Encodes a position in search results ordered by rank.
+
+    Args:
+        rank (float): Rank of the last returned task.
+        task_id (int): ID of the last returned task.
+
+    Returns:
+        str: URL-safe cursor that points right after the given task.
+    """
+    raw = f'{rank!r}|{task_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    Decodes a cursor produced by `encode_rank_cursor`.
+
+    Args:
+        cursor (str): Opaque cursor received from the client.
+
+    Returns:
+        Tuple[float, int]: Rank and ID of the last seen task.
+
+    Raises:
+        HTTPException: If the cursor is malformed,
+        raises a 400 Bad Request error.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        rank, task_id = raw.rsplit('|', 1)
+        return float(rank), _task_id(task_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail='Invalid cursor')
+
+
+def _task_id(value: str) -> int:
+    task_id = int(value)
+    if not 1 <= task_id <= MAX_TASK_ID:
+        raise ValueError(f'Task ID {task_id} is out of range')
+    return task_id
@@ -1,5 +1,11 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
 
+from todo_tracker.config import PasswordHashingSettings
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
@@ -9,3 +15,57 @@ def verify_password(plain_password, hashed_password):
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+
+class PasswordHasher:
+    '''
+    Runs bcrypt in a dedicated thread pool so it does not block
+    the event loop. bcrypt releases the GIL, so threads hash in parallel.
+    Calls beyond `max_workers + max_pending` are rejected with 503.
+    '''
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.limit = max_workers + max_pending
+        self.in_flight = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='password-hash')
+
+    async def run(self, func, *args):
+        """
+        Runs blocking hashing function in the thread pool.
+
+        Raises:
+            HTTPException: If the pool is saturated,
+            raises a 503 Service Unavailable error.
+        """
+        if self.in_flight >= self.limit:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Too many authentication requests, try again later',
+                headers={'Retry-After': '1'})
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+        self.in_flight += 1
+        # A cancelled caller stops waiting but the thread keeps hashing,
+        # the slot is released once the thread is done
+        future.add_done_callback(
+            lambda _: loop.call_soon_threadsafe(self._release))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+
+
+hashing_settings = PasswordHashingSettings()
+password_hasher = PasswordHasher(
+    max_workers=hashing_settings.PASSWORD_HASH_MAX_WORKERS,
+    max_pending=hashing_settings.PASSWORD_HASH_MAX_PENDING)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await password_hasher.run(verify_password,
+                                     plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await password_hasher.run(get_password_hash, password)
@@ -0,0 +1,32 @@
+from typing import Optional, Sequence
+
+import orjson
+from sqlalchemy import Row
+
+from todo_tracker.schemas.task_schemas import TASK_READ_FIELDS
+
+
+def task_page_json(rows: Sequence[Row], next_cursor: Optional[str]) -> bytes:
+    """
+    Serializes a page of task rows into the JSON body of `TaskPage`.
+
+    Rows are dumped straight from the database values with orjson,
+    skipping Pydantic validation, and produce the same document as
+    `TaskPage` would.
+
+    Args:
+        rows (Sequence[Row]): Task rows starting with the columns of
+            `TASK_READ_FIELDS`, extra trailing columns are ignored.
+        next_cursor (Optional[str]): Cursor returned with the page.
+
+    Returns:
+        bytes: UTF-8 encoded JSON document.
+    """
+    return orjson.dumps(
+        {
+            'items': [dict(zip(TASK_READ_FIELDS, row)) for row in rows],
+            'next_cursor': next_cursor,
+        },
+        # Pydantic writes UTC datetimes with Z as well
+        option=orjson.OPT_UTC_Z,
+    )
@@ -1,25 +1,373 @@
+import asyncio
 import os
+import time
+from contextlib import asynccontextmanager
 
-from aiohttp import web, ClientSession
+from aiohttp import (ClientConnectionError, ClientSession, ClientTimeout,
+                     TCPConnector, web)
+from multidict import CIMultiDict
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from redis.asyncio import Redis
+
+from metrics import (InstrumentedRedis, RouteLabels, method_label,
+                     observe_upstream_request, request_duration)
+from rate_limit import RateLimiter, parse_rules, retry_after_header
+from response_cache import (VALIDATOR_HEADERS, CacheEntry, ResponseCache,
+                            etag_matches)
+from upstreams import UpstreamPool
 
 AIOHTTP_PORT = int(os.getenv('AIOHTTP_PORT'))
 AIOHTTP_HOST = os.getenv('AIOHTTP_HOST')
 
+# Comma separated list of backend instances to balance across
+BACKEND_URLS = os.getenv(
+    'BACKEND_URLS', os.getenv('BACKEND_URL', 'http://backend:8000')
+).split(',')
+
+# Active health checks of backend instances
+HEALTH_CHECK_PATH = os.getenv('HEALTH_CHECK_PATH', '/service/health')
+HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', '5'))
+HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', '2'))
+# Consecutive failures that eject and successes that re-admit a backend
+UNHEALTHY_THRESHOLD = int(os.getenv('UNHEALTHY_THRESHOLD', '2'))
+HEALTHY_THRESHOLD = int(os.getenv('HEALTHY_THRESHOLD', '2'))
+
+# Upstream connection pool settings
+UPSTREAM_POOL_LIMIT = int(os.getenv('UPSTREAM_POOL_LIMIT', '100'))
+# 0 means no per host limit
+UPSTREAM_POOL_LIMIT_PER_HOST = int(
+    os.getenv('UPSTREAM_POOL_LIMIT_PER_HOST', '0'))
+UPSTREAM_KEEPALIVE_TIMEOUT = float(
+    os.getenv('UPSTREAM_KEEPALIVE_TIMEOUT', '30'))
+UPSTREAM_DNS_CACHE_TTL = int(os.getenv('UPSTREAM_DNS_CACHE_TTL', '10'))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '10'))
+# Max silence between two chunks, long exports have no total deadline
+UPSTREAM_READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '300'))
+# Extra attempts on other backends for safe requests failing to connect
+UPSTREAM_RETRIES = int(os.getenv('UPSTREAM_RETRIES', '1'))
+
+# Size of body chunks passed between client and backend
+PROXY_CHUNK_SIZE = int(os.getenv('PROXY_CHUNK_SIZE', '65536'))
+
+# Headers meaningful only for a single connection, never forwarded
+HOP_BY_HOP_HEADERS = frozenset({
+    'connection', 'keep-alive', 'proxy-authenticate',
+    'proxy-authorization', 'te', 'trailer', 'trailers',
+    'transfer-encoding', 'upgrade',
+})
+
+# Opt-in cache of idempotent GET responses
+RESPONSE_CACHE_ENABLED = os.getenv(
+    'RESPONSE_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+RESPONSE_CACHE_MAX_BYTES = int(
+    os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(
+    os.getenv('RESPONSE_CACHE_MAX_ENTRY_BYTES', str(1024 * 1024)))
+# Freshness of responses without max-age, 0 revalidates every request
+RESPONSE_CACHE_DEFAULT_TTL = float(
+    os.getenv('RESPONSE_CACHE_DEFAULT_TTL', '0'))
+RESPONSE_CACHE_PATH_PREFIXES = tuple(
+    os.getenv('RESPONSE_CACHE_PATH_PREFIXES', '/tasks').split(','))
+
+# Token bucket limits per client, see rate_limit.parse_rules for format
+RATE_LIMIT_ENABLED = os.getenv(
+    'RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_RULES = os.getenv('RATE_LIMIT_RULES',
+                             '/auth/login:10/60,/:200/10')
+# Clients out of tokens remembered to reject them without Redis
+RATE_LIMIT_LOCAL_MAXSIZE = int(os.getenv('RATE_LIMIT_LOCAL_MAXSIZE',
+                                         '10000'))
+REDIS_HOST = os.getenv('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.getenv('REDIS_PORT', '6379'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '1'))
+# Access tokens are verified to key limits by their subject
+JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY')
+JWT_ALGORITHM = os.getenv('JWT_ALGORITHM', 'HS256')
+
+# Prometheus metrics served on /metrics
+METRICS_ENABLED = os.getenv(
+    'METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Templates of proxied paths labelled separately, see metrics.RouteLabels
+METRICS_MAX_ROUTES = int(os.getenv('METRICS_MAX_ROUTES', '200'))
+
+# Status of requests whose client went away before the response
+CLIENT_CLOSED_STATUS = 499
+PROXY_ROUTE = '/{path_info:.*}'
+
+# Methods that may change state and invalidate cached responses
+UNSAFE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+client_session_key = web.AppKey('client_session', ClientSession)
+response_cache_key = web.AppKey('response_cache', ResponseCache)
+upstream_pool_key = web.AppKey('upstream_pool', UpstreamPool)
+rate_limiter_key = web.AppKey('rate_limiter', RateLimiter)
+route_labels_key = web.AppKey('route_labels', RouteLabels)
+
+
+async def client_session_ctx(app):
+    '''Keep one pooled keep-alive session for the whole app lifetime.'''
+    connector = TCPConnector(
+        limit=UPSTREAM_POOL_LIMIT,
+        limit_per_host=UPSTREAM_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=UPSTREAM_KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=UPSTREAM_DNS_CACHE_TTL,
+    )
+    timeout = ClientTimeout(total=None,
+                            sock_connect=UPSTREAM_CONNECT_TIMEOUT,
+                            sock_read=UPSTREAM_READ_TIMEOUT)
+    # Bodies are relayed as is, so keep their Content-Encoding intact
+    async with ClientSession(connector=connector, timeout=timeout,
+                             auto_decompress=False) as session:
+        app[client_session_key] = session
+        yield
+
+
+async def rate_limiter_ctx(app):
+    '''Connect to Redis holding token buckets shared by gateways.'''
+    redis_class = InstrumentedRedis if METRICS_ENABLED else Redis
+    redis = redis_class(host=REDIS_HOST, port=REDIS_PORT,
+                        socket_timeout=REDIS_SOCKET_TIMEOUT,
+                        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+                        decode_responses=True)
+    app[rate_limiter_key] = RateLimiter(
+        redis, parse_rules(RATE_LIMIT_RULES),
+        jwt_secret_key=JWT_SECRET_KEY, jwt_algorithm=JWT_ALGORITHM,
+        local_maxsize=RATE_LIMIT_LOCAL_MAXSIZE)
+    yield
+    await redis.aclose()
+
+
+@web.middleware
+async def rate_limit_middleware(request, handler):
+    retry_after = await request.app[rate_limiter_key].check(request)
+    if retry_after is not None:
+        raise web.HTTPTooManyRequests(
+            headers={'Retry-After': retry_after_header(retry_after)},
+            text='Too many requests')
+    return await handler(request)
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    # Unexpected errors are answered with 500 by aiohttp
+    status = 500
+    started = time.perf_counter()
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as error:
+        status = error.status
+        raise
+    except asyncio.CancelledError:
+        status = CLIENT_CLOSED_STATUS
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.app[route_labels_key].label(request, status)
+        request_duration(method_label(request.method), route,
+                         str(status)).observe(elapsed)
+
+
+async def health_checks_ctx(app):
+    '''Probe backends periodically to eject and re-admit them.'''
+    health_checks = asyncio.create_task(
+        app[upstream_pool_key].run_health_checks(
+            app[client_session_key], HEALTH_CHECK_PATH,
+            HEALTH_CHECK_INTERVAL, HEALTH_CHECK_TIMEOUT))
+    yield
+    health_checks.cancel()
+    try:
+        await health_checks
+    except asyncio.CancelledError:
+        pass
+
+
+@asynccontextmanager
+async def upstream_request(request, method, headers, data=None):
+    '''Send request to the least loaded of two random healthy backends.'''
+    pool = request.app[upstream_pool_key]
+    session = request.app[client_session_key]
+    # Safe requests without a body are retried on another backend
+    # when the connection fails before any response is received
+    attempts = (1 + UPSTREAM_RETRIES
+                if method not in UNSAFE_METHODS and data is None else 1)
+    tried = []
+    for _ in range(attempts):
+        upstream = pool.choose(exclude=tried)
+        tried.append(upstream)
+        started = time.monotonic()
+        pool.request_started(upstream)
+        try:
+            resp = await session.request(
+                method, f"{upstream.url}{request.rel_url}",
+                headers=headers, data=data, allow_redirects=False)
+            break
+        except (ClientConnectionError, asyncio.TimeoutError):
+            elapsed = time.monotonic() - started
+            pool.request_finished(upstream, elapsed, None)
+            if METRICS_ENABLED:
+                observe_upstream_request(upstream.url, elapsed, None)
+        except BaseException:
+            # Cancelled or not sent at all, the request must not stay
+            # in flight and steer traffic away from the upstream
+            pool.request_abandoned(upstream)
+            raise
+    else:
+        raise web.HTTPBadGateway(text='Backend is unavailable')
+
+    try:
+        async with resp:
+            yield resp
+    finally:
+        elapsed = time.monotonic() - started
+        pool.request_finished(upstream, elapsed, resp.status)
+        if METRICS_ENABLED:
+            observe_upstream_request(upstream.url, elapsed, resp.status)
+
+
+def forwarded_headers(headers):
+    '''Copy headers except hop-by-hop ones and those named in Connection.'''
+    connection_tokens = {
+        token.strip().lower()
+        for token in headers.get('Connection', '').split(',')
+    }
+    return CIMultiDict(
+        (name, value) for name, value in headers.items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+        and name.lower() not in connection_tokens
+    )
+
+
+async def relay_response(request, resp):
+    '''Stream upstream response to the client chunk by chunk.'''
+    response = web.StreamResponse(
+        status=resp.status, reason=resp.reason,
+        headers=forwarded_headers(resp.headers)
+    )
+    await response.prepare(request)
+    async for chunk in resp.content.iter_chunked(PROXY_CHUNK_SIZE):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+def cached_response(request, entry: CacheEntry, cache_status: str):
+    '''Serve stored response, or 304 if the client holds it already.'''
+    if etag_matches(request.headers.get('If-None-Match'), entry.etag):
+        request.app[response_cache_key].counters['not_modified'] += 1
+        headers = CIMultiDict(
+            (name, value) for name, value in entry.headers.items()
+            if name.lower() in VALIDATOR_HEADERS)
+        headers['X-Cache'] = cache_status
+        return web.Response(status=304, headers=headers)
+    headers = CIMultiDict(entry.headers)
+    headers['X-Cache'] = cache_status
+    return web.Response(status=entry.status, headers=headers,
+                        body=entry.body)
+
+
+def is_cacheable_request(request):
+    return (request.method == 'GET'
+            and request.path.startswith(RESPONSE_CACHE_PATH_PREFIXES)
+            and 'Range' not in request.headers)
+
+
+async def cached_proxy_handler(request):
+    cache = request.app[response_cache_key]
+    key = cache.key(request.path_qs, request.headers)
+    entry = cache.get(key)
+    if entry is not None and entry.is_fresh():
+        cache.counters['hits'] += 1
+        return cached_response(request, entry, 'HIT')
+
+    # Conditionals of the client are answered by the gateway itself
+    headers = forwarded_headers(request.headers)
+    headers.popall('If-None-Match', None)
+    headers.popall('If-Modified-Since', None)
+    if entry is not None and entry.upstream_etag:
+        headers['If-None-Match'] = entry.upstream_etag
+
+    async with upstream_request(request, 'GET', headers) as resp:
+        if resp.status == 304 and entry is not None:
+            cache.refresh(key, entry, resp.headers)
+            cache.counters['revalidated'] += 1
+            return cached_response(request, entry, 'REVALIDATED')
+        cache.counters['misses'] += 1
+        if not cache.is_storable(request.headers, resp.status,
+                                 resp.headers):
+            return await relay_response(request, resp)
+        entry = cache.store(request.path_qs, request.headers, resp.status,
+                            forwarded_headers(resp.headers),
+                            await resp.read())
+        return cached_response(request, entry, 'MISS')
+
 
 async def proxy_handler(request):
-    target_url = f"http://backend:8000{request.rel_url}"
-    async with ClientSession() as session:
-        async with session.request(
-            request.method, target_url,
-            headers=request.headers, data=await request.read()
-        ) as resp:
-            headers = {k: v for k, v in resp.headers.items()}
-            return web.Response(
-                status=resp.status, headers=headers, body=await resp.read()
-            )
-
-app = web.Application()
-app.router.add_route('*', '/{path_info:.*}', proxy_handler)
+    if request.app.get(response_cache_key) and is_cacheable_request(request):
+        return await cached_proxy_handler(request)
+
+    # Request body is streamed: aiohttp keeps Content-Length if the client
+    # sent one and falls back to chunked transfer encoding otherwise
+    async with upstream_request(
+        request, request.method,
+        headers=forwarded_headers(request.headers),
+        data=request.content if request.body_exists else None,
+    ) as resp:
+        if (request.method in UNSAFE_METHODS and resp.status < 400
+                and request.app.get(response_cache_key)):
+            # Writes to /tasks/5 may change /tasks/5 and /tasks listings
+            top_level_path = '/' + request.path.strip('/').split('/')[0]
+            request.app[response_cache_key].invalidate(top_level_path)
+        return await relay_response(request, resp)
+
+
+async def stats_handler(request):
+    '''Expose per-backend, response cache and rate limit counters.'''
+    response_cache = request.app.get(response_cache_key)
+    rate_limiter = request.app.get(rate_limiter_key)
+    return web.json_response({
+        'upstreams': request.app[upstream_pool_key].stats(),
+        'response_cache': response_cache.stats() if response_cache else None,
+        'rate_limit': rate_limiter.stats() if rate_limiter else None,
+    })
+
+
+async def metrics_handler(request):
+    '''Expose collected metrics in Prometheus text format.'''
+    return web.Response(body=generate_latest(),
+                        headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+
+middlewares = []
+if METRICS_ENABLED:
+    # Outermost, so rejected requests are measured too
+    middlewares.append(metrics_middleware)
+if RATE_LIMIT_ENABLED:
+    middlewares.append(rate_limit_middleware)
+app = web.Application(middlewares=middlewares)
+app[upstream_pool_key] = UpstreamPool(
+    BACKEND_URLS,
+    unhealthy_threshold=UNHEALTHY_THRESHOLD,
+    healthy_threshold=HEALTHY_THRESHOLD)
+app.cleanup_ctx.append(client_session_ctx)
+app.cleanup_ctx.append(health_checks_ctx)
+if RATE_LIMIT_ENABLED:
+    app.cleanup_ctx.append(rate_limiter_ctx)
+if RESPONSE_CACHE_ENABLED:
+    app[response_cache_key] = ResponseCache(
+        max_bytes=RESPONSE_CACHE_MAX_BYTES,
+        max_entry_bytes=RESPONSE_CACHE_MAX_ENTRY_BYTES,
+        default_ttl=RESPONSE_CACHE_DEFAULT_TTL)
+app.router.add_get('/_gateway/stats', stats_handler)
+if METRICS_ENABLED:
+    # Served by the gateway itself, backends are scraped directly
+    app.router.add_get('/metrics', metrics_handler)
+proxy_route = app.router.add_route('*', PROXY_ROUTE, proxy_handler)
+if METRICS_ENABLED:
+    app[route_labels_key] = RouteLabels(proxy_route.resource.canonical,
+                                        max_routes=METRICS_MAX_ROUTES)
 
 if __name__ == '__main__':
     web.run_app(app, host=AIOHTTP_HOST, port=AIOHTTP_PORT)
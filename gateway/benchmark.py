@@ -0,0 +1,58 @@
+'''
+Measures gateway throughput and latency with concurrent GET requests.
+
+Usage:
+    python benchmark.py [URL] [--requests N] [--concurrency N]
+'''
+import argparse
+import asyncio
+import time
+
+from aiohttp import ClientSession, TCPConnector
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(len(values) - 1, round(fraction * (len(values) - 1)))
+    return values[index]
+
+
+async def worker(session, url, count, latencies, errors):
+    for _ in range(count):
+        started = time.perf_counter()
+        try:
+            async with session.get(url) as resp:
+                await resp.read()
+                if resp.status >= 500:
+                    errors.append(resp.status)
+        except OSError as error:
+            errors.append(error)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url, requests, concurrency):
+    latencies, errors = [], []
+    connector = TCPConnector(limit=concurrency)
+    async with ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            worker(session, url, requests // concurrency, latencies, errors)
+            for _ in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - started
+
+    print(f'requests: {len(latencies)}  errors: {len(errors)}  '
+          f'concurrency: {concurrency}')
+    print(f'rps: {len(latencies) / elapsed:.0f}')
+    for name, fraction in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99)):
+        print(f'{name}: {percentile(latencies, fraction) * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('url', nargs='?',
+                        default='http://localhost:8080/tasks?limit=10')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency))
@@ -0,0 +1,107 @@
+import functools
+import re
+import time
+
+from aiohttp import web
+from prometheus_client import Counter, Histogram
+from redis.asyncio import Redis
+
+# Most Redis commands take well under the 5ms lowest default bucket
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                0.25, 0.5, 1.0, 2.5)
+UNMATCHED_ROUTE = '<unmatched>'
+# Other methods are counted together, so clients cannot create series
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                          'OPTIONS'})
+# Path segments standing for one object, e.g. /tasks/15
+ID_SEGMENT = re.compile(
+    r'\d+|[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}'
+    r'-[0-9a-fA-F]{12}')
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time to handle a request until the end of its response body',
+    ['method', 'route', 'status'])
+UPSTREAM_REQUEST_DURATION = Histogram(
+    'gateway_upstream_request_duration_seconds',
+    'Time backends took to answer proxied requests, status "error" '
+    'when the connection failed',
+    ['upstream', 'status'])
+REDIS_COMMAND_DURATION = Histogram(
+    'redis_command_duration_seconds',
+    'Round trip time of Redis commands',
+    ['command'], buckets=FAST_BUCKETS)
+REDIS_COMMAND_ERRORS = Counter(
+    'redis_command_errors',
+    'Redis commands that failed',
+    ['command'])
+
+# labels() validates values and takes a lock on every call, children
+# of the metrics are looked up once. Label values are bounded above.
+request_duration = functools.lru_cache(maxsize=None)(
+    HTTP_REQUEST_DURATION.labels)
+upstream_request_duration = functools.lru_cache(maxsize=None)(
+    UPSTREAM_REQUEST_DURATION.labels)
+redis_command_duration = functools.lru_cache(maxsize=None)(
+    REDIS_COMMAND_DURATION.labels)
+
+
+def path_template(path: str) -> str:
+    '''Replace IDs in the path, /tasks/15 becomes /tasks/{id}.'''
+    return '/'.join('{id}' if ID_SEGMENT.fullmatch(segment) else segment
+                    for segment in path.split('/'))
+
+
+class RouteLabels:
+    '''
+    Route labels of requests. The gateway does not know routes of the
+    backend, so templates of proxied paths are learned from successful
+    responses, at most `max_routes` of them. Other paths, like scans for
+    random URLs answered with 404, share one label.
+    '''
+
+    def __init__(self, proxy_route: str, max_routes: int):
+        self.proxy_route = proxy_route
+        self.max_routes = max_routes
+        self.routes: set[str] = set()
+
+    def label(self, request: web.Request, status: int) -> str:
+        resource = request.match_info.route.resource
+        if resource is None:
+            return UNMATCHED_ROUTE
+        if resource.canonical != self.proxy_route:
+            return resource.canonical
+        template = path_template(request.path)
+        if template in self.routes:
+            return template
+        if status < 400 and len(self.routes) < self.max_routes:
+            self.routes.add(template)
+            return template
+        return UNMATCHED_ROUTE
+
+
+def method_label(method: str) -> str:
+    return method if method in HTTP_METHODS else 'OTHER'
+
+
+def observe_upstream_request(url: str, elapsed: float,
+                             status: int | None) -> None:
+    '''Record a proxied request, `status` is None on connection error.'''
+    upstream_request_duration(
+        url, 'error' if status is None else str(status)).observe(elapsed)
+
+
+class InstrumentedRedis(Redis):
+    '''Redis client timing every command it sends.'''
+
+    async def execute_command(self, *args, **options):
+        command = args[0]
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_COMMAND_ERRORS.labels(command).inc()
+            raise
+        finally:
+            redis_command_duration(command).observe(
+                time.perf_counter() - started)
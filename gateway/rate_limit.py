@@ -0,0 +1,173 @@
+import logging
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import jwt
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+# Refills the bucket for the time passed since the last call and takes
+# one token if there is one. Redis clock keeps gateways in agreement.
+# Returns {allowed, tokens left, seconds until a token is available}.
+TOKEN_BUCKET_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or burst
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens), tostring(retry_after)}
+'''
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    prefix: str
+    # Bucket capacity, also the number of requests allowed per period
+    burst: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        '''Tokens added to the bucket per second.'''
+        return self.burst / self.period
+
+
+def parse_rules(value: str) -> list[RateLimitRule]:
+    '''
+    Parse rules like "/auth/login:10/60,/:200/10", meaning 10 requests
+    per 60 seconds for paths under /auth/login and 200 per 10 seconds
+    for the rest. Rules are ordered by prefix length, longest first.
+    Malformed rules raise ValueError, so the gateway does not start
+    with limits other than configured.
+    '''
+    rules = []
+    for rule in value.split(','):
+        rule = rule.strip()
+        if not rule:
+            continue
+        prefix, _, limit = rule.rpartition(':')
+        burst, _, period = limit.partition('/')
+        try:
+            burst, period = int(burst), float(period)
+        except ValueError:
+            burst = period = 0
+        if not prefix.startswith('/') or burst < 1 or not (
+                0 < period < math.inf):
+            raise ValueError(f'Invalid rate limit rule {rule!r}, '
+                             'expected "prefix:requests/seconds"')
+        rules.append(RateLimitRule(prefix=prefix, burst=burst,
+                                   period=period))
+    return sorted(rules, key=lambda rule: len(rule.prefix), reverse=True)
+
+
+class RateLimiter:
+    '''
+    Token bucket rate limiter shared by gateways through Redis.
+    Clients are identified by JWT subject, or by IP address when the
+    request carries no valid access token. Clients known to be out of
+    tokens are rejected locally until their bucket refills, so flooding
+    clients cost no Redis round-trip.
+    '''
+
+    def __init__(self, redis: Redis, rules: list[RateLimitRule],
+                 jwt_secret_key: Optional[str], jwt_algorithm: str,
+                 local_maxsize: int):
+        self.redis = redis
+        self.rules = rules
+        self.jwt_secret_key = jwt_secret_key
+        self.jwt_algorithm = jwt_algorithm
+        self.local_maxsize = local_maxsize
+        self._script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+        # Client key -> monotonic time when its bucket has a token again
+        self._blocked: OrderedDict[str, float] = OrderedDict()
+        self.counters = {
+            'allowed': 0,
+            'limited': 0,
+            'limited_locally': 0,
+            'redis_errors': 0,
+        }
+
+    def stats(self) -> dict:
+        return {**self.counters, 'blocked_keys': len(self._blocked)}
+
+    def match(self, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return None
+
+    def client_id(self, request) -> str:
+        authorization = request.headers.get('Authorization', '')
+        scheme, _, token = authorization.partition(' ')
+        if scheme.lower() == 'bearer' and token and self.jwt_secret_key:
+            try:
+                payload = jwt.decode(token, self.jwt_secret_key,
+                                     algorithms=[self.jwt_algorithm])
+            except jwt.InvalidTokenError:
+                payload = {}
+            if payload.get('sub'):
+                return f"user:{payload['sub']}"
+        return f'ip:{request.remote}'
+
+    async def check(self, request) -> Optional[float]:
+        '''
+        Take a token for the request.
+
+        Returns:
+            None if the request is allowed, otherwise seconds to wait
+            before retrying.
+        '''
+        rule = self.match(request.path)
+        if rule is None:
+            return None
+        key = f'rate-limit:{rule.prefix}:{self.client_id(request)}'
+
+        blocked_until = self._blocked.get(key)
+        if blocked_until is not None:
+            retry_after = blocked_until - time.monotonic()
+            if retry_after > 0:
+                self.counters['limited_locally'] += 1
+                return retry_after
+            del self._blocked[key]
+
+        try:
+            allowed, _, retry_after = await self._script(
+                keys=[key], args=[rule.rate, rule.burst])
+        except RedisError as error:
+            # Admission control must not take the gateway down with Redis
+            self.counters['redis_errors'] += 1
+            logger.warning('Rate limit check failed: %s', error)
+            return None
+        if int(allowed):
+            self.counters['allowed'] += 1
+            return None
+
+        retry_after = float(retry_after)
+        self.counters['limited'] += 1
+        self._blocked[key] = time.monotonic() + retry_after
+        self._blocked.move_to_end(key)
+        while len(self._blocked) > self.local_maxsize:
+            self._blocked.popitem(last=False)
+        return retry_after
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,197 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from multidict import CIMultiDict
+
+# Headers describing the cached representation, sent along with 304
+VALIDATOR_HEADERS = frozenset({'cache-control', 'content-location', 'etag',
+                               'expires', 'vary'})
+
+
+def parse_cache_control(value: Optional[str]) -> dict:
+    '''Parse Cache-Control header into {directive: argument or None}.'''
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, argument = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip('"') or None
+    return directives
+
+
+def parse_vary(value: Optional[str]) -> tuple:
+    return tuple(sorted(
+        name.strip().lower() for name in (value or '').split(',')
+        if name.strip()
+    ))
+
+
+def freshness_lifetime(cache_control: dict, default_ttl: float) -> float:
+    '''Seconds a stored response may be served without revalidation.'''
+    if 'no-cache' in cache_control:
+        return 0
+    for directive in ('s-maxage', 'max-age'):
+        if cache_control.get(directive):
+            try:
+                return max(0, int(cache_control[directive]))
+            except ValueError:
+                return 0
+    return default_ttl
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    '''Weak comparison of If-None-Match against an entity tag.'''
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque
+               for candidate in if_none_match.split(','))
+
+
+@dataclass
+class CacheEntry:
+    status: int
+    headers: CIMultiDict
+    body: bytes
+    # Tag served to clients: upstream ETag or a digest of the body
+    etag: str
+    upstream_etag: Optional[str]
+    expires_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(name) + len(value)
+                                    for name, value in self.headers.items())
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    '''
+    In-memory LRU cache of upstream GET responses bounded by total size.
+    Entries are keyed by path with query and by values of request headers
+    named in the Vary header of the stored response. The Vary header is
+    remembered per path only while entries of the path are stored.
+    '''
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int,
+                 default_ttl: float):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.default_ttl = default_ttl
+        self.size = 0
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._vary: dict[str, tuple] = {}
+        # Number of stored entries per path, to forget its Vary header
+        self._variants: dict[str, int] = {}
+        self.counters = {
+            'hits': 0,
+            'misses': 0,
+            'revalidated': 0,
+            'not_modified': 0,
+            'evictions': 0,
+        }
+
+    def stats(self) -> dict:
+        return {**self.counters, 'entries': len(self._entries),
+                'size_bytes': self.size}
+
+    def key(self, path_qs: str, request_headers) -> tuple:
+        return self._key(path_qs, self._vary.get(path_qs, ()),
+                         request_headers)
+
+    def get(self, key: tuple) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def is_storable(self, request_headers, status: int,
+                    response_headers) -> bool:
+        '''Check whether a shared cache may store the response.'''
+        if status != 200:
+            return False
+        cache_control = parse_cache_control(
+            response_headers.get('Cache-Control'))
+        if 'no-store' in cache_control or 'private' in cache_control:
+            return False
+        vary = parse_vary(response_headers.get('Vary'))
+        if '*' in vary:
+            return False
+        # Responses to authorized requests are shared only when allowed
+        if 'Authorization' in request_headers and not (
+                'authorization' in vary
+                or 'public' in cache_control
+                or 's-maxage' in cache_control):
+            return False
+        content_length = response_headers.get('Content-Length')
+        return (content_length is not None
+                and int(content_length) <= self.max_entry_bytes)
+
+    def store(self, path_qs: str, request_headers, status: int,
+              response_headers, body: bytes) -> CacheEntry:
+        headers = CIMultiDict(response_headers)
+        headers.popall('Content-Length', None)
+        upstream_etag = headers.get('ETag')
+        etag = upstream_etag or (
+            'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"')
+        headers['ETag'] = etag
+        entry = CacheEntry(status=status, headers=headers, body=body,
+                           etag=etag, upstream_etag=upstream_etag,
+                           expires_at=self._expires_at(headers))
+
+        vary = parse_vary(headers.get('Vary'))
+        key = self._key(path_qs, vary, request_headers)
+        self._remove(key)
+        self._vary[path_qs] = vary
+        self._variants[path_qs] = self._variants.get(path_qs, 0) + 1
+        self._entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.counters['evictions'] += 1
+        return entry
+
+    def refresh(self, key: tuple, entry: CacheEntry,
+                response_headers) -> None:
+        '''Extend freshness of an entry after a 304 from upstream.'''
+        size = entry.size
+        for name in ('Cache-Control', 'Expires'):
+            if name in response_headers:
+                entry.headers[name] = response_headers[name]
+        # Entry may have been evicted while upstream was revalidating it
+        if self._entries.get(key) is entry:
+            self.size += entry.size - size
+        entry.expires_at = self._expires_at(entry.headers)
+
+    def invalidate(self, path_prefix: str) -> None:
+        '''Drop every entry whose path starts with the prefix.'''
+        for key in [key for key in self._entries
+                    if key[0].startswith(path_prefix)]:
+            self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size -= entry.size
+        path_qs = key[0]
+        self._variants[path_qs] -= 1
+        if not self._variants[path_qs]:
+            del self._variants[path_qs]
+            del self._vary[path_qs]
+
+    @staticmethod
+    def _key(path_qs: str, vary: tuple, request_headers) -> tuple:
+        return (path_qs, vary,
+                tuple(request_headers.get(name, '') for name in vary))
+
+    def _expires_at(self, headers) -> float:
+        cache_control = parse_cache_control(headers.get('Cache-Control'))
+        return time.monotonic() + freshness_lifetime(cache_control,
+                                                     self.default_ttl)
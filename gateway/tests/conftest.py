@@ -0,0 +1,5 @@
+import os
+
+# Settings of the gateway are read when its module is imported
+os.environ.setdefault('AIOHTTP_HOST', '127.0.0.1')
+os.environ.setdefault('AIOHTTP_PORT', '8080')
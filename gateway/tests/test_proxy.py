@@ -0,0 +1,170 @@
+import asyncio
+import gzip
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestClient, TestServer
+from multidict import CIMultiDict
+
+from aiohttp_server_config import (client_session_key, forwarded_headers,
+                                   proxy_handler, upstream_pool_key)
+from upstreams import UpstreamPool
+
+
+@pytest_asyncio.fixture
+async def make_gateway():
+    '''Gateway without response cache in front of the given backend app.'''
+    clients = []
+
+    async def make(backend_app):
+        backend_server = TestServer(backend_app)
+        await backend_server.start_server()
+        # Same as the session of the app, bodies are relayed as is
+        session = ClientSession(auto_decompress=False)
+        app = web.Application()
+        app[upstream_pool_key] = UpstreamPool(
+            [str(backend_server.make_url(''))],
+            unhealthy_threshold=2, healthy_threshold=2)
+        app[client_session_key] = session
+        app.router.add_route('*', '/{path_info:.*}', proxy_handler)
+        client = TestClient(TestServer(app), auto_decompress=False)
+        await client.start_server()
+        clients.append((client, session, backend_server))
+        return client
+
+    yield make
+    for client, session, backend_server in clients:
+        await client.close()
+        await session.close()
+        await backend_server.close()
+
+
+def backend_app(handler, method='*'):
+    app = web.Application()
+    app.router.add_route(method, '/{path_info:.*}', handler)
+    return app
+
+
+class TestForwardedHeaders:
+    '''Tests related to headers not forwarded across the gateway'''
+    def test_hop_by_hop_headers_are_dropped(self):
+        headers = CIMultiDict({
+            'Connection': 'keep-alive, X-Trace',
+            'Keep-Alive': 'timeout=5',
+            'Proxy-Authorization': 'Basic secret',
+            'TE': 'trailers',
+            'Trailer': 'Expires',
+            'Transfer-Encoding': 'chunked',
+            'Upgrade': 'websocket',
+            'X-Trace': 'hop',
+            'Authorization': 'Bearer token',
+            'Content-Type': 'application/json',
+        })
+
+        assert forwarded_headers(headers) == CIMultiDict({
+            'Authorization': 'Bearer token',
+            'Content-Type': 'application/json',
+        })
+
+    def test_repeated_headers_are_kept(self):
+        headers = CIMultiDict([('Accept', 'text/csv'),
+                               ('Accept', 'application/json')])
+
+        assert forwarded_headers(headers).getall('Accept') == [
+            'text/csv', 'application/json']
+
+
+@pytest.mark.asyncio(loop_scope="function")
+class TestProxy:
+    '''Tests related to relaying requests and responses'''
+    async def test_hop_by_hop_headers_are_not_forwarded(self, make_gateway):
+        received = {}
+
+        async def handler(request):
+            received.update(request.headers)
+            return web.Response(text='ok', headers={
+                'Keep-Alive': 'timeout=5', 'X-Task-Count': '3'})
+
+        gateway = await make_gateway(backend_app(handler))
+        response = await gateway.get('/tasks', headers={
+            'Connection': 'keep-alive, X-Trace', 'X-Trace': 'hop',
+            'Proxy-Authorization': 'Basic secret',
+            'Authorization': 'Bearer token'})
+
+        assert response.status == 200
+        assert 'X-Trace' not in received, (
+            'Headers named in Connection must not be forwarded')
+        assert 'Proxy-Authorization' not in received
+        assert received['Authorization'] == 'Bearer token'
+        assert 'Keep-Alive' not in response.headers
+        assert response.headers['X-Task-Count'] == '3'
+
+    async def test_chunked_request_body_is_streamed(self, make_gateway):
+        first_chunk_received = asyncio.Event()
+        received = {}
+
+        async def handler(request):
+            received['transfer_encoding'] = request.headers.get(
+                'Transfer-Encoding')
+            body = await request.content.readexactly(5)
+            first_chunk_received.set()
+            body += await request.content.read()
+            return web.Response(body=body)
+
+        async def body():
+            yield b'first'
+            # Sent only once the backend has the first chunk, a gateway
+            # buffering the whole body would never receive the rest
+            await first_chunk_received.wait()
+            yield b' second'
+
+        gateway = await make_gateway(backend_app(handler, 'POST'))
+        response = await asyncio.wait_for(
+            gateway.post('/tasks/bulk', data=body()), timeout=5)
+
+        assert response.status == 200
+        assert await response.read() == b'first second'
+        assert received['transfer_encoding'] == 'chunked'
+
+    async def test_response_is_relayed_chunk_by_chunk(self, make_gateway):
+        first_chunk_relayed = asyncio.Event()
+
+        async def handler(request):
+            response = web.StreamResponse()
+            await response.prepare(request)
+            await response.write(b'{"id": 1}\n')
+            # Written only once the client has the first chunk
+            await first_chunk_relayed.wait()
+            await response.write(b'{"id": 2}\n')
+            await response.write_eof()
+            return response
+
+        gateway = await make_gateway(backend_app(handler))
+        response = await gateway.get('/tasks/export')
+
+        first = await asyncio.wait_for(response.content.readline(),
+                                       timeout=5)
+        first_chunk_relayed.set()
+        rest = await asyncio.wait_for(response.content.read(), timeout=5)
+
+        assert first == b'{"id": 1}\n'
+        assert rest == b'{"id": 2}\n'
+
+    async def test_sized_compressed_response_is_relayed_as_is(
+            self, make_gateway):
+        # Larger than a relayed chunk, so it is written in several parts
+        body = gzip.compress(bytes(range(256)) * 1024, compresslevel=0)
+
+        async def handler(request):
+            return web.Response(body=body, headers={
+                'Content-Encoding': 'gzip',
+                'Content-Type': 'application/x-ndjson'})
+
+        gateway = await make_gateway(backend_app(handler))
+        response = await gateway.get('/tasks/export')
+
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Content-Length'] == str(len(body))
+        assert 'Transfer-Encoding' not in response.headers
+        assert await response.read() == body
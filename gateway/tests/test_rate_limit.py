@@ -0,0 +1,141 @@
+import asyncio
+
+import fakeredis
+import jwt
+import pytest
+import pytest_asyncio
+from aiohttp.test_utils import make_mocked_request
+from redis.asyncio import Redis
+
+import rate_limit
+from rate_limit import (RateLimiter, RateLimitRule, parse_rules,
+                        retry_after_header)
+
+JWT_SECRET_KEY = 'gateway-rate-limit-test-secret-key'
+
+
+@pytest_asyncio.fixture
+async def redis_client():
+    # Lua scripts of fakeredis need the lupa package
+    redis_client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    yield redis_client
+    await redis_client.aclose()
+
+
+def make_limiter(redis_client, rules='/:2/0.2', local_maxsize=100):
+    return RateLimiter(redis_client, parse_rules(rules),
+                       jwt_secret_key=JWT_SECRET_KEY, jwt_algorithm='HS256',
+                       local_maxsize=local_maxsize)
+
+
+def request_of(user=None, path='/tasks'):
+    headers = {}
+    if user is not None:
+        token = jwt.encode({'sub': user}, JWT_SECRET_KEY, algorithm='HS256')
+        headers['Authorization'] = f'Bearer {token}'
+    return make_mocked_request('GET', path, headers=headers)
+
+
+class TestParseRules:
+    '''Tests related to reading rules from settings'''
+    def test_rules_are_ordered_longest_prefix_first(self):
+        rules = parse_rules('/:200/10, /auth/login:10/60,')
+
+        assert rules == [RateLimitRule('/auth/login', 10, 60.0),
+                         RateLimitRule('/', 200, 10.0)]
+        assert rules[1].rate == 20
+
+    @pytest.mark.parametrize('value', [
+        '/tasks', '/tasks:10', '/tasks:ten/10', '/tasks:10/0',
+        '/tasks:0/10', '/tasks:-1/10', '/tasks:10/inf', 'tasks:10/10',
+        '/:200/10,/auth:10/',
+    ])
+    def test_malformed_rules_are_rejected(self, value):
+        with pytest.raises(ValueError, match='Invalid rate limit rule'):
+            parse_rules(value)
+
+    def test_retry_after_is_whole_seconds(self):
+        assert retry_after_header(0.01) == '1'
+        assert retry_after_header(1.2) == '2'
+
+
+@pytest.mark.asyncio(loop_scope="function")
+class TestRateLimiter:
+    '''Tests related to the Redis token bucket'''
+    async def test_requests_beyond_burst_are_limited_until_refill(
+            self, redis_client):
+        limiter = make_limiter(redis_client, rules='/:2/0.2')
+
+        assert await limiter.check(request_of('alice')) is None
+        assert await limiter.check(request_of('alice')) is None
+        retry_after = await limiter.check(request_of('alice'))
+        assert 0 < retry_after <= 0.1
+
+        await asyncio.sleep(retry_after + 0.02)
+        assert await limiter.check(request_of('alice')) is None
+        assert limiter.stats()['allowed'] == 3
+        assert limiter.stats()['limited'] == 1
+
+    async def test_clients_have_separate_buckets(self, redis_client):
+        limiter = make_limiter(redis_client, rules='/:1/60')
+
+        assert await limiter.check(request_of('alice')) is None
+        assert await limiter.check(request_of('alice')) is not None
+        assert await limiter.check(request_of('bob')) is None
+        assert await limiter.check(request_of()) is None, (
+            'Anonymous clients are limited by IP')
+
+    async def test_longest_matching_prefix_applies(self, redis_client):
+        limiter = make_limiter(redis_client,
+                               rules='/auth/login:1/60,/:100/60')
+
+        await limiter.check(request_of(path='/auth/login'))
+
+        assert await limiter.check(request_of(path='/auth/login')) is not None
+        assert await limiter.check(request_of(path='/tasks')) is None
+
+    async def test_blocked_client_is_rejected_locally_until_retry_after(
+            self, redis_client, monkeypatch):
+        limiter = make_limiter(redis_client, rules='/:1/60')
+        await limiter.check(request_of('alice'))
+        retry_after = await limiter.check(request_of('alice'))
+        now = rate_limit.time.monotonic()
+
+        async def unreachable(*args, **kwargs):
+            raise AssertionError('Blocked client must not reach Redis')
+
+        script = limiter._script
+        monkeypatch.setattr(limiter, '_script', unreachable)
+        assert await limiter.check(request_of('alice')) is not None
+        assert limiter.stats()['limited_locally'] == 1
+
+        monkeypatch.setattr(limiter, '_script', script)
+        monkeypatch.setattr(rate_limit.time, 'monotonic',
+                            lambda: now + retry_after)
+        await limiter.check(request_of('alice'))
+        assert limiter.stats()['limited_locally'] == 1, (
+            'Expired block must be checked in Redis again')
+        assert limiter.stats()['limited'] == 2
+
+    async def test_local_blocks_are_bounded(self, redis_client):
+        limiter = make_limiter(redis_client, rules='/:1/60',
+                               local_maxsize=2)
+
+        for user in ('alice', 'bob', 'carol'):
+            await limiter.check(request_of(user))
+            await limiter.check(request_of(user))
+
+        assert limiter.stats()['blocked_keys'] == 2
+
+    async def test_redis_failure_lets_requests_through(self):
+        # Nothing listens on port 1
+        redis_client = Redis(host='127.0.0.1', port=1,
+                             socket_connect_timeout=0.5)
+        limiter = make_limiter(redis_client, rules='/:1/60')
+
+        results = [await limiter.check(request_of('alice'))
+                   for _ in range(3)]
+
+        assert results == [None, None, None]
+        assert limiter.stats()['redis_errors'] == 3
+        await redis_client.aclose()
@@ -0,0 +1,264 @@
+import pytest
+import pytest_asyncio
+from aiohttp import ClientSession, web
+from aiohttp.test_utils import TestClient, TestServer
+from multidict import CIMultiDict
+
+import response_cache
+from aiohttp_server_config import (client_session_key, proxy_handler,
+                                   response_cache_key, upstream_pool_key)
+from response_cache import ResponseCache, etag_matches
+from upstreams import UpstreamPool
+
+
+class Backend:
+    '''Backend serving versioned tasks and counting conditional GETs.'''
+
+    def __init__(self, cache_control='no-cache', body=b'{"id": 1}'):
+        self.cache_control = cache_control
+        self.body = body
+        self.version = 1
+        self.requests = []
+
+    async def read(self, request):
+        self.requests.append(request.headers.get('If-None-Match'))
+        etag = f'"v{self.version}"'
+        headers = {'ETag': etag, 'Cache-Control': self.cache_control}
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=self.body, headers=headers,
+                            content_type='application/json')
+
+    async def write(self, request):
+        self.version += 1
+        return web.json_response({}, status=201)
+
+    async def fail(self, request):
+        return web.json_response({}, status=422)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/tasks/{tail:.*}', self.read)
+        app.router.add_route('*', '/tasks/invalid', self.fail)
+        app.router.add_route('*', '/tasks{tail:.*}', self.write)
+        return app
+
+
+@pytest_asyncio.fixture
+async def make_gateway():
+    '''Gateway with a response cache in front of the given backend.'''
+    clients = []
+
+    async def make(backend, **cache_settings):
+        cache_settings = {'max_bytes': 1024 * 1024,
+                          'max_entry_bytes': 1024, 'default_ttl': 0,
+                          **cache_settings}
+        backend_server = TestServer(backend.app())
+        await backend_server.start_server()
+        session = ClientSession()
+        app = web.Application()
+        app[upstream_pool_key] = UpstreamPool(
+            [str(backend_server.make_url(''))],
+            unhealthy_threshold=2, healthy_threshold=2)
+        app[client_session_key] = session
+        app[response_cache_key] = ResponseCache(**cache_settings)
+        app.router.add_route('*', '/{path_info:.*}', proxy_handler)
+        client = TestClient(TestServer(app))
+        await client.start_server()
+        clients.append((client, session, backend_server))
+        return client
+
+    yield make
+    for client, session, backend_server in clients:
+        await client.close()
+        await session.close()
+        await backend_server.close()
+
+
+def entry_headers(**headers):
+    return CIMultiDict({'Content-Length': '2', **headers})
+
+
+class TestEtagMatches:
+    '''Tests related to If-None-Match comparison'''
+    @pytest.mark.parametrize('if_none_match, etag, expected', [
+        ('"a"', '"a"', True),
+        ('W/"a"', '"a"', True),
+        ('"a"', 'W/"a"', True),
+        ('"b", "a"', '"a"', True),
+        ('*', '"a"', True),
+        ('"b"', '"a"', False),
+        (None, '"a"', False),
+        ('', '"a"', False),
+    ])
+    def test_weak_comparison(self, if_none_match, etag, expected):
+        assert etag_matches(if_none_match, etag) is expected
+
+
+class TestResponseCache:
+    '''Tests related to storing and evicting responses'''
+    def test_entry_expires_after_max_age(self, monkeypatch):
+        cache = ResponseCache(max_bytes=1024, max_entry_bytes=1024,
+                              default_ttl=0)
+        now = response_cache.time.monotonic()
+        monkeypatch.setattr(response_cache.time, 'monotonic', lambda: now)
+        entry = cache.store('/tasks/1', {}, 200,
+                            entry_headers(**{'Cache-Control': 'max-age=60'}),
+                            b'{}')
+
+        assert entry.is_fresh()
+        monkeypatch.setattr(response_cache.time, 'monotonic',
+                            lambda: now + 61)
+        assert not entry.is_fresh()
+
+    def test_entry_without_max_age_uses_default_ttl(self):
+        cache = ResponseCache(max_bytes=1024, max_entry_bytes=1024,
+                              default_ttl=0)
+
+        entry = cache.store('/tasks/1', {}, 200, entry_headers(), b'{}')
+
+        assert not entry.is_fresh(), 'TTL 0 must revalidate every request'
+
+    def test_least_recently_used_entries_are_evicted(self):
+        # Entries of about 100 bytes, three of them fit
+        cache = ResponseCache(max_bytes=350, max_entry_bytes=100,
+                              default_ttl=60)
+        body = b'x' * 60
+        for path in ('/tasks/1', '/tasks/2', '/tasks/3'):
+            cache.store(path, {}, 200, entry_headers(), body)
+        cache.get(cache.key('/tasks/1', {}))
+
+        cache.store('/tasks/4', {}, 200, entry_headers(), body)
+
+        assert cache.get(cache.key('/tasks/2', {})) is None
+        assert cache.get(cache.key('/tasks/1', {})) is not None
+        assert cache.size <= cache.max_bytes
+        assert cache.stats()['evictions'] == 1
+
+    def test_vary_of_paths_without_entries_is_forgotten(self):
+        cache = ResponseCache(max_bytes=350, max_entry_bytes=100,
+                              default_ttl=60)
+        body = b'x' * 60
+        for cursor in range(10):
+            cache.store(f'/tasks?cursor={cursor}', {}, 200,
+                        entry_headers(Vary='Accept'), body)
+        assert len(cache._vary) == cache.stats()['entries'] == 3
+
+        cache.invalidate('/tasks')
+
+        assert cache._vary == {}
+        assert cache.size == 0
+
+    def test_refresh_of_evicted_entry_keeps_size(self):
+        cache = ResponseCache(max_bytes=1024, max_entry_bytes=1024,
+                              default_ttl=60)
+        entry = cache.store('/tasks/1', {}, 200, entry_headers(), b'{}')
+        key = cache.key('/tasks/1', {})
+        cache.invalidate('/tasks')
+
+        cache.refresh(key, entry,
+                      {'Cache-Control': 'max-age=60, must-revalidate'})
+
+        assert cache.size == 0
+        assert entry.is_fresh()
+
+    @pytest.mark.parametrize('content_length', ['1025', None])
+    def test_large_or_unsized_responses_are_not_stored(self,
+                                                       content_length):
+        cache = ResponseCache(max_bytes=1024 * 1024, max_entry_bytes=1024,
+                              default_ttl=60)
+        headers = CIMultiDict()
+        if content_length is not None:
+            headers['Content-Length'] = content_length
+
+        assert not cache.is_storable({}, 200, headers)
+
+    def test_authorized_responses_are_not_shared_by_default(self):
+        cache = ResponseCache(max_bytes=1024, max_entry_bytes=1024,
+                              default_ttl=60)
+        request_headers = {'Authorization': 'Bearer token'}
+
+        assert not cache.is_storable(request_headers, 200, entry_headers())
+        assert cache.is_storable(request_headers, 200, entry_headers(
+            **{'Cache-Control': 'public'}))
+
+
+@pytest.mark.asyncio(loop_scope="function")
+class TestCachedProxy:
+    '''Tests related to serving GET responses through the cache'''
+    async def test_stale_entry_is_revalidated(self, make_gateway):
+        backend = Backend()
+        gateway = await make_gateway(backend)
+
+        first = await gateway.get('/tasks/1')
+        second = await gateway.get('/tasks/1')
+
+        assert first.headers['X-Cache'] == 'MISS'
+        assert second.status == 200
+        assert second.headers['X-Cache'] == 'REVALIDATED'
+        assert await second.read() == backend.body
+        assert backend.requests == [None, '"v1"'], (
+            'Gateway must revalidate with the upstream ETag')
+
+    async def test_client_holding_entry_gets_not_modified(
+            self, make_gateway):
+        backend = Backend(cache_control='max-age=60')
+        gateway = await make_gateway(backend)
+        etag = (await gateway.get('/tasks/1')).headers['ETag']
+
+        response = await gateway.get('/tasks/1',
+                                     headers={'If-None-Match': etag})
+
+        assert response.status == 304
+        assert response.headers['X-Cache'] == 'HIT'
+        assert await response.read() == b''
+        assert len(backend.requests) == 1
+
+    async def test_changed_task_is_served_after_revalidation(
+            self, make_gateway):
+        backend = Backend()
+        gateway = await make_gateway(backend)
+        etag = (await gateway.get('/tasks/1')).headers['ETag']
+        backend.version += 1
+
+        response = await gateway.get('/tasks/1',
+                                     headers={'If-None-Match': etag})
+
+        assert response.status == 200
+        assert response.headers['ETag'] == '"v2"'
+
+    async def test_large_response_bypasses_cache(self, make_gateway):
+        backend = Backend(cache_control='max-age=60', body=b'x' * 2048)
+        gateway = await make_gateway(backend, max_entry_bytes=1024)
+
+        first = await gateway.get('/tasks/1')
+        second = await gateway.get('/tasks/1')
+
+        assert await second.read() == backend.body
+        assert 'X-Cache' not in first.headers
+        assert len(backend.requests) == 2
+        assert gateway.app[response_cache_key].stats()['entries'] == 0
+
+    @pytest.mark.parametrize('method', ['POST', 'PUT', 'PATCH', 'DELETE'])
+    async def test_write_invalidates_cached_tasks(self, make_gateway,
+                                                  method):
+        backend = Backend(cache_control='max-age=60')
+        gateway = await make_gateway(backend)
+        await gateway.get('/tasks/1')
+        assert (await gateway.get('/tasks/1')).headers['X-Cache'] == 'HIT'
+
+        await gateway.request(method, '/tasks/1', json={})
+        response = await gateway.get('/tasks/1')
+
+        assert response.headers['X-Cache'] == 'MISS'
+        assert response.headers['ETag'] == '"v2"'
+
+    async def test_failed_write_keeps_cached_tasks(self, make_gateway):
+        backend = Backend(cache_control='max-age=60')
+        gateway = await make_gateway(backend)
+        await gateway.get('/tasks/1')
+
+        await gateway.post('/tasks/invalid', json={})
+        response = await gateway.get('/tasks/1')
+
+        assert response.headers['X-Cache'] == 'HIT'
@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import ClientError, ClientSession, web
+from aiohttp.test_utils import TestServer, make_mocked_request
+
+from aiohttp_server_config import (client_session_key, upstream_pool_key,
+                                   upstream_request)
+from upstreams import UpstreamPool
+
+
+def make_pool(*urls, unhealthy_threshold=2, healthy_threshold=2):
+    return UpstreamPool(list(urls), unhealthy_threshold=unhealthy_threshold,
+                        healthy_threshold=healthy_threshold)
+
+
+@pytest_asyncio.fixture
+async def slow_backend():
+    '''Backend that does not answer within a test.'''
+    async def handler(request):
+        await asyncio.sleep(30)
+        return web.Response()
+
+    app = web.Application()
+    app.router.add_get('/{path_info:.*}', handler)
+    async with TestServer(app) as server:
+        yield str(server.make_url(''))
+
+
+@pytest_asyncio.fixture
+async def health_backend():
+    '''Backend whose health endpoint answers with a settable status.'''
+    state = {'status': 200}
+
+    async def handler(request):
+        return web.Response(status=state['status'])
+
+    app = web.Application()
+    app.router.add_get('/service/health', handler)
+    async with TestServer(app) as server:
+        yield str(server.make_url('')), state
+
+
+@pytest_asyncio.fixture
+async def client_session():
+    async with ClientSession() as session:
+        yield session
+
+
+def proxied_request(pool, session):
+    app = web.Application()
+    app[upstream_pool_key] = pool
+    app[client_session_key] = session
+    return make_mocked_request('GET', '/tasks', app=app)
+
+
+async def proxy(request):
+    async with upstream_request(request, 'GET', headers={}):
+        pass
+
+
+class TestUpstreamPool:
+    '''Tests related to choosing, ejecting and re-admitting upstreams'''
+    def test_less_loaded_of_two_choices_wins(self):
+        pool = make_pool('http://a', 'http://b', 'http://c')
+        busy, *idle = pool.upstreams
+        busy.in_flight = 5
+
+        chosen = {pool.choose().url for _ in range(100)}
+
+        assert chosen == {upstream.url for upstream in idle}, (
+            'Busiest upstream loses whenever it is one of the two choices')
+
+    def test_tried_upstreams_are_avoided(self):
+        pool = make_pool('http://a', 'http://b')
+        tried, other = pool.upstreams
+
+        assert all(pool.choose(exclude=(tried,)) is other
+                   for _ in range(10))
+
+    def test_upstream_is_ejected_after_consecutive_failures(self):
+        pool = make_pool('http://a', 'http://b', unhealthy_threshold=2)
+        failing, healthy = pool.upstreams
+
+        pool.request_started(failing)
+        pool.request_finished(failing, 0.1, None)
+        assert failing.healthy, 'One failure must not eject the upstream'
+        pool.request_started(failing)
+        pool.request_finished(failing, 0.1, None)
+
+        assert not failing.healthy
+        assert failing.errors == 2 and failing.in_flight == 0
+        assert all(pool.choose() is healthy for _ in range(10))
+
+    def test_success_resets_failures(self):
+        pool = make_pool('http://a', unhealthy_threshold=2)
+        upstream, = pool.upstreams
+
+        pool.report_failure(upstream)
+        pool.report_success(upstream)
+        pool.report_failure(upstream)
+
+        assert upstream.healthy
+
+    def test_server_errors_do_not_eject(self):
+        pool = make_pool('http://a', unhealthy_threshold=1)
+        upstream, = pool.upstreams
+
+        pool.request_started(upstream)
+        pool.request_finished(upstream, 0.1, 503)
+
+        assert upstream.errors == 1
+        assert upstream.healthy, 'Backend answered, its connection works'
+
+    def test_all_ejected_upstreams_are_still_tried(self):
+        pool = make_pool('http://a', 'http://b', unhealthy_threshold=1)
+        for upstream in pool.upstreams:
+            pool.report_failure(upstream)
+
+        chosen = {pool.choose().url for _ in range(10)}
+
+        assert not any(upstream.healthy for upstream in pool.upstreams)
+        assert chosen and chosen <= {'http://a', 'http://b'}
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_health_checks_eject_and_readmit(
+            self, health_backend, client_session):
+        url, state = health_backend
+        pool = make_pool(url, unhealthy_threshold=2, healthy_threshold=2)
+        upstream, = pool.upstreams
+
+        state['status'] = 500
+        for _ in range(2):
+            await pool.probe(client_session, '/service/health', timeout=1)
+        assert not upstream.healthy
+
+        state['status'] = 200
+        await pool.probe(client_session, '/service/health', timeout=1)
+        assert not upstream.healthy, (
+            'Upstream must pass healthy_threshold probes in a row')
+        await pool.probe(client_session, '/service/health', timeout=1)
+        assert upstream.healthy
+
+    @pytest.mark.asyncio(loop_scope="function")
+    async def test_unreachable_upstream_fails_probes(self, client_session):
+        # Nothing listens on port 1
+        pool = make_pool('http://127.0.0.1:1', unhealthy_threshold=1)
+
+        await pool.probe(client_session, '/service/health', timeout=1)
+
+        assert not pool.upstreams[0].healthy
+
+
+@pytest.mark.asyncio(loop_scope="function")
+class TestUpstreamRequest:
+    '''Tests related to bookkeeping of proxied requests'''
+    async def test_cancelled_request_is_not_left_in_flight(
+            self, slow_backend, client_session):
+        pool = make_pool(slow_backend)
+        upstream, = pool.upstreams
+        proxying = asyncio.create_task(
+            proxy(proxied_request(pool, client_session)))
+        await asyncio.sleep(0.1)
+        assert upstream.in_flight == 1
+
+        proxying.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await proxying
+
+        assert upstream.in_flight == 0
+        assert upstream.healthy and upstream.failures == 0, (
+            'Client going away is not a failure of the backend')
+
+    async def test_request_failing_to_be_sent_is_not_left_in_flight(
+            self, client_session):
+        pool = make_pool('ftp://backend')
+        upstream, = pool.upstreams
+
+        with pytest.raises(ClientError):
+            await proxy(proxied_request(pool, client_session))
+
+        assert upstream.in_flight == 0
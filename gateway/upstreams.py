@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import random
+from dataclasses import dataclass
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+
+@dataclass
+class Upstream:
+    url: str
+    healthy: bool = True
+    in_flight: int = 0
+    requests: int = 0
+    errors: int = 0
+    # Consecutive results used to eject and re-admit the upstream
+    failures: int = 0
+    successes: int = 0
+    latency_total: float = 0
+    latency_ewma: float = 0
+
+    def stats(self) -> dict:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'in_flight': self.in_flight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_avg_ms': round(
+                self.latency_total / self.requests * 1000, 2
+            ) if self.requests else None,
+            'latency_ewma_ms': round(self.latency_ewma * 1000, 2),
+        }
+
+
+class UpstreamPool:
+    '''
+    Balances requests across backends with power-of-two-choices:
+    two random healthy upstreams are picked and the one with fewer
+    requests in flight wins. Upstreams failing `unhealthy_threshold`
+    probes or connections in a row are ejected until they pass
+    `healthy_threshold` probes in a row.
+    '''
+
+    def __init__(self, urls: list[str], unhealthy_threshold: int,
+                 healthy_threshold: int):
+        self.upstreams = [Upstream(url=url.rstrip('/')) for url in urls]
+        self.unhealthy_threshold = unhealthy_threshold
+        self.healthy_threshold = healthy_threshold
+
+    def stats(self) -> list[dict]:
+        return [upstream.stats() for upstream in self.upstreams]
+
+    def choose(self, exclude: tuple = ()) -> Upstream:
+        '''Pick an upstream, avoiding `exclude` unless nothing else is left.'''
+        upstreams = ([upstream for upstream in self.upstreams
+                      if upstream not in exclude] or self.upstreams)
+        # When every upstream is ejected try all of them rather than none
+        candidates = ([upstream for upstream in upstreams
+                       if upstream.healthy] or upstreams)
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.in_flight <= second.in_flight else second
+
+    def request_started(self, upstream: Upstream) -> None:
+        upstream.in_flight += 1
+
+    def request_finished(self, upstream: Upstream, elapsed: float,
+                         status: int | None) -> None:
+        '''Record a proxied request, `status` is None on connection error.'''
+        upstream.in_flight -= 1
+        upstream.requests += 1
+        upstream.latency_total += elapsed
+        upstream.latency_ewma += LATENCY_EWMA_ALPHA * (
+            elapsed - upstream.latency_ewma)
+        if status is None or status >= 500:
+            upstream.errors += 1
+        if status is None:
+            self.report_failure(upstream)
+
+    def request_abandoned(self, upstream: Upstream) -> None:
+        '''
+        Record a request that ended before the upstream could answer,
+        e.g. because the client went away. Not counted against it.
+        '''
+        upstream.in_flight -= 1
+
+    def report_success(self, upstream: Upstream) -> None:
+        upstream.failures = 0
+        upstream.successes += 1
+        if (not upstream.healthy
+                and upstream.successes >= self.healthy_threshold):
+            upstream.healthy = True
+            logger.warning('Upstream %s re-admitted', upstream.url)
+
+    def report_failure(self, upstream: Upstream) -> None:
+        upstream.successes = 0
+        upstream.failures += 1
+        if (upstream.healthy
+                and upstream.failures >= self.unhealthy_threshold):
+            upstream.healthy = False
+            logger.warning('Upstream %s ejected', upstream.url)
+
+    async def probe(self, session: ClientSession, path: str,
+                    timeout: float) -> None:
+        '''Send one health probe to every upstream.'''
+        async def probe_upstream(upstream: Upstream):
+            try:
+                async with session.get(
+                        f'{upstream.url}{path}',
+                        timeout=ClientTimeout(total=timeout)) as resp:
+                    await resp.read()
+                    healthy = resp.status < 500
+            except (ClientError, asyncio.TimeoutError):
+                healthy = False
+            if healthy:
+                self.report_success(upstream)
+            else:
+                self.report_failure(upstream)
+
+        await asyncio.gather(*(probe_upstream(upstream)
+                               for upstream in self.upstreams))
+
+    async def run_health_checks(self, session: ClientSession, path: str,
+                                interval: float, timeout: float) -> None:
+        while True:
+            await self.probe(session, path, timeout)
+            await asyncio.sleep(interval)